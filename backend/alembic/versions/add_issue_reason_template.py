@@ -0,0 +1,29 @@
+"""Store issue reasons as a template id and params
+
+Revision ID: add_issue_reason_template_002
+Revises: add_video_storage_001
+Create Date: 2026-10-18
+
+The API applies the same change on startup (app.db.create_schema), so this
+revision is only needed where the schema is managed with alembic.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = 'add_issue_reason_template_002'
+down_revision = 'add_video_storage_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Reasons are rendered from app/reasons.py templates at read time;
+    # existing rows keep their text in issues.reason
+    op.add_column('issues', sa.Column('reason_template', sa.String(), nullable=True))
+    op.add_column('issues', sa.Column('reason_params', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('issues', 'reason_params')
+    op.drop_column('issues', 'reason_template')
@@ -0,0 +1,108 @@
+"""
+Cheap change detection between base and present frames.
+
+Most of a resurvey is unchanged road, so pairs that look the same do not
+need to go through detection and comparison at all. A pair is scored on
+small greyscale copies of both frames:
+
+1. downscale to ``width`` pixels wide and normalise brightness/contrast
+   (surveys are recorded at different times of day)
+2. align present to base with phase correlation, since the two drives never
+   line up exactly
+3. take the mean absolute difference per block and keep the worst block,
+   so a change confined to one part of the frame (a missing sign) is not
+   averaged away by the unchanged rest
+
+The score is in units of the frames' standard deviation; pairs scoring
+below ``CHANGE_GATE_THRESHOLD`` are gated (skipped). Enable with
+``CHANGE_GATE=true`` or per job with metadata ``{"change_gate": true}``.
+"""
+
+from typing import Dict, Iterable, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .config import settings
+from .timings import StageTimer
+
+# Standard deviation (grey levels) below which a frame is treated as flat
+MIN_CONTRAST = 8.0
+# Largest alignment shift accepted from phase correlation, as a fraction of the frame
+MAX_SHIFT = 0.1
+
+
+class ChangeGate:
+    """Scores frame pairs and decides which ones can skip detection"""
+
+    def __init__(self, threshold: Optional[float] = None, width: int = 160, blocks: int = 6):
+        self.threshold = settings.change_gate_threshold if threshold is None else threshold
+        self.width = width
+        self.blocks = blocks
+        self._window = None
+
+    def _prepare(self, frame: np.ndarray) -> np.ndarray:
+        gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        h, w = gray.shape[:2]
+        height = max(int(round(h * self.width / w)), 8)
+        small = cv2.resize(gray, (self.width, height), interpolation=cv2.INTER_AREA).astype(np.float32)
+        small = cv2.GaussianBlur(small, (3, 3), 0)  # sensor noise and sub-pixel misalignment
+        mean, std = cv2.meanStdDev(small)
+        # The floor keeps near-uniform frames (overexposed sky, blank road) from amplifying noise
+        return (small - float(mean[0, 0])) / max(float(std[0, 0]), MIN_CONTRAST)
+
+    def score(self, base: np.ndarray, present: np.ndarray) -> float:
+        """Worst block-wise mean absolute difference of the aligned, normalised pair"""
+        a = self._prepare(base)
+        b = self._prepare(present)
+        if a.shape != b.shape:
+            b = cv2.resize(b, (a.shape[1], a.shape[0]), interpolation=cv2.INTER_AREA)
+
+        if self._window is None or self._window.shape != a.shape:
+            self._window = cv2.createHanningWindow((a.shape[1], a.shape[0]), cv2.CV_32F)
+        (dx, dy), _ = cv2.phaseCorrelate(a, b, self._window)
+        if abs(dx) > a.shape[1] * MAX_SHIFT or abs(dy) > a.shape[0] * MAX_SHIFT:
+            dx = dy = 0.0  # not a plausible drift between surveys, compare unaligned
+
+        # Shift present onto base and ignore the border the shift exposes
+        shift = np.float32([[1, 0, -dx], [0, 1, -dy]])
+        aligned = cv2.warpAffine(b, shift, (a.shape[1], a.shape[0]), borderMode=cv2.BORDER_REPLICATE)
+        mx, my = int(np.ceil(abs(dx))), int(np.ceil(abs(dy)))
+        diff = cv2.absdiff(a, aligned)[my:a.shape[0] - my, mx:a.shape[1] - mx]
+        if diff.size == 0:
+            return float("inf")
+
+        rows = max(int(round(self.blocks * diff.shape[0] / diff.shape[1])), 1)
+        block_means = cv2.resize(diff, (self.blocks, rows), interpolation=cv2.INTER_AREA)
+        return float(block_means.max())
+
+    def is_unchanged(self, base: np.ndarray, present: np.ndarray) -> Tuple[bool, float]:
+        score = self.score(base, present)
+        return score < self.threshold, score
+
+
+def resolve_gate(metadata: Optional[dict]) -> Optional[ChangeGate]:
+    """Return the change gate requested by a job's metadata, or None when gating is off"""
+    enabled = (metadata or {}).get("change_gate", settings.change_gate)
+    if isinstance(enabled, str):
+        enabled = enabled.lower() == "true"
+    return ChangeGate() if enabled else None
+
+
+def gate_summary(gate: Optional[ChangeGate], gated: int, analysed: int, timer: StageTimer,
+                 stages: Iterable[str]) -> Dict:
+    """Gated pair count and the time they would have cost, for ``Job.summary_json``.
+
+    The saving is estimated from the average time ``stages`` took per pair
+    that did go through detection.
+    """
+    totals = timer.totals()
+    per_pair = sum(totals.get(stage, 0.0) for stage in stages) / analysed if analysed else 0.0
+    return {
+        "enabled": gate is not None,
+        "threshold": gate.threshold if gate else None,
+        "gated_frames": gated,
+        "analysed_frames": analysed,
+        "gate_seconds": round(totals.get("gate", 0.0), 3),
+        "estimated_seconds_saved": round(gated * per_pair, 3),
+    }
@@ -30,6 +30,42 @@ class Settings(BaseModel):
     )
 
     frame_rate: int = int(os.getenv("FRAME_RATE", "1"))
+    # Maximum sampled frames per video (0 = no cap; the pipelines stream frames)
+    max_frames: int = int(os.getenv("MAX_FRAMES", "0"))
+    # Decoded frames buffered ahead of detection per video (base and present decode concurrently)
+    decode_queue_size: int = int(os.getenv("DECODE_QUEUE_SIZE", "4"))
+    # Default frame enhancement profile: none, fast, quality or adaptive (overridable per job)
+    enhancement_profile: str = os.getenv("ENHANCEMENT_PROFILE", "quality")
+    # Estimated noise sigma above which the adaptive profile denoises a frame
+    enhancement_noise_threshold: float = float(os.getenv("ENHANCEMENT_NOISE_THRESHOLD", "3.0"))
+    # Worker processes analysing frame pairs in the basic pipeline (0 or 1 = in the job's process)
+    detection_workers: int = int(os.getenv("DETECTION_WORKERS", "0"))
+    # Skip detection on base/present pairs that look unchanged (job metadata "change_gate" overrides)
+    change_gate: bool = os.getenv("CHANGE_GATE", "false").lower() == "true"
+    # Worst block-wise difference (in frame standard deviations) below which a pair counts as unchanged
+    change_gate_threshold: float = float(os.getenv("CHANGE_GATE_THRESHOLD", "0.25"))
+    # Frame sampling strategy: auto (probe per container), read, grab or seek
+    frame_sampling: str = os.getenv("FRAME_SAMPLING", "auto")
+    # Frames (base and present together) sent to YOLO per inference call
+    yolo_batch_size: int = int(os.getenv("YOLO_BATCH_SIZE", "8"))
+    # Slice-aided inference: also run YOLO on overlapping tiles of the road surface (job metadata "tiled" overrides)
+    tiled_inference: bool = os.getenv("TILED_INFERENCE", "false").lower() == "true"
+    tile_size: int = int(os.getenv("TILE_SIZE", "640"))
+    tile_overlap: float = float(os.getenv("TILE_OVERLAP", "0.2"))
+    # Fraction of the frame height above which tiles are skipped (sky, roadside)
+    road_region_top: float = float(os.getenv("ROAD_REGION_TOP", "0.45"))
+    # Issue crops: blob (content-addressed store, served from /crops/{key}) or inline (base64 data URLs)
+    crop_storage: str = os.getenv("CROP_STORAGE", "blob")
+    # Crop encoding: jpeg or webp (smaller files, slower to encode)
+    crop_format: str = os.getenv("CROP_FORMAT", "jpeg")
+    # eager (render crops while the job runs) or lazy (archive frames, render crops on first request)
+    crop_mode: str = os.getenv("CROP_MODE", "lazy")
+    # Encoder threads rendering/archiving crops alongside detection (0 = in the frame loop)
+    crop_workers: int = int(os.getenv("CROP_WORKERS", "2"))
+    # Issue rows inserted (and committed) per batch while a job runs
+    issue_batch_size: int = int(os.getenv("ISSUE_BATCH_SIZE", "500"))
+    # Basic pipeline: merge an element's issues across consecutive frames (job metadata "merge_issues" overrides)
+    issue_merge: bool = os.getenv("ISSUE_MERGE", "true").lower() == "true"
     temporal_persist_n: int = int(os.getenv("TEMPORAL_PERSIST_N", "3"))
     confidence_threshold: float = float(os.getenv("CONFIDENCE_THRESHOLD", "0.25"))
     
@@ -42,6 +78,12 @@ class Settings(BaseModel):
     
     # AI Model configuration
     model_path: str = os.getenv("MODEL_PATH", "models/road_defects_yolov8x.pt")
+    # Inference backend for the advanced pipeline: ultralytics (PyTorch) or onnx (ONNX Runtime, CPU)
+    inference_backend: str = os.getenv("INFERENCE_BACKEND", "ultralytics")
+    # ONNX export to run (default: MODEL_PATH with a .onnx extension)
+    onnx_model_path: str = os.getenv("ONNX_MODEL_PATH", "")
+    # Use the statically quantized INT8 variant (*.int8.onnx) of the ONNX export
+    onnx_int8: bool = os.getenv("ONNX_INT8", "false").lower() == "true"
     use_yolo: bool = os.getenv("USE_YOLO", "true").lower() == "true"
     temporal_frames: int = int(os.getenv("TEMPORAL_FRAMES", "5"))
     blur_threshold: float = float(os.getenv("BLUR_THRESHOLD", "100.0"))
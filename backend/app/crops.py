@@ -0,0 +1,491 @@
+"""
+Content-addressed storage for issue crops.
+
+Crops used to be stored on each Issue as base64 JPEG data URLs, which made
+every results payload, CSV export and report carry megabytes of images.
+Now the JPEG bytes are written once to the configured storage backend under
+their SHA-256 digest, and the Issue only keeps the 32-character key. The API
+serves ``/crops/{key}``; since a key names immutable content, the key doubles
+as a strong ETag and responses can be cached forever.
+
+Identical crops (e.g. the same full frame used by several issues) are stored
+once. Issues written before this change still hold data URLs; ``crop_url``
+passes those through unchanged. ``CROP_STORAGE=inline`` keeps writing data
+URLs.
+
+Each crop is stored in several renditions, all encoded in one pass from the
+same image when the crop is made: ``thumb`` for issue lists and reports,
+``medium`` for the detail view and the ``full`` original. The key is the hash
+of the full rendition; ``/crops/{key}?size=thumb`` picks another one. Crops
+are JPEG unless ``CROP_FORMAT=webp``.
+
+With ``CROP_MODE=lazy`` the pipelines do not render crops at all. Each frame
+an issue points at is written once to the job's frame archive (as JPEG,
+under ``jobs/<job_id>/frames/``), and the issue gets the key of a small
+spec: archived frame, bbox and drawing style. The first request for that
+key renders the crop from the archive and stores its renditions under the
+key, so later requests are served like any other crop.
+
+Since identical crops are shared between jobs, deleting a job only deletes
+the crops no remaining issue points at (``release_crops``), along with the
+job's frame archive. ``DELETE /storage/crops`` sweeps every stored crop no
+issue references, e.g. the leftovers of a job that failed before its issues
+were written. Neither runs while a job is queued or processing, since its
+crops are stored before the issues that reference them.
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+import cv2
+import numpy as np
+
+from .config import settings
+from .models import Issue, Job
+
+logger = logging.getLogger(__name__)
+
+CROP_PREFIX = "crops"
+KEY_LENGTH = 32
+# Quality of full-size crops and archived frames
+CROP_QUALITY = 95
+CROP_MODES = ("eager", "lazy")
+_KEY_PATTERN = re.compile(rf"[0-9a-f]{{{KEY_LENGTH}}}")
+
+# Rendition -> (max width, max height, encode quality); None keeps the original size/quality
+RENDITIONS: Dict[str, Tuple[Optional[int], Optional[int], Optional[int]]] = {
+    "full": (None, None, None),
+    "medium": (640, 480, 85),
+    "thumb": (200, 150, 80),
+}
+DEFAULT_RENDITION = "full"
+
+# Format -> (file extension, media type, OpenCV quality flag)
+CROP_FORMATS = {
+    "jpeg": (".jpg", "image/jpeg", cv2.IMWRITE_JPEG_QUALITY),
+    "webp": (".webp", "image/webp", cv2.IMWRITE_WEBP_QUALITY),
+}
+
+def _backend():
+    """The storage module the pipelines read videos from"""
+    if os.getenv("USE_DATABASE_STORAGE", "true").lower() == "true":
+        from . import storage_database as backend
+    else:
+        from . import storage_simple as backend
+    return backend
+
+
+def is_crop_key(value: Optional[str]) -> bool:
+    return bool(value) and _KEY_PATTERN.fullmatch(value) is not None
+
+
+def crop_key(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:KEY_LENGTH]
+
+
+def crop_format() -> str:
+    return settings.crop_format if settings.crop_format in CROP_FORMATS else "jpeg"
+
+
+def object_name(key: str, size: str = DEFAULT_RENDITION, fmt: str = "jpeg") -> str:
+    """``crops/ab/<key>.jpg`` for the full rendition, ``crops/ab/<key>.<size>.jpg`` for the others"""
+    extension = CROP_FORMATS[fmt][0]
+    suffix = "" if size == DEFAULT_RENDITION else f".{size}"
+    return f"{CROP_PREFIX}/{key[:2]}/{key}{suffix}{extension}"
+
+
+def encode_image(image: np.ndarray, quality: int = 90, fmt: str = "jpeg") -> bytes:
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    extension, _, flag = CROP_FORMATS[fmt]
+    _, buffer = cv2.imencode(extension, image, [flag, quality])
+    return buffer.tobytes()
+
+
+def encode_jpeg(image: np.ndarray, quality: int = 90) -> bytes:
+    return encode_image(image, quality, "jpeg")
+
+
+def fit(image: np.ndarray, max_width: Optional[int], max_height: Optional[int]) -> np.ndarray:
+    """Downscale to fit ``max_width`` x ``max_height`` keeping the aspect ratio (never upscales)"""
+    h, w = image.shape[:2]
+    if max_width is None or (w <= max_width and h <= max_height):
+        return image
+    scale = min(max_width / w, max_height / h)
+    size = (max(int(round(w * scale)), 1), max(int(round(h * scale)), 1))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+
+def encode_renditions(image: np.ndarray, quality: int = 90, fmt: str = "jpeg") -> Dict[str, bytes]:
+    """Encode every rendition of a crop in one pass, each scaled down from the previous one"""
+    renditions = {}
+    for size, (max_width, max_height, size_quality) in RENDITIONS.items():
+        image = fit(image, max_width, max_height)
+        renditions[size] = encode_image(image, size_quality or quality, fmt)
+    return renditions
+
+
+def highlight_crop(frame: np.ndarray, bbox: List[int], expand_factor: float = 1.5) -> np.ndarray:
+    """Basic pipeline crop: expanded region around the detection, sharpened, detection outlined in red"""
+    x1, y1, x2, y2 = map(int, bbox)
+    h, w = frame.shape[:2]
+    
+    # Expand the bbox to show more context
+    cx, cy = (x1 + x2) // 2, (y1 + y2) // 2
+    width, height = x2 - x1, y2 - y1
+    
+    # Expand by factor to show surrounding area
+    new_width = int(width * expand_factor)
+    new_height = int(height * expand_factor)
+    
+    # Calculate new boundaries with expansion
+    x1 = max(0, cx - new_width // 2)
+    y1 = max(0, cy - new_height // 2)
+    x2 = min(w, cx + new_width // 2)
+    y2 = min(h, cy + new_height // 2)
+    
+    # Ensure minimum size for visibility
+    min_size = 200
+    if x2 - x1 < min_size:
+        x1 = max(0, cx - min_size // 2)
+        x2 = min(w, cx + min_size // 2)
+    if y2 - y1 < min_size:
+        y1 = max(0, cy - min_size // 2)
+        y2 = min(h, cy + min_size // 2)
+    
+    # Extract crop
+    crop = frame[y1:y2, x1:x2].copy()
+    
+    # Apply sharpening for clarity
+    kernel = np.array([[-1,-1,-1],
+                       [-1, 9,-1],
+                       [-1,-1,-1]])
+    sharpened = cv2.filter2D(crop, -1, kernel)
+    
+    # Draw a red rectangle to highlight the detection area within the expanded crop
+    relative_x1 = max(0, bbox[0] - x1)
+    relative_y1 = max(0, bbox[1] - y1)
+    relative_x2 = min(x2 - x1, bbox[2] - x1)
+    relative_y2 = min(y2 - y1, bbox[3] - y1)
+    
+    # Draw rectangle on the issue area (if within bounds)
+    if relative_x2 > relative_x1 and relative_y2 > relative_y1:
+        cv2.rectangle(sharpened, 
+                      (relative_x1, relative_y1), 
+                      (relative_x2, relative_y2), 
+                      (0, 0, 255), 2)  # Red rectangle, 2px thick
+    
+    return sharpened
+
+
+def annotate_crop(frame: np.ndarray, bbox: List[int], expand: float = 1.3) -> np.ndarray:
+    """Advanced pipeline crop: expanded region with the detection outlined and an arrow pointing at it"""
+    x1, y1, x2, y2 = map(int, bbox)
+    h, w = frame.shape[:2]
+    
+    # Expand region for context
+    cx, cy = (x1 + x2) // 2, (y1 + y2) // 2
+    width, height = int((x2 - x1) * expand), int((y2 - y1) * expand)
+    
+    new_x1 = max(0, cx - width // 2)
+    new_y1 = max(0, cy - height // 2)
+    new_x2 = min(w, cx + width // 2)
+    new_y2 = min(h, cy + height // 2)
+    
+    # Extract and annotate
+    crop = frame[new_y1:new_y2, new_x1:new_x2].copy()
+    
+    # Draw attention rectangle
+    rel_x1 = x1 - new_x1
+    rel_y1 = y1 - new_y1
+    rel_x2 = x2 - new_x1
+    rel_y2 = y2 - new_y1
+    
+    cv2.rectangle(crop, (rel_x1, rel_y1), (rel_x2, rel_y2), (0, 0, 255), 3)
+    
+    # Add arrow pointing to issue
+    arrow_start = (rel_x1 - 20, rel_y1 - 20) if rel_x1 > 20 else (rel_x2 + 20, rel_y1 - 20)
+    arrow_end = (rel_x1, rel_y1)
+    cv2.arrowedLine(crop, arrow_start, arrow_end, (0, 255, 0), 2, tipLength=0.3)
+    
+    return crop
+
+
+# Drawing styles a crop can be rendered with; "frame" is the whole frame (new/missing items)
+CROP_STYLES = {
+    "highlight": highlight_crop,
+    "annotate": annotate_crop,
+    "frame": lambda frame, bbox: frame,
+}
+
+
+def render_crop(style: str, frame: np.ndarray, bbox: Optional[List[int]] = None) -> np.ndarray:
+    return CROP_STYLES[style](frame, bbox)
+
+
+def put_crop(renditions: Dict[str, bytes], fmt: str = "jpeg", key: Optional[str] = None) -> str:
+    """Store a crop's renditions (once) and return the key.
+
+    The key is the content key of the full rendition unless one is given.
+    Storage is asked every time whether the crop exists (a metadata lookup,
+    not a download), rather than a process-wide record of written keys, so
+    a blob removed from storage is written again the next time the same
+    crop is stored. Raises ``CropWriteError`` if a rendition can't be stored.
+    """
+    key = key or crop_key(renditions[DEFAULT_RENDITION])
+    backend = _backend()
+    media_type = CROP_FORMATS[fmt][1]
+    if not backend.exists(object_name(key, DEFAULT_RENDITION, fmt)):
+        # Full rendition last, so its presence means the crop is complete
+        for size in sorted(renditions, key=lambda s: s == DEFAULT_RENDITION):
+            _write(backend, object_name(key, size, fmt), renditions[size], media_type)
+    return key
+
+
+class CropWriteError(IOError):
+    """The storage backend reported that a crop blob was not stored"""
+
+
+def _write(backend, name: str, data: bytes, media_type: str):
+    # storage_database.put_bytes reports failures by returning False
+    if backend.put_bytes(name, data, media_type) is False:
+        raise CropWriteError(f"Could not store {name}")
+
+
+def _read(backend, name: str) -> Optional[bytes]:
+    try:
+        return backend.get_bytes(name) or None
+    except FileNotFoundError:
+        return None
+
+
+def get_crop(key: str, size: str = DEFAULT_RENDITION) -> Optional[Tuple[bytes, str]]:
+    """Bytes and media type of a stored crop rendition, or None.
+
+    Crops stored before renditions existed only have the full JPEG, which
+    is served for any size. Lazy crops are rendered on first request.
+    """
+    if not is_crop_key(key):
+        return None
+    backend = _backend()
+    formats = [crop_format()] + [fmt for fmt in CROP_FORMATS if fmt != crop_format()]
+    for candidate in dict.fromkeys([size, DEFAULT_RENDITION]):
+        for fmt in formats:
+            data = _read(backend, object_name(key, candidate, fmt))
+            if data:
+                return data, CROP_FORMATS[fmt][1]
+
+    renditions = render_lazy(key)
+    if renditions is None:
+        return None
+    return renditions.get(size, renditions[DEFAULT_RENDITION]), CROP_FORMATS[crop_format()][1]
+
+
+def spec_name(key: str) -> str:
+    return f"{CROP_PREFIX}/{key[:2]}/{key}.json"
+
+
+def archive_prefix(job_id: str) -> str:
+    return f"jobs/{job_id}/frames"
+
+
+def archive_name(job_id: str, stream: str, frame_idx: int) -> str:
+    return f"{archive_prefix(job_id)}/{stream}/{frame_idx}.jpg"
+
+
+def render_lazy(key: str) -> Optional[Dict[str, bytes]]:
+    """Render a lazy crop from its archived frame and store its renditions; None if ``key`` has no spec"""
+    backend = _backend()
+    spec = _read(backend, spec_name(key))
+    if not spec:
+        return None
+    spec = json.loads(spec)
+    frame = _read(backend, spec["frame"])
+    if not frame:
+        logger.warning(f"⚠️ Archived frame {spec['frame']} of crop {key} is gone")
+        return None
+
+    image = cv2.imdecode(np.frombuffer(frame, np.uint8), cv2.IMREAD_COLOR)
+    fmt = crop_format()
+    renditions = encode_renditions(render_crop(spec["style"], image, spec.get("bbox")), CROP_QUALITY, fmt)
+    put_crop(renditions, fmt, key=key)
+    return renditions
+
+
+def resolve_crop_mode(metadata: Optional[dict]) -> str:
+    """Crop mode requested by a job's metadata ("crop_mode"), defaulting to ``CROP_MODE``.
+
+    Lazy crops need the blob store, so inline storage is always eager.
+    """
+    mode = str((metadata or {}).get("crop_mode", settings.crop_mode)).lower()
+    if settings.crop_storage == "inline" or mode not in CROP_MODES:
+        return "eager"
+    return mode
+
+
+class JobCrops:
+    """Makes the crop references of one job's issues, rendered now (eager) or on first request (lazy).
+
+    ``submit`` hands the work to a bounded pool of ``CROP_WORKERS`` encoder
+    threads (OpenCV releases the GIL while cropping, filtering and
+    encoding), so detection of the next frame pair overlaps with the crops
+    of the current one. At most ``workers * PENDING_PER_WORKER`` crops are
+    in flight; ``submit`` blocks beyond that. Callers resolve the returned
+    futures in the order they submitted them.
+    """
+
+    PENDING_PER_WORKER = 4
+
+    def __init__(self, job_id: str, mode: str = "eager", workers: Optional[int] = None):
+        self.job_id = job_id
+        self.mode = mode
+        self.workers = settings.crop_workers if workers is None else workers
+        self.archived = 0
+        self._archived = set()
+        self._lock = threading.Lock()
+        self._pool = None
+        if self.workers > 0:
+            self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="crops")
+            self._slots = threading.BoundedSemaphore(self.workers * self.PENDING_PER_WORKER)
+
+    def submit(self, style: str, stream: str, frame_idx: int, frame: Union[np.ndarray, bytes],
+               bbox: Optional[List[int]] = None) -> Future:
+        """``crop`` on the encoder pool (or right away without one); the future holds the reference"""
+        if self._pool is None:
+            future = Future()
+            try:
+                future.set_result(self.crop(style, stream, frame_idx, frame, bbox))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        self._slots.acquire()
+        future = self._pool.submit(self.crop, style, stream, frame_idx, frame, bbox)
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def close(self):
+        """Wait for submitted crops and stop the encoder threads"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+
+    def crop(self, style: str, stream: str, frame_idx: int, frame: Union[np.ndarray, bytes],
+             bbox: Optional[List[int]] = None) -> str:
+        """Crop reference for ``bbox`` of a frame, given decoded or as JPEG bytes"""
+        if self.mode == "eager":
+            if isinstance(frame, bytes):
+                frame = cv2.imdecode(np.frombuffer(frame, np.uint8), cv2.IMREAD_COLOR)
+            return store_crop(render_crop(style, frame, bbox), quality=CROP_QUALITY)
+
+        backend = _backend()
+        name = archive_name(self.job_id, stream, frame_idx)
+        with self._lock:
+            first = name not in self._archived
+            if first:
+                self._archived.add(name)
+                self.archived += 1
+        if first:
+            data = frame if isinstance(frame, bytes) else encode_jpeg(frame, CROP_QUALITY)
+            try:
+                _write(backend, name, data, "image/jpeg")
+            except Exception:
+                # Let the next crop of this frame try again
+                with self._lock:
+                    self._archived.discard(name)
+                    self.archived -= 1
+                raise
+
+        spec = json.dumps({"frame": name, "style": style, "bbox": [int(v) for v in bbox] if bbox else None},
+                          sort_keys=True).encode()
+        key = crop_key(spec)
+        _write(backend, spec_name(key), spec, "application/json")
+        return key
+
+
+def store_crop(image: np.ndarray, quality: int = 90) -> str:
+    """Encode a crop and return what an Issue stores for it (a key, or a data URL when inline)"""
+    fmt = crop_format()
+    if settings.crop_storage == "inline":
+        data = encode_image(image, quality, fmt)
+        return f"data:{CROP_FORMATS[fmt][1]};base64,{base64.b64encode(data).decode('utf-8')}"
+    return put_crop(encode_renditions(image, quality, fmt), fmt)
+
+
+ACTIVE_JOB_STATES = ("queued", "processing")
+
+
+def jobs_active(db) -> bool:
+    """Whether a job may still store crops its issues will reference"""
+    return db.query(Job.id).filter(Job.status.in_(ACTIVE_JOB_STATES)).first() is not None
+
+
+def referenced_crop_keys(db, job_id: Optional[str] = None) -> Set[str]:
+    """Crop keys stored on issues (of one job, or of all)"""
+    query = db.query(Issue.base_crop_url, Issue.present_crop_url)
+    if job_id is not None:
+        query = query.filter(Issue.job_id == job_id)
+    return {value for row in query for value in row if is_crop_key(value)}
+
+
+def _crop_objects(backend, keys: Optional[Set[str]] = None) -> Dict[str, List[str]]:
+    """Stored object names (renditions, formats, lazy spec) by crop key; every stored crop unless ``keys``"""
+    if keys is not None:
+        names = [object_name(key, size, fmt) for key in keys for size in RENDITIONS for fmt in CROP_FORMATS]
+        names += [spec_name(key) for key in keys]
+    else:
+        names = backend.list_keys(f"{CROP_PREFIX}/")
+    objects: Dict[str, List[str]] = {}
+    for name in names:
+        key = name.rsplit("/", 1)[-1][:KEY_LENGTH]
+        if is_crop_key(key):
+            objects.setdefault(key, []).append(name)
+    return objects
+
+
+def release_crops(db, keys: Optional[Set[str]] = None) -> int:
+    """Delete the given stored crops (all stored crops if None) that no issue references; returns how many"""
+    backend = _backend()
+    referenced = referenced_crop_keys(db)
+    released = 0
+    for key, names in _crop_objects(backend, keys).items():
+        if key in referenced:
+            continue
+        stored = names if keys is None else [name for name in names if backend.exists(name)]
+        for name in stored:
+            backend.delete_prefix(name)
+        released += bool(stored)
+    return released
+
+
+def release_job_crops(db, job_ids: List[str], keys: Optional[Set[str]] = None) -> int:
+    """After jobs' issues are deleted: drop their frame archives and the crops no issue references.
+
+    ``keys`` limits the crops considered to those the jobs' issues held
+    (all stored crops if None). Skipped while jobs are active.
+    """
+    if jobs_active(db):
+        logger.info(f"⏭️ Jobs running, leaving crops of {len(job_ids)} deleted jobs for the next sweep")
+        return 0
+    backend = _backend()
+    for job_id in job_ids:
+        backend.delete_prefix(archive_prefix(job_id))
+    released = release_crops(db, keys)
+    logger.info(f"🗑️ Deleted {released} crops of {len(job_ids)} jobs")
+    return released
+
+
+def crop_url(value: Optional[str], base_url: str, size: str = DEFAULT_RENDITION) -> str:
+    """URL for a stored crop reference; legacy data URLs and absolute URLs pass through"""
+    if not value:
+        return ""
+    if is_crop_key(value):
+        query = "" if size == DEFAULT_RENDITION else f"?size={size}"
+        return f"{base_url.rstrip('/')}{settings.api_prefix}/crops/{value}{query}"
+    return value
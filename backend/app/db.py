@@ -1,7 +1,10 @@
-from sqlalchemy import create_engine
+import logging
+
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 from .config import settings
 
+logger = logging.getLogger(__name__)
 
 engine = create_engine(settings.database_url, pool_pre_ping=True)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -11,15 +14,38 @@ class Base(DeclarativeBase):
     pass
 
 
+def create_schema(bind=engine):
+    """Create missing tables, then add nullable columns that existing tables lack.
+
+    ``create_all`` never alters a table that already exists, so a column
+    added to a model later (e.g. ``issues.reason_template``) would be
+    missing from deployments created before it. Those columns are added
+    here with ``ALTER TABLE ... ADD COLUMN``; the matching revisions in
+    ``alembic/versions`` record the same change. Non-nullable columns need
+    a real migration and are only reported.
+    """
+    Base.metadata.create_all(bind=bind)
+    inspector = inspect(bind)
+    preparer = bind.dialect.identifier_preparer
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                if not column.nullable:
+                    logger.error(f"❌ Column {table.name}.{column.name} is missing and needs a migration")
+                    continue
+                conn.execute(text(
+                    f"ALTER TABLE {preparer.quote(table.name)} ADD COLUMN {preparer.quote(column.name)} "
+                    f"{column.type.compile(dialect=bind.dialect)}"
+                ))
+                logger.info(f"✅ Added column {table.name}.{column.name}")
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
-
-
-
-
-
-
@@ -0,0 +1,247 @@
+"""
+Frame enhancement profiles.
+
+``cv2.fastNlMeansDenoisingColored`` is the most expensive step of both
+pipelines on CPU workers, so enhancement is selectable per job:
+
+- ``none``: frames are analysed as decoded
+- ``fast``: CLAHE plus the gamma LUT, computed on a downscaled L channel
+- ``quality``: full denoising followed by the pipeline's usual enhancement
+- ``adaptive``: like ``quality``, but only frames whose measured noise level
+  exceeds ``ENHANCEMENT_NOISE_THRESHOLD`` are denoised
+
+The profile is read from the job metadata (``{"enhancement": "fast"}``) and
+defaults to ``ENHANCEMENT_PROFILE``.
+"""
+
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+ENHANCEMENT_PROFILES = ("none", "fast", "quality", "adaptive")
+
+# Immerkaer's noise estimation kernel (difference of two Laplacians)
+_NOISE_KERNEL = np.array([[1, -2, 1],
+                          [-2, 4, -2],
+                          [1, -2, 1]], dtype=np.float32)
+
+
+def resolve_profile(metadata: Optional[dict]) -> str:
+    """Return the enhancement profile requested by a job's metadata"""
+    profile = (metadata or {}).get("enhancement") or settings.enhancement_profile
+    profile = str(profile).lower()
+    if profile not in ENHANCEMENT_PROFILES:
+        logger.warning(f"⚠️ Unknown enhancement profile '{profile}', using 'quality'")
+        return "quality"
+    return profile
+
+
+def estimate_noise(frame: np.ndarray, response: Optional[np.ndarray] = None) -> float:
+    """Estimate the standard deviation of additive noise in a frame (Immerkaer, 1996).
+
+    ``response`` is an optional float32 scratch buffer of the frame's size.
+    """
+    gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    h, w = gray.shape[:2]
+    if h < 3 or w < 3:
+        return 0.0
+    response = cv2.filter2D(gray, cv2.CV_32F, _NOISE_KERNEL, dst=response)[1:-1, 1:-1]
+    return float(np.sqrt(np.pi / 2) * cv2.norm(response, cv2.NORM_L1) / (6 * (w - 2) * (h - 2)))
+
+
+def is_noisy(frame: np.ndarray, threshold: Optional[float] = None) -> bool:
+    """True if the frame is noisy enough to be worth denoising"""
+    if threshold is None:
+        threshold = settings.enhancement_noise_threshold
+    return estimate_noise(frame) > threshold
+
+
+def gamma_table(gamma: float) -> np.ndarray:
+    """256-entry uint8 lookup table applying gamma correction"""
+    values = np.arange(256, dtype=np.float64) / 255.0
+    return (np.power(values, 1.0 / gamma) * 255).astype(np.uint8)
+
+
+def fast_enhance(frame: np.ndarray, clip_limit: float = 2.0, gamma: Optional[float] = None,
+                 scale: float = 0.5) -> np.ndarray:
+    """CLAHE (and optional gamma) on the L channel, with CLAHE run at reduced resolution.
+
+    The contrast change CLAHE makes on the downscaled L channel is upscaled
+    and added back to the full-resolution L channel, so local contrast is
+    boosted without losing the detail the downscale throws away.
+    """
+    lab = cv2.cvtColor(frame, cv2.COLOR_BGR2LAB)
+    l, a, b = cv2.split(lab)
+
+    h, w = l.shape
+    small = cv2.resize(l, (max(int(w * scale), 8), max(int(h * scale), 8)), interpolation=cv2.INTER_AREA)
+    clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=(8, 8))
+    delta = cv2.subtract(clahe.apply(small), small, dtype=cv2.CV_16S)
+    delta = cv2.resize(delta, (w, h), interpolation=cv2.INTER_LINEAR)
+    l = cv2.add(l, delta, dtype=cv2.CV_8U)
+
+    if gamma:
+        l = cv2.LUT(l, gamma_table(gamma))
+
+    return cv2.cvtColor(cv2.merge([l, a, b]), cv2.COLOR_LAB2BGR)
+
+
+class FramePreprocessor:
+    """Blur scoring and enhancement with operators built once and buffers reused.
+
+    The CLAHE operator, sharpening kernels and gamma LUT are created once per
+    preprocessor instead of on every frame, and every intermediate image is
+    written into a preallocated buffer through ``dst=``. Only the enhanced
+    frame handed back to the caller is a fresh allocation, because callers
+    queue and retain it. Buffers and CLAHE objects are kept per thread, since
+    base and present videos are preprocessed concurrently.
+    """
+
+    # Sharpening strength switches on the Laplacian variance of the enhanced
+    # frame (computed at full resolution, so the level needs no rescaling)
+    SHARPEN_BLUR_LEVEL = 100.0
+
+    # Blur scale -> factors taking the Laplacian and Sobel variances of the
+    # downscaled frame back to full-resolution units, which the blur
+    # thresholds were tuned in. Fitted on the sample videos and Gaussian and
+    # motion blurred copies of their frames; near the thresholds the
+    # half-scale variances are ~1.3x (Laplacian) and ~3.8x (Sobel) larger.
+    BLUR_SCORE_FACTORS = {1.0: (1.0, 1.0), 0.5: (0.77, 0.31)}
+
+    def __init__(self, clip_limit: float = 2.5, gamma: float = 1.2,
+                 denoise: Tuple[int, int, int, int] = (6, 6, 7, 15),
+                 blur_scale: float = 0.5, fast_scale: float = 0.5):
+        self.clip_limit = clip_limit
+        self.denoise = denoise
+        if blur_scale not in self.BLUR_SCORE_FACTORS:
+            raise ValueError(f"No blur score calibration for blur_scale={blur_scale}")
+        self.blur_scale = blur_scale
+        self.fast_scale = fast_scale
+        self.gamma_lut = gamma_table(gamma)
+        self.sharpen_strong = np.array([[-1, -1, -1],
+                                        [-1, 10, -1],
+                                        [-1, -1, -1]], dtype=np.float32)
+        self.sharpen_normal = np.array([[-1, -1, -1],
+                                        [-1, 9, -1],
+                                        [-1, -1, -1]], dtype=np.float32)
+        self._local = threading.local()
+
+    def _clahe(self) -> cv2.CLAHE:
+        clahe = getattr(self._local, "clahe", None)
+        if clahe is None:
+            clahe = self._local.clahe = cv2.createCLAHE(clipLimit=self.clip_limit, tileGridSize=(8, 8))
+        return clahe
+
+    def _buffer(self, name: str, shape: Tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+        """Per-thread scratch image, reallocated only when the frame size changes"""
+        buffers: Dict[str, np.ndarray] = getattr(self._local, "buffers", None)
+        if buffers is None:
+            buffers = self._local.buffers = {}
+        buf = buffers.get(name)
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = buffers[name] = np.empty(shape, dtype=dtype)
+        return buf
+
+    @staticmethod
+    def _variance(image: np.ndarray) -> float:
+        _, std = cv2.meanStdDev(image)
+        return float(std[0, 0]) ** 2
+
+    def blur_scores(self, frame: np.ndarray) -> Tuple[float, float]:
+        """Laplacian variance and summed Sobel variances of a downscaled grey frame, in full-resolution units"""
+        h, w = frame.shape[:2]
+        gray = self._buffer("blur_gray", (h, w))
+        cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=gray)
+
+        size = (max(int(w * self.blur_scale), 8), max(int(h * self.blur_scale), 8))
+        small = self._buffer("blur_small", (size[1], size[0]))
+        cv2.resize(gray, size, dst=small, interpolation=cv2.INTER_AREA)
+
+        # 3x3 derivatives of uint8 images fit in int16 without saturating
+        response = self._buffer("blur_response", small.shape, np.int16)
+        cv2.Laplacian(small, cv2.CV_16S, dst=response)
+        laplacian_var = self._variance(response)
+        cv2.Sobel(small, cv2.CV_16S, 1, 0, dst=response, ksize=3)
+        sobel_var = self._variance(response)
+        cv2.Sobel(small, cv2.CV_16S, 0, 1, dst=response, ksize=3)
+        sobel_var += self._variance(response)
+        laplacian_factor, sobel_factor = self.BLUR_SCORE_FACTORS[self.blur_scale]
+        return laplacian_var * laplacian_factor, sobel_var * sobel_factor
+
+    def is_blurry(self, frame: np.ndarray, threshold: float = 80.0) -> bool:
+        laplacian_var, sobel_var = self.blur_scores(frame)
+        return (laplacian_var < threshold) and (sobel_var < threshold * 2)
+
+    def is_noisy(self, frame: np.ndarray, threshold: Optional[float] = None) -> bool:
+        if threshold is None:
+            threshold = settings.enhancement_noise_threshold
+        h, w = frame.shape[:2]
+        gray = self._buffer("noise_gray", (h, w))
+        cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=gray)
+        return estimate_noise(gray, self._buffer("noise_response", (h, w), np.float32)) > threshold
+
+    def enhance(self, frame: np.ndarray, profile: str = "quality") -> np.ndarray:
+        if profile == "none":
+            return frame
+        if profile == "fast":
+            return self._enhance_fast(frame)
+        return self._enhance_quality(frame, denoise=(profile == "quality" or self.is_noisy(frame)))
+
+    def _enhance_fast(self, frame: np.ndarray) -> np.ndarray:
+        h, w = frame.shape[:2]
+        lab = self._buffer("lab", frame.shape)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2LAB, dst=lab)
+        l = self._buffer("l", (h, w))
+        cv2.extractChannel(lab, 0, dst=l)
+
+        size = (max(int(w * self.fast_scale), 8), max(int(h * self.fast_scale), 8))
+        small = self._buffer("fast_small", (size[1], size[0]))
+        cv2.resize(l, size, dst=small, interpolation=cv2.INTER_AREA)
+        small_clahe = self._buffer("fast_small_clahe", small.shape)
+        self._clahe().apply(small, dst=small_clahe)
+        small_delta = self._buffer("fast_small_delta", small.shape, np.int16)
+        cv2.subtract(small_clahe, small, dst=small_delta, dtype=cv2.CV_16S)
+        delta = self._buffer("fast_delta", (h, w), np.int16)
+        cv2.resize(small_delta, (w, h), dst=delta, interpolation=cv2.INTER_LINEAR)
+        cv2.add(l, delta, dst=l, dtype=cv2.CV_8U)
+        cv2.LUT(l, self.gamma_lut, dst=l)
+
+        cv2.insertChannel(l, lab, 0)
+        return cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
+
+    def _enhance_quality(self, frame: np.ndarray, denoise: bool = True) -> np.ndarray:
+        h, w = frame.shape[:2]
+        if denoise:
+            denoised = self._buffer("denoised", frame.shape)
+            cv2.fastNlMeansDenoisingColored(frame, denoised, *self.denoise)
+            frame = denoised
+
+        # CLAHE on the L channel, written back in place instead of split/merge
+        lab = self._buffer("lab", frame.shape)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2LAB, dst=lab)
+        l = self._buffer("l", (h, w))
+        cv2.extractChannel(lab, 0, dst=l)
+        l_clahe = self._buffer("l_clahe", (h, w))
+        self._clahe().apply(l, dst=l_clahe)
+        cv2.insertChannel(l_clahe, lab, 0)
+        enhanced = self._buffer("enhanced", frame.shape)
+        cv2.cvtColor(lab, cv2.COLOR_LAB2BGR, dst=enhanced)
+
+        # Adaptive sharpening based on image content
+        gray = self._buffer("gray", (h, w))
+        cv2.cvtColor(enhanced, cv2.COLOR_BGR2GRAY, dst=gray)
+        response = self._buffer("laplacian", (h, w), np.int16)
+        cv2.Laplacian(gray, cv2.CV_16S, dst=response)
+        kernel = self.sharpen_strong if self._variance(response) < self.SHARPEN_BLUR_LEVEL else self.sharpen_normal
+        sharpened = self._buffer("sharpened", frame.shape)
+        cv2.filter2D(enhanced, -1, kernel, dst=sharpened)
+
+        # Gamma correction into the (fresh) output frame
+        return cv2.LUT(sharpened, self.gamma_lut)
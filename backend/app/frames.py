@@ -0,0 +1,318 @@
+"""
+Frame sampling for the video pipelines.
+
+Both pipelines keep only 1-2 frames per second of footage that is usually
+recorded at 25-30 FPS. Reading every frame with ``cap.read()`` fully decodes
+and colour-converts all of the frames that are thrown away, so this module
+offers cheaper ways of walking the stream:
+
+- ``read``: decode every frame (the original behaviour)
+- ``grab``: ``grab()`` skipped frames, ``retrieve()`` only the kept ones
+- ``seek``: jump straight to each kept frame by position
+
+Which of ``grab`` and ``seek`` wins depends on the container and codec
+(seeking is cheap for intra-only or short-GOP streams and expensive for long
+GOPs), so ``auto`` probes both once per container type and caches the result
+for the lifetime of the process.
+"""
+
+import os
+import time
+import queue
+import logging
+import threading
+from typing import Dict, Iterable, Iterator, Optional, Set, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SAMPLING_STRATEGIES = ("read", "grab", "seek")
+
+# Number of kept frames decoded per strategy when probing a container
+PROBE_SAMPLES = 3
+
+# Marks the end of a producer's frame stream in its queue
+_END = object()
+
+# Fastest strategy per (extension, codec), shared by every job in the process
+_strategy_cache: Dict[Tuple[str, str], str] = {}
+_strategy_lock = threading.Lock()
+
+
+def _fourcc(cap: cv2.VideoCapture) -> str:
+    """Return the codec FourCC of an open capture as a string"""
+    code = int(cap.get(cv2.CAP_PROP_FOURCC))
+    return "".join(chr((code >> (8 * i)) & 0xFF) for i in range(4)).strip("\x00 ")
+
+
+def _container_key(video_path: str, cap: cv2.VideoCapture) -> Tuple[str, str]:
+    return os.path.splitext(video_path)[1].lower(), _fourcc(cap)
+
+
+def _iter_read(cap: cv2.VideoCapture, interval: int) -> Iterator[Tuple[int, np.ndarray]]:
+    idx = 0
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            return
+        if idx % interval == 0:
+            yield idx, frame
+        idx += 1
+
+
+def _iter_grab(cap: cv2.VideoCapture, interval: int) -> Iterator[Tuple[int, np.ndarray]]:
+    idx = 0
+    while cap.grab():
+        if idx % interval == 0:
+            ret, frame = cap.retrieve()
+            if not ret:
+                return
+            yield idx, frame
+        idx += 1
+
+
+def _iter_seek(cap: cv2.VideoCapture, interval: int, total_frames: int) -> Iterator[Tuple[int, np.ndarray]]:
+    idx = 0
+    while total_frames <= 0 or idx < total_frames:
+        if idx and not cap.set(cv2.CAP_PROP_POS_FRAMES, idx):
+            return
+        ret, frame = cap.read()
+        if not ret:
+            return
+        yield idx, frame
+        idx += interval
+
+
+def _iter_strategy(cap: cv2.VideoCapture, strategy: str, interval: int,
+                   total_frames: int) -> Iterator[Tuple[int, np.ndarray]]:
+    if strategy == "seek":
+        return _iter_seek(cap, interval, total_frames)
+    if strategy == "grab":
+        return _iter_grab(cap, interval)
+    return _iter_read(cap, interval)
+
+
+def _time_strategy(video_path: str, strategy: str, interval: int, samples: int) -> float:
+    """Seconds per kept frame for ``strategy``, excluding open and the first frame"""
+    cap = cv2.VideoCapture(video_path)
+    try:
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        frames = _iter_strategy(cap, strategy, interval, total_frames)
+        if next(frames, None) is None:
+            return float("inf")
+        start = time.perf_counter()
+        kept = 0
+        for _ in frames:
+            kept += 1
+            if kept >= samples:
+                break
+        elapsed = time.perf_counter() - start
+        return elapsed / kept if kept else float("inf")
+    finally:
+        cap.release()
+
+
+def choose_strategy(video_path: str, interval: int) -> str:
+    """Pick the faster of ``grab`` and ``seek`` for this video's container"""
+    if interval <= 1:
+        return "read"
+
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            return "grab"
+        key = _container_key(video_path, cap)
+    finally:
+        cap.release()
+
+    with _strategy_lock:
+        cached = _strategy_cache.get(key)
+    if cached:
+        return cached
+
+    grab_time = _time_strategy(video_path, "grab", interval, PROBE_SAMPLES)
+    seek_time = _time_strategy(video_path, "seek", interval, PROBE_SAMPLES)
+    strategy = "seek" if seek_time < grab_time else "grab"
+    logger.info(
+        f"🎞️ Sampling strategy for {key[0] or '?'}/{key[1] or '?'}: {strategy} "
+        f"(grab {grab_time * 1000:.1f}ms, seek {seek_time * 1000:.1f}ms per kept frame)"
+    )
+
+    with _strategy_lock:
+        _strategy_cache[key] = strategy
+    return strategy
+
+
+def sample_frames(
+    video_path: str,
+    fps: float = 1,
+    max_frames: Optional[int] = None,
+    strategy: str = "auto",
+    resolution: Optional[Tuple[int, int]] = None,
+) -> Iterator[Tuple[int, np.ndarray]]:
+    """Yield ``(frame_no, frame)`` for every frame kept at the requested rate.
+
+    ``frame_no`` is the index of the frame in the source video. Nothing is
+    yielded if the video cannot be opened.
+    """
+    if strategy != "auto" and strategy not in SAMPLING_STRATEGIES:
+        raise ValueError(f"Unknown sampling strategy: {strategy}")
+
+    if not os.path.exists(video_path):
+        logger.error(f"Video file not found: {video_path}")
+        return
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        logger.error(f"Could not open video: {video_path}")
+        return
+
+    try:
+        if resolution:
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, resolution[0])
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, resolution[1])
+
+        video_fps = cap.get(cv2.CAP_PROP_FPS) or 30
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        interval = max(int(round(video_fps / fps)), 1)
+
+        if strategy == "auto":
+            strategy = choose_strategy(video_path, interval)
+
+        duration = total_frames / video_fps if video_fps > 0 else 0
+        logger.info(
+            f"📹 Video: {duration:.1f}s, {video_fps:.1f} FPS, {total_frames} frames "
+            f"(every {interval} frames via {strategy})"
+        )
+
+        kept = 0
+        for frame_no, frame in _iter_strategy(cap, strategy, interval, total_frames):
+            yield frame_no, frame
+            kept += 1
+            if max_frames and kept >= max_frames:
+                break
+    finally:
+        cap.release()
+
+
+class FramePairStore:
+    """Holds only the base/present frame pairs that crops will be cut from.
+
+    Pairs are kept JPEG-encoded, so a retained 1080p pair costs a few hundred
+    kilobytes instead of ~12MB of raw pixels. Callers ``prune`` pairs nothing
+    refers to any more, so only the frames still needed are held; ``peak`` is
+    the most pairs held at once.
+    """
+
+    def __init__(self, quality: int = 95):
+        self.quality = quality
+        self._pairs: Dict[int, Tuple[bytes, bytes]] = {}
+        self.peak = 0
+
+    def __contains__(self, frame_idx: int) -> bool:
+        return frame_idx in self._pairs
+
+    def __len__(self) -> int:
+        return len(self._pairs)
+
+    def _encode(self, frame: np.ndarray) -> bytes:
+        _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        return buffer.tobytes()
+
+    def keep(self, frame_idx: int, base: np.ndarray, present: np.ndarray):
+        if frame_idx not in self._pairs:
+            self._pairs[frame_idx] = (self._encode(base), self._encode(present))
+            self.peak = max(self.peak, len(self._pairs))
+
+    def prune(self, referenced: Set[int]):
+        """Drop every pair whose frame index is not in ``referenced``"""
+        for frame_idx in [idx for idx in self._pairs if idx not in referenced]:
+            del self._pairs[frame_idx]
+
+    def encoded(self, frame_idx: int) -> Tuple[bytes, bytes]:
+        """The retained pair as JPEG bytes"""
+        return self._pairs[frame_idx]
+
+    def get(self, frame_idx: int) -> Tuple[np.ndarray, np.ndarray]:
+        base, present = self._pairs[frame_idx]
+        return (
+            cv2.imdecode(np.frombuffer(base, np.uint8), cv2.IMREAD_COLOR),
+            cv2.imdecode(np.frombuffer(present, np.uint8), cv2.IMREAD_COLOR),
+        )
+
+
+def _put(out: queue.Queue, item, stop: threading.Event) -> bool:
+    """Put ``item`` unless the consumer has stopped; returns False once stopped"""
+    while not stop.is_set():
+        try:
+            out.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _produce(frames: Iterable, out: queue.Queue, stop: threading.Event):
+    iterator = iter(frames)
+    end = _END
+    try:
+        for frame in iterator:
+            if not _put(out, frame, stop):
+                return
+    except Exception as e:
+        end = e
+    finally:
+        close = getattr(iterator, "close", None)
+        if close:
+            close()
+    _put(out, end, stop)
+
+
+def iter_frame_pairs(
+    base_frames: Iterable[np.ndarray],
+    present_frames: Iterable[np.ndarray],
+    maxsize: int = 4,
+    timer=None,
+) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """Decode both videos concurrently and yield ``(base, present)`` pairs in lockstep.
+
+    Each frame iterator runs on its own thread and feeds a bounded queue, so at
+    most ``maxsize`` frames per video are decoded ahead of the consumer.
+    OpenCV releases the GIL while decoding, so the two videos really do
+    progress in parallel. Iteration stops at the shorter video.
+
+    The iterators should only decode (and do cheap checks). Heavy OpenCV
+    work such as enhancement belongs on the consumer: OpenCV already spreads
+    one call over every core, and ``cv2.setNumThreads`` is process-wide, so
+    it can't be capped for these threads alone. Two producers each
+    denoising a frame at once oversubscribe the cores and make the job
+    slower than enhancing one frame at a time.
+    """
+    stop = threading.Event()
+    queues = [queue.Queue(maxsize=max(maxsize, 1)) for _ in range(2)]
+    threads = [
+        threading.Thread(target=_produce, args=(frames, out, stop), name=f"decode-{name}", daemon=True)
+        for frames, out, name in zip((base_frames, present_frames), queues, ("base", "present"))
+    ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        while True:
+            start = time.perf_counter()
+            pair = tuple(out.get() for out in queues)
+            if timer:
+                timer.add("decode_wait", time.perf_counter() - start)
+
+            for item in pair:
+                if isinstance(item, Exception):
+                    raise item
+            if any(item is _END for item in pair):
+                return
+            yield pair
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,267 @@
+"""
+Pluggable inference backends for the advanced pipeline.
+
+Every backend takes a list of BGR frames and returns one ``Prediction``
+(``xyxy`` boxes in frame pixels, confidences and class ids as NumPy arrays)
+per frame, after class-aware NMS. ``names`` maps class ids to the element
+names used by ``CONFIDENCE_THRESHOLDS``.
+
+- ``ultralytics``: the YOLOv8 ``.pt`` weights through PyTorch (default)
+- ``onnx``: the ONNX export (``python export_onnx.py``) through ONNX
+  Runtime's CPU provider, optionally statically quantized to INT8 with
+  calibration frames taken from sample videos
+
+Select with ``INFERENCE_BACKEND``; ``ONNX_INT8=true`` picks the quantized
+``*.int8.onnx`` file next to the FP32 export.
+"""
+
+import ast
+import logging
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+
+try:
+    import onnxruntime as ort
+    ONNX_AVAILABLE = True
+except ImportError:
+    ort = None
+    ONNX_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_BACKENDS = ("ultralytics", "onnx")
+
+# Padding colour ultralytics uses when letterboxing
+LETTERBOX_COLOR = (114, 114, 114)
+
+
+class Prediction(NamedTuple):
+    """Detections for one frame: ``xyxy`` (N, 4) float32, ``conf`` (N,) float32, ``cls`` (N,) int"""
+    xyxy: np.ndarray
+    conf: np.ndarray
+    cls: np.ndarray
+
+
+def empty_prediction() -> Prediction:
+    return Prediction(np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, np.int64))
+
+
+class UltralyticsBackend:
+    """YOLOv8 through ultralytics/PyTorch"""
+
+    name = "ultralytics"
+
+    def __init__(self, model):
+        self.model = model
+        self.names: Dict[int, str] = model.names
+
+    def __call__(self, frames: List[np.ndarray], conf: float = 0.25, iou: float = 0.45,
+                 max_det: int = 100) -> List[Prediction]:
+        results = self.model(frames, verbose=False, conf=conf, iou=iou, max_det=max_det,
+                             agnostic_nms=False)  # Class-specific NMS
+        predictions = []
+        for result in results:
+            boxes = result.boxes
+            if boxes is None or len(boxes) == 0:
+                predictions.append(empty_prediction())
+                continue
+            predictions.append(Prediction(
+                boxes.xyxy.cpu().numpy().reshape(-1, 4),
+                boxes.conf.cpu().numpy().reshape(-1),
+                boxes.cls.cpu().numpy().reshape(-1).astype(np.int64),
+            ))
+        return predictions
+
+
+def letterbox(frame: np.ndarray, size: int) -> Tuple[np.ndarray, float, Tuple[int, int]]:
+    """Resize keeping aspect ratio and pad to ``size`` x ``size`` like ultralytics.
+
+    Returns the padded image, the scale ratio and the (left, top) padding.
+    """
+    h, w = frame.shape[:2]
+    ratio = min(size / h, size / w)
+    new_w, new_h = int(round(w * ratio)), int(round(h * ratio))
+    if (new_w, new_h) != (w, h):
+        frame = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+    dw, dh = (size - new_w) / 2, (size - new_h) / 2
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    padded = cv2.copyMakeBorder(frame, top, bottom, left, right, cv2.BORDER_CONSTANT, value=LETTERBOX_COLOR)
+    return padded, ratio, (left, top)
+
+
+def decode_output(output: np.ndarray, ratio: float, pad: Tuple[int, int], shape: Tuple[int, int],
+                  conf: float = 0.25, iou: float = 0.45, max_det: int = 100) -> Prediction:
+    """Decode one image's raw YOLOv8 head output (4 + classes, anchors) into frame-space detections"""
+    pred = output.T  # (anchors, 4 + classes)
+    scores = pred[:, 4:]
+    cls = scores.argmax(axis=1)
+    confidence = scores[np.arange(len(scores)), cls]
+    keep = confidence >= conf
+    if not keep.any():
+        return empty_prediction()
+    pred, cls, confidence = pred[keep], cls[keep], confidence[keep]
+
+    # Class-aware NMS on (x, y, w, h) boxes; indices come back sorted by score
+    xywh = pred[:, :4].copy()
+    xywh[:, 0] -= xywh[:, 2] / 2
+    xywh[:, 1] -= xywh[:, 3] / 2
+    indices = cv2.dnn.NMSBoxesBatched(xywh.astype(np.float32), confidence.astype(np.float32),
+                                      cls.astype(np.int32), conf, iou)
+    indices = np.asarray(indices, dtype=np.int64).reshape(-1)[:max_det]
+    if len(indices) == 0:
+        return empty_prediction()
+
+    xyxy = np.empty((len(indices), 4), dtype=np.float32)
+    xyxy[:, :2] = xywh[indices, :2]
+    xyxy[:, 2:] = xywh[indices, :2] + xywh[indices, 2:]
+
+    # Undo the letterbox and clip to the frame
+    xyxy[:, [0, 2]] = ((xyxy[:, [0, 2]] - pad[0]) / ratio).clip(0, shape[1])
+    xyxy[:, [1, 3]] = ((xyxy[:, [1, 3]] - pad[1]) / ratio).clip(0, shape[0])
+    return Prediction(xyxy, confidence[indices].astype(np.float32), cls[indices].astype(np.int64))
+
+
+class OnnxBackend:
+    """YOLOv8 ONNX export through ONNX Runtime on CPU"""
+
+    name = "onnx"
+
+    def __init__(self, path: str, threads: int = 0):
+        if not ONNX_AVAILABLE:
+            raise RuntimeError("onnxruntime is not installed")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.path = path
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # Exports without dynamic=True only accept a batch of one
+        self.max_batch = model_input.shape[0] if isinstance(model_input.shape[0], int) else None
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names: Dict[int, str] = ast.literal_eval(metadata["names"]) if "names" in metadata else {}
+        imgsz = ast.literal_eval(metadata["imgsz"]) if "imgsz" in metadata else model_input.shape[2:]
+        self.imgsz = int(max(imgsz)) if all(isinstance(s, int) for s in imgsz) else 640
+        if not self.names:
+            logger.warning(f"⚠️ {path} has no class names in its metadata; detections will be 'unknown'")
+
+    def preprocess(self, frames: List[np.ndarray]) -> Tuple[np.ndarray, List[Tuple[float, Tuple[int, int]]]]:
+        """Letterbox frames into an NCHW float32 RGB blob"""
+        padded, transforms = [], []
+        for frame in frames:
+            image, ratio, pad = letterbox(frame, self.imgsz)
+            padded.append(image)
+            transforms.append((ratio, pad))
+        return cv2.dnn.blobFromImages(padded, scalefactor=1 / 255.0, swapRB=True), transforms
+
+    def __call__(self, frames: List[np.ndarray], conf: float = 0.25, iou: float = 0.45,
+                 max_det: int = 100) -> List[Prediction]:
+        step = self.max_batch or len(frames) or 1
+        predictions = []
+        for start in range(0, len(frames), step):
+            chunk = frames[start:start + step]
+            blob, transforms = self.preprocess(chunk)
+            outputs = self.session.run(None, {self.input_name: blob})[0]
+            for output, frame, (ratio, pad) in zip(outputs, chunk, transforms):
+                predictions.append(decode_output(output, ratio, pad, frame.shape[:2], conf, iou, max_det))
+        return predictions
+
+
+def quantize_int8(model_path: str, output_path: str, calibration_frames: Iterable[np.ndarray],
+                  per_channel: bool = True) -> str:
+    """Statically quantize an ONNX export to INT8, calibrating activations on real frames.
+
+    The frames should come from footage like the pipeline's (e.g. sample
+    videos sampled with ``frames.sample_frames``). Class names and image size
+    metadata are carried over to the quantized model.
+    """
+    import onnx
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    backend = OnnxBackend(model_path)
+
+    class _FrameReader(CalibrationDataReader):
+        def __init__(self):
+            self._frames = iter(calibration_frames)
+
+        def get_next(self) -> Optional[Dict[str, np.ndarray]]:
+            frame = next(self._frames, None)
+            if frame is None:
+                return None
+            blob, _ = backend.preprocess([frame])
+            return {backend.input_name: blob}
+
+    quantize_static(
+        model_path,
+        output_path,
+        _FrameReader(),
+        quant_format=QuantFormat.QDQ,
+        per_channel=per_channel,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+    )
+
+    source = onnx.load(model_path, load_external_data=False)
+    quantized = onnx.load(output_path)
+    existing = {prop.key for prop in quantized.metadata_props}
+    for prop in source.metadata_props:
+        if prop.key not in existing:
+            quantized.metadata_props.add(key=prop.key, value=prop.value)
+    onnx.save(quantized, output_path)
+    logger.info(f"✅ INT8 model written to {output_path}")
+    return output_path
+
+
+def int8_path(model_path: str) -> str:
+    """Where the INT8 variant of an ONNX export lives (``model.onnx`` -> ``model.int8.onnx``)"""
+    stem = model_path[:-len(".onnx")] if model_path.endswith(".onnx") else model_path
+    return f"{stem}.int8.onnx"
+
+
+def tile_grid(width: int, height: int, size: int = 640, overlap: float = 0.2,
+              top: int = 0) -> List[Tuple[int, int, int, int]]:
+    """Overlapping ``(x1, y1, x2, y2)`` tiles covering the frame below row ``top``.
+
+    The last tile in each direction is aligned to the frame edge, so every
+    pixel of the region is covered; tiles are clipped when the region is
+    smaller than ``size``.
+    """
+    step = max(int(size * (1 - overlap)), 1)
+
+    def starts(lo: int, hi: int) -> List[int]:
+        if hi - lo <= size:
+            return [lo]
+        positions = list(range(lo, hi - size, step))
+        return positions + [hi - size]
+
+    return [
+        (x, y, min(x + size, width), min(y + size, height))
+        for y in starts(top, height)
+        for x in starts(0, width)
+    ]
+
+
+def merge_predictions(predictions: List[Prediction], offsets: List[Tuple[int, int]],
+                      iou: float = 0.45, max_det: int = 100) -> Prediction:
+    """Shift tile predictions into frame coordinates and merge them with class-aware NMS"""
+    parts = [(p, offset) for p, offset in zip(predictions, offsets) if len(p.conf)]
+    if not parts:
+        return empty_prediction()
+
+    xyxy = np.concatenate([p.xyxy + np.array([ox, oy, ox, oy], np.float32) for p, (ox, oy) in parts])
+    conf = np.concatenate([p.conf for p, _ in parts]).astype(np.float32)
+    cls = np.concatenate([p.cls for p, _ in parts]).astype(np.int64)
+
+    xywh = xyxy.copy()
+    xywh[:, 2:] -= xywh[:, :2]
+    indices = cv2.dnn.NMSBoxesBatched(xywh, conf, cls.astype(np.int32), 0.0, iou)
+    indices = np.asarray(indices, dtype=np.int64).reshape(-1)[:max_det]
+    return Prediction(xyxy[indices], conf[indices], cls[indices])
@@ -0,0 +1,183 @@
+"""
+Batched persistence of a job's issues.
+
+The pipelines used to ``db.add`` an ``Issue`` object per issue and write
+everything in one final commit: ORM bookkeeping for every row and one large
+transaction, which also meant a job failing late lost all its issues.
+``IssueWriter`` takes issue rows as plain dicts and inserts them in batches
+of ``ISSUE_BATCH_SIZE`` with a single executemany-style ``INSERT`` each,
+committing after every batch, so issues found before a failure are kept.
+
+Row values may be futures, e.g. crops still being encoded on the
+``JobCrops`` pool; they are resolved in row order when their batch is
+written, so encoding overlaps with detection until then. A future that
+fails leaves its column empty (an issue without that crop) rather than
+losing the batch.
+
+The basic pipeline compares single frame pairs, so an element missing for
+20 seconds used to produce 20 issues, each with two crops. ``IssueMerger``
+folds issues of the same element and issue type whose boxes overlap
+(IoU >= ``MERGE_IOU``) in consecutive analysed frames into one issue
+spanning ``first_frame..last_frame``; pairs skipped by the change gate are
+not analysed, so they do not split an issue. Only the most confident frame's issue (and the
+frames to crop it from) is kept per merged issue, and crops are made once,
+when the issue closes.
+"""
+
+import logging
+import uuid
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .matching import match_detections
+from .models import Issue
+
+logger = logging.getLogger(__name__)
+
+# Overlap between an open issue's last box and a new frame's box for them to merge
+MERGE_IOU = 0.1
+# Analysed frames from an issue's last sighting to the next one for it to be
+# extended (1 = it must be seen again in the next analysed frame). Gated
+# pairs are not analysed and do not count.
+MERGE_MAX_GAP = 1
+
+SEVERITY_RANK = {"LOW": 0, "MEDIUM": 1, "HIGH": 2}
+
+
+class IssueWriter:
+    """Buffers one job's issue rows and inserts them in batches"""
+
+    def __init__(self, db: Session, batch_size: Optional[int] = None):
+        self.db = db
+        self.batch_size = max(batch_size or settings.issue_batch_size, 1)
+        self.written = 0
+        self.batches = 0
+        self.failed_values = 0
+        self._pending: List[Dict] = []
+
+    def add(self, row: Dict) -> Dict:
+        """Queue an issue row (``Issue`` column names); flushes once a batch is full"""
+        row.setdefault("id", str(uuid.uuid4()))
+        self._pending.append(row)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+        return row
+
+    def flush(self):
+        """Insert and commit the queued rows"""
+        if not self._pending:
+            return
+        for row in self._pending:
+            for column, value in row.items():
+                if isinstance(value, Future):
+                    row[column] = self._resolve(row, column, value)
+        self.db.execute(insert(Issue), self._pending)
+        self.db.commit()
+        self.written += len(self._pending)
+        self.batches += 1
+        self._pending = []
+
+    def _resolve(self, row: Dict, column: str, future: Future):
+        try:
+            return future.result()
+        except Exception as e:
+            self.failed_values += 1
+            logger.warning(f"⚠️ Issue {row['id']}: {column} failed, stored without it: {e}")
+            return None
+
+
+def resolve_issue_merge(metadata: Optional[dict]) -> bool:
+    """Whether a job merges issues across frames (metadata "merge_issues" overrides ``ISSUE_MERGE``)"""
+    enabled = (metadata or {}).get("merge_issues", settings.issue_merge)
+    if isinstance(enabled, str):
+        enabled = enabled.lower() == "true"
+    return bool(enabled)
+
+
+class MergedIssue:
+    """One element's issue across consecutive frames; ``best`` is its most confident frame's issue"""
+
+    __slots__ = ("element", "issue_type", "severity", "first_frame", "last_frame", "frames", "bbox",
+                 "best", "best_frame", "base_frame", "present_frame", "seen")
+
+    def __init__(self, frame_idx: int, issue: Dict, base_frame, present_frame):
+        detection = issue["detection"]
+        self.element = detection["element"]
+        self.issue_type = issue["issue_type"]
+        self.severity = issue["severity"]
+        self.first_frame = self.last_frame = frame_idx
+        self.frames = 0
+        self.seen = 0  # IssueMerger's count of analysed frames when last extended
+        self.best = None
+        self.extend(frame_idx, issue, base_frame, present_frame)
+
+    @property
+    def label(self) -> str:
+        return f"{self.element}/{self.issue_type}"
+
+    def extend(self, frame_idx: int, issue: Dict, base_frame, present_frame):
+        detection = issue["detection"]
+        self.last_frame = frame_idx
+        self.frames += 1
+        self.bbox = detection["bbox"]
+        if SEVERITY_RANK.get(issue["severity"], 0) > SEVERITY_RANK.get(self.severity, 0):
+            self.severity = issue["severity"]
+        if self.best is None or detection["confidence"] > self.best["detection"]["confidence"]:
+            self.best, self.best_frame = issue, frame_idx
+            self.base_frame, self.present_frame = base_frame, present_frame
+
+
+class IssueMerger:
+    """Folds a stream of per-frame issues into ``MergedIssue`` spans, frame by frame.
+
+    ``update`` is called for every analysed frame, with or without issues,
+    and returns the issues that can no longer be extended, oldest first;
+    ``finish`` returns the rest. Gaps are counted in ``update`` calls, so
+    frames that are never analysed (gated pairs) do not end an issue. With
+    ``enabled=False`` every issue comes back on its own, as the frame it was
+    found in.
+    """
+
+    def __init__(self, enabled: bool = True, min_iou: float = MERGE_IOU, max_gap: int = MERGE_MAX_GAP):
+        self.enabled = enabled
+        self.min_iou = min_iou
+        self.max_gap = max_gap
+        self.detected = 0
+        self.merged = 0
+        self._analysed = 0
+        self._open: List[MergedIssue] = []
+
+    def update(self, frame_idx: int, issues: List[Dict], base_frame, present_frame) -> List[MergedIssue]:
+        self.detected += len(issues)
+        if not self.enabled:
+            return [MergedIssue(frame_idx, issue, base_frame, present_frame) for issue in issues]
+
+        self._analysed += 1
+        live = self._open
+        result = match_detections(
+            [m.bbox for m in live], [m.label for m in live],
+            [i["detection"]["bbox"] for i in issues],
+            [f"{i['detection']['element']}/{i['issue_type']}" for i in issues],
+            min_iou=self.min_iou, stable_iou=0.0,
+        )
+        for live_idx, issue_idx, _ in result.matched + result.moved:
+            live[live_idx].extend(frame_idx, issues[issue_idx], base_frame, present_frame)
+            live[live_idx].seen = self._analysed
+        self.merged += len(result.matched) + len(result.moved)
+        opened = [MergedIssue(frame_idx, issues[i], base_frame, present_frame) for i in result.new]
+        for merged in opened:
+            merged.seen = self._analysed
+
+        # Issues that went unseen for too long are final
+        closed = [m for m in live if self._analysed - m.seen >= self.max_gap]
+        self._open = [m for m in live if self._analysed - m.seen < self.max_gap] + opened
+        return sorted(closed, key=lambda m: m.first_frame)
+
+    def finish(self) -> List[MergedIssue]:
+        closed = sorted(self._open, key=lambda m: m.first_frame)
+        self._open = []
+        return closed
@@ -0,0 +1,216 @@
+"""
+Matching of base detections to present detections.
+
+Both pipelines compare a base and a present set of detections by IoU. For
+each element type the IoU matrix is computed at once with NumPy
+broadcasting, then detections are paired by an optimal assignment (maximum
+total IoU, Hungarian method) instead of greedily, so an early base
+detection cannot take the partner a later one overlaps better. Most
+detections overlap at most one candidate; only groups of competing
+detections go through the assignment solver.
+
+Pairs with an IoU below ``min_iou`` are not matches. ``match_detections``
+sorts everything in one pass:
+
+- ``matched``: pairs with IoU >= ``stable_iou``
+- ``moved``: pairs with ``min_iou`` <= IoU < ``stable_iou``
+- ``missing``: base detections left without a partner
+- ``new``: present detections left without a partner
+
+The assignment uses ``scipy.optimize.linear_sum_assignment`` when SciPy is
+installed and an equivalent NumPy implementation otherwise.
+"""
+
+from typing import Hashable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from scipy.optimize import linear_sum_assignment
+    SCIPY_AVAILABLE = True
+except ImportError:
+    linear_sum_assignment = None
+    SCIPY_AVAILABLE = False
+
+Pair = Tuple[int, int, float]
+
+
+class MatchResult(NamedTuple):
+    """Indices into the base/present lists; pairs are ``(base_idx, present_idx, iou)``, in base order"""
+    matched: List[Pair]
+    moved: List[Pair]
+    missing: List[int]
+    new: List[int]
+
+
+def iou_matrix(boxes_a, boxes_b) -> np.ndarray:
+    """IoU of every ``(x1, y1, x2, y2)`` box in ``boxes_a`` with every box in ``boxes_b``"""
+    a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+    inter_w = np.clip(np.minimum(a[:, None, 2], b[None, :, 2]) - np.maximum(a[:, None, 0], b[None, :, 0]), 0, None)
+    inter_h = np.clip(np.minimum(a[:, None, 3], b[None, :, 3]) - np.maximum(a[:, None, 1], b[None, :, 1]), 0, None)
+    inter = inter_w * inter_h
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+def _hungarian(cost: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Minimum-cost assignment of every row of ``cost`` (rows <= columns), shortest augmenting paths"""
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    owner = np.zeros(m + 1, dtype=np.int64)  # 1-based row assigned to each column, 0 = free
+    way = np.zeros(m + 1, dtype=np.int64)
+
+    for row in range(1, n + 1):
+        owner[0] = row
+        col = 0
+        min_reduced = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[col] = True
+            current = owner[col]
+            free = ~used
+            free[0] = False
+            reduced = cost[current - 1] - u[current] - v[1:]
+            better = free[1:] & (reduced < min_reduced[1:])
+            min_reduced[1:][better] = reduced[better]
+            way[1:][better] = col
+            candidates = np.where(free, min_reduced, np.inf)
+            next_col = int(np.argmin(candidates))
+            delta = candidates[next_col]
+            u[owner[used]] += delta
+            v[used] -= delta
+            min_reduced[free] -= delta
+            col = next_col
+            if owner[col] == 0:
+                break
+        # Flip the augmenting path
+        while col:
+            previous = way[col]
+            owner[col] = owner[previous]
+            col = previous
+
+    cols = np.nonzero(owner[1:])[0]
+    rows = owner[1:][cols] - 1
+    order = np.argsort(rows)
+    return rows[order], cols[order]
+
+
+def optimal_assignment(score: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Row and column indices of the assignment maximising the total ``score``"""
+    if score.size == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+    if SCIPY_AVAILABLE:
+        rows, cols = linear_sum_assignment(score, maximize=True)
+        return rows.astype(np.int64), cols.astype(np.int64)
+    if score.shape[0] > score.shape[1]:
+        cols, rows = _hungarian(-score.T)
+        order = np.argsort(rows)
+        return rows[order], cols[order]
+    return _hungarian(-score)
+
+
+def _components(score: np.ndarray) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """Rows and columns of each connected group of non-zero scores.
+
+    Detections only compete with overlapping detections of the same type,
+    so the assignment splits into many small independent problems.
+    """
+    n = score.shape[0]
+    rows, cols = np.nonzero(score)
+    parent = list(range(n + score.shape[1]))
+
+    def find(node):
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for row, col in zip(rows.tolist(), (cols + n).tolist()):
+        a, b = find(row), find(col)
+        if a != b:
+            parent[max(a, b)] = min(a, b)
+
+    nodes = np.unique(np.concatenate([rows, cols + n]))
+    roots = np.array([find(node) for node in nodes.tolist()], dtype=np.int64)
+    order = np.argsort(roots, kind="stable")
+    nodes, roots = nodes[order], roots[order]
+    groups = []
+    for members in np.split(nodes, np.nonzero(np.diff(roots))[0] + 1):
+        groups.append((members[members < n], members[members >= n] - n))
+    return groups
+
+
+def _assign(score: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Optimal pairs (rows, cols) of a score matrix, zero-score pairs excluded"""
+    rows_out, cols_out = [], []
+
+    # A pair that is each side's only candidate is matched outright
+    candidates = score > 0
+    lone = candidates & (candidates.sum(axis=1) == 1)[:, None] & (candidates.sum(axis=0) == 1)[None, :]
+    rows, cols = np.nonzero(lone)
+    rows_out.append(rows)
+    cols_out.append(cols)
+    score = score.copy()
+    score[rows, :] = 0
+    score[:, cols] = 0
+
+    # The rest are solved per group of competing detections
+    for rows, cols in _components(score):
+        if len(rows) == 1:
+            r, c = np.zeros(1, dtype=np.int64), np.array([np.argmax(score[rows[0], cols])])
+        elif len(cols) == 1:
+            r, c = np.array([np.argmax(score[rows, cols[0]])]), np.zeros(1, dtype=np.int64)
+        else:
+            r, c = optimal_assignment(score[np.ix_(rows, cols)])
+        keep = score[rows[r], cols[c]] > 0
+        rows_out.append(rows[r[keep]])
+        cols_out.append(cols[c[keep]])
+    return np.concatenate(rows_out), np.concatenate(cols_out)
+
+
+def match_detections(base_boxes, base_labels: Sequence[Hashable], present_boxes,
+                     present_labels: Sequence[Hashable], min_iou: float, stable_iou: float,
+                     allowed: Optional[np.ndarray] = None) -> MatchResult:
+    """Optimally pair base and present detections of the same label and classify the outcome.
+
+    ``allowed`` is an optional (base, present) boolean mask of pairs that may match at all.
+    """
+    n, m = len(base_labels), len(present_labels)
+    matched, moved = [], []
+    partner = np.full(n, -1, dtype=np.int64)
+    partner_iou = np.zeros(n)
+    present_taken = np.zeros(m, dtype=bool)
+
+    if n and m:
+        base_boxes = np.asarray(base_boxes, dtype=np.float64).reshape(-1, 4)
+        present_boxes = np.asarray(present_boxes, dtype=np.float64).reshape(-1, 4)
+        _, codes = np.unique(np.asarray(list(base_labels) + list(present_labels), dtype=object).astype(str),
+                             return_inverse=True)
+        base_codes, present_codes = codes[:n], codes[n:]
+
+        # Only detections of the same type compete, so each type is its own problem
+        for code in np.intersect1d(base_codes, present_codes):
+            base_idx = np.nonzero(base_codes == code)[0]
+            present_idx = np.nonzero(present_codes == code)[0]
+            iou = iou_matrix(base_boxes[base_idx], present_boxes[present_idx])
+            # Pairs below min_iou score 0, the same as staying unmatched
+            eligible = iou >= min_iou
+            if allowed is not None:
+                eligible &= allowed[np.ix_(base_idx, present_idx)]
+            r, c = _assign(np.where(eligible, iou, 0.0))
+            partner[base_idx[r]] = present_idx[c]
+            partner_iou[base_idx[r]] = iou[r, c]
+            present_taken[present_idx[c]] = True
+
+        for base_idx in np.nonzero(partner >= 0)[0]:
+            value = float(partner_iou[base_idx])
+            (matched if value >= stable_iou else moved).append((int(base_idx), int(partner[base_idx]), value))
+
+    missing = [int(i) for i in np.nonzero(partner < 0)[0]]
+    new = [int(j) for j in np.nonzero(~present_taken)[0]]
+    return MatchResult(matched, moved, missing, new)
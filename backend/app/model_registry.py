@@ -0,0 +1,117 @@
+"""
+Process-wide registry of loaded detection models and shared clients.
+
+Loading YOLOv8x weights takes seconds and the first inference pays for
+lazy initialisation (fused layers, allocator warm-up), so every model is
+loaded once per process and warmed up with a dummy inference. Jobs, which
+run on background threads or in a long-lived RQ worker, then share the
+warm model. Inference on a shared model is serialised with a lock, since
+ultralytics predictors keep per-call state on the model object.
+
+A model is keyed by its path and the weights file's modification time, so
+replacing the weights on disk loads the new version on the next job.
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Image used for the warm-up inference (height, width, channels)
+WARMUP_SHAPE = (640, 640, 3)
+
+_models: Dict[Tuple[str, Optional[float]], "SharedModel"] = {}
+_clients: Dict[str, Any] = {}
+_registry_lock = threading.Lock()
+
+
+class SharedModel:
+    """A loaded model shared by every job in the process; calls are serialised"""
+
+    def __init__(self, model: Any, path: str, load_seconds: float):
+        self.model = model
+        self.path = path
+        self.load_seconds = load_seconds
+        self.warmup_seconds = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def names(self) -> Dict[int, str]:
+        return self.model.names
+
+    @property
+    def backend(self) -> str:
+        return getattr(self.model, "name", type(self.model).__name__)
+
+    def __call__(self, *args, **kwargs):
+        with self._lock:
+            return self.model(*args, **kwargs)
+
+    def warm_up(self, shape: Tuple[int, int, int] = WARMUP_SHAPE, **kwargs):
+        start = time.perf_counter()
+        self([np.zeros(shape, dtype=np.uint8)], **kwargs)
+        self.warmup_seconds = time.perf_counter() - start
+
+
+def _version(path: str) -> Optional[float]:
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None  # e.g. a hub model name downloaded on first load
+
+
+def get_model(path: str, loader: Callable[[str], Any], warmup: bool = True) -> SharedModel:
+    """Return the shared model for ``path``, loading and warming it up on first use.
+
+    ``loader`` builds the model from a path, e.g. an ``inference`` backend.
+    Loading errors propagate to the caller and nothing is cached.
+    """
+    key = (path, _version(path))
+    with _registry_lock:
+        shared = _models.get(key)
+        if shared is not None:
+            return shared
+
+        start = time.perf_counter()
+        shared = SharedModel(loader(path), path, time.perf_counter() - start)
+        if warmup:
+            try:
+                shared.warm_up()
+            except Exception as e:
+                logger.warning(f"⚠️ Warm-up inference failed for {path}: {e}")
+
+        # Drop older versions of the same weights
+        for stale in [k for k in _models if k[0] == path]:
+            del _models[stale]
+        _models[key] = shared
+        logger.info(
+            f"✅ Model {path} loaded in {shared.load_seconds:.2f}s "
+            f"(warm-up {shared.warmup_seconds:.2f}s), shared by all jobs"
+        )
+        return shared
+
+
+def get_mongo_client(uri: str, factory: Callable[[str], Any]) -> Any:
+    """Return the process-wide client for ``uri`` (MongoClient pools connections and is thread-safe)"""
+    with _registry_lock:
+        client = _clients.get(uri)
+        if client is None:
+            client = _clients[uri] = factory(uri)
+        return client
+
+
+def clear():
+    """Forget every loaded model and close shared clients"""
+    with _registry_lock:
+        _models.clear()
+        for client in _clients.values():
+            try:
+                client.close()
+            except Exception:
+                pass
+        _clients.clear()
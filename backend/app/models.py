@@ -31,7 +31,9 @@ class Issue(Base):
     last_frame = Column(Integer)
     base_crop_url = Column(Text)
     present_crop_url = Column(Text)
-    reason = Column(Text)
+    reason = Column(Text)  # Issues stored before reason templates
+    reason_template = Column(String, nullable=True)
+    reason_params = Column(JSON, nullable=True)
     gps = Column(JSON, nullable=True)
     status = Column(String, default="open")
 
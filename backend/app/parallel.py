@@ -0,0 +1,170 @@
+"""
+Process-pool frame pair analysis for the basic pipeline.
+
+Enhancing, detecting and comparing a frame pair only depends on that pair,
+so with ``DETECTION_WORKERS`` > 1 pairs are fanned out to a pool of worker
+processes while the job's own process keeps decoding. Each pair travels
+through a ``multiprocessing.shared_memory`` block instead of being pickled:
+the parent copies the decoded frames in, the worker enhances them in place,
+and only the (small) detection and issue dicts come back through the pool.
+
+Results are handed back strictly in frame order, so issues are created in
+the same order as in serial mode. The pool uses the ``spawn`` start method
+(OpenCV's thread pools do not survive ``fork``) and is created lazily, once
+per process.
+"""
+
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context, shared_memory
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .timings import StageTimer
+
+logger = logging.getLogger(__name__)
+
+# Pairs in flight per worker process; bounds shared memory to a few frames per worker
+PAIRS_PER_WORKER = 2
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+Shape = Tuple[int, ...]
+
+
+def get_pool(workers: int) -> ProcessPoolExecutor:
+    """Return the process-wide detection pool, (re)creating it for ``workers`` processes"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+            _pool_workers = workers
+            logger.info(f"🧵 Started detection pool with {workers} worker processes")
+        return _pool
+
+
+def shutdown_pool():
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool, _pool_workers = None, 0
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    try:
+        # The parent owns (and unlinks) the block; workers must not track it
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13: spawned workers share the parent's resource tracker,
+        # so the registration made here is released by the parent's unlink
+        return shared_memory.SharedMemory(name=name)
+
+
+def _frame_views(shm: shared_memory.SharedMemory, shapes: List[Shape]) -> List[np.ndarray]:
+    views, offset = [], 0
+    for shape in shapes:
+        view = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=offset)
+        views.append(view)
+        offset += view.nbytes
+    return views
+
+
+def _analyze_shared(name: str, shapes: List[Shape], frame_idx: int, profile: str,
+                    gate_threshold: Optional[float] = None):
+    """Worker process: enhance the shared pair in place, then detect and compare"""
+    from .change_gate import ChangeGate
+    from .worker import analyze_pair
+
+    shm = _attach(name)
+    try:
+        base, present = _frame_views(shm, shapes)
+        timer = StageTimer()
+        gate = ChangeGate(gate_threshold) if gate_threshold is not None else None
+        base_enhanced, present_enhanced, base_det, present_det, issues, gated = analyze_pair(
+            base, present, frame_idx, profile=profile, timer=timer, gate=gate
+        )
+        # Crops are cut by the parent from the enhanced frames
+        base[...] = base_enhanced
+        present[...] = present_enhanced
+        del base, present, base_enhanced, present_enhanced
+        return base_det, present_det, issues, gated, timer.totals()
+    finally:
+        shm.close()
+
+
+def _share(base: np.ndarray, present: np.ndarray) -> Tuple[shared_memory.SharedMemory, List[Shape]]:
+    frames = [np.ascontiguousarray(base, dtype=np.uint8), np.ascontiguousarray(present, dtype=np.uint8)]
+    shm = shared_memory.SharedMemory(create=True, size=sum(frame.nbytes for frame in frames))
+    shapes = [frame.shape for frame in frames]
+    for view, frame in zip(_frame_views(shm, shapes), frames):
+        view[...] = frame
+    return shm, shapes
+
+
+def _release(shm: shared_memory.SharedMemory):
+    shm.close()
+    shm.unlink()
+
+
+def process_pairs(
+    pairs: Iterable[Tuple[np.ndarray, np.ndarray]],
+    profile: str,
+    workers: int,
+    timer: Optional[StageTimer] = None,
+    gate=None,
+) -> Iterator[Tuple[int, np.ndarray, np.ndarray, list, list, list, bool]]:
+    """Analyze raw ``(base, present)`` pairs on the pool, yielding results in frame order.
+
+    Yields ``(frame_idx, base, present, base_detections, present_detections,
+    issues, gated)`` like ``worker.iter_pair_results``, with the enhanced
+    frames. ``gate`` (a ``change_gate.ChangeGate``) is applied in the workers.
+    """
+    gate_threshold = gate.threshold if gate is not None else None
+    timer = timer or StageTimer()
+    pool = get_pool(workers)
+    pending = deque()
+
+    def collect():
+        frame_idx, shm, shapes, future = pending.popleft()
+        try:
+            start = time.perf_counter()
+            try:
+                base_det, present_det, issues, gated, totals = future.result()
+            except BrokenProcessPool:
+                shutdown_pool()
+                raise
+            timer.add("detect_wait", time.perf_counter() - start)
+            timer.merge(totals)
+            base, present = (view.copy() for view in _frame_views(shm, shapes))
+        finally:
+            _release(shm)
+        return frame_idx, base, present, base_det, present_det, issues, gated
+
+    try:
+        for frame_idx, (base, present) in enumerate(pairs):
+            shm, shapes = _share(base, present)
+            try:
+                future = pool.submit(_analyze_shared, shm.name, shapes, frame_idx, profile, gate_threshold)
+            except Exception:
+                _release(shm)
+                raise
+            pending.append((frame_idx, shm, shapes, future))
+            while len(pending) >= workers * PAIRS_PER_WORKER:
+                yield collect()
+        while pending:
+            yield collect()
+    finally:
+        # Abandoned pairs: a worker still holding a mapping keeps it valid after unlink
+        for _, shm, _, future in pending:
+            future.cancel()
+            _release(shm)
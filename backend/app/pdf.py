@@ -1,6 +1,7 @@
 from jinja2 import Template
 from datetime import datetime
 from .models import Job, Issue
+from .reasons import issue_reason
 
 # Try to import WeasyPrint, but don't fail if not available
 try:
@@ -134,7 +135,7 @@ def generate_pdf(job: Job, issues: list[Issue]) -> bytes:
                 'confidence': issue.confidence,
                 'first_frame': issue.first_frame,
                 'last_frame': issue.last_frame if hasattr(issue, 'last_frame') else issue.first_frame,
-                'reason': issue.reason
+                'reason': issue_reason(issue)
             }
             processed_issues.append(issue_dict)
         
@@ -337,7 +338,7 @@ def generate_simple_html_report(job: Job, issues: list[Issue]) -> bytes:
             <p><strong>Type:</strong> {issue.issue_type.upper()} | 
                <strong>Severity:</strong> <span class="{issue.severity}">{issue.severity}</span> | 
                <strong>Confidence:</strong> {issue.confidence:.1%}</p>
-            <p><strong>Reason:</strong> {issue.reason}</p>
+            <p><strong>Reason:</strong> {issue_reason(issue)}</p>
             <p><strong>Location:</strong> Frame {issue.first_frame}</p>
         </div>
         """
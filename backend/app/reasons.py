@@ -0,0 +1,211 @@
+"""
+Issue reasons, rendered from templates when they are read.
+
+Reasons used to be stored on every Issue as several hundred bytes of prose,
+most of it boilerplate shared by every issue of the same element and issue
+type. Issues now store a ``reason_template`` id and a few ``reason_params``
+(frame, location, confidence, area...) and the API, CSV export and reports
+render the text with ``issue_reason``. Changing the wording only means
+editing ``REASON_TEMPLATES``; stored issues pick it up without a migration.
+
+Templates are ``str.format`` strings. Besides the stored params they can use
+``element`` (``road_sign``), ``element_name`` (``road sign``),
+``element_label`` (``ROAD SIGN``), ``element_title`` (``Road Sign``),
+``issue_type`` and ``issue_label`` (``MISSING``). Issues stored before
+templates existed keep their ``reason`` text.
+"""
+
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+Reason = Tuple[str, Dict]
+
+# Template id -> text. "frame.*" are the basic pipeline's frame-by-frame
+# reasons, "safety.*" the advanced pipeline's one-line safety reasons.
+REASON_TEMPLATES: Dict[str, str] = {
+    "frame.missing.billboard": (
+        "🚨 FRAME {frame}: CRITICAL - Large billboard MISSING\n"
+        "📍 Location: {location}\n"
+        "📊 Detection: {confidence:.1%} confidence, {area:,} pixels area\n"
+        "🔍 Analysis: Billboard was clearly visible in base frame but completely absent in current frame. "
+        "This could indicate unauthorized removal, structural collapse, or obstruction. "
+        "Requires immediate inspection as billboard removal may affect driver navigation and revenue."
+    ),
+    "frame.missing.road_sign": (
+        "🚨 FRAME {frame}: CRITICAL - Road sign MISSING\n"
+        "📍 Location: {location}\n"
+        "📊 Detection: {confidence:.1%} confidence\n"
+        "🔍 Analysis: Directional/informational road sign present in base frame is now absent. "
+        "This creates a serious safety hazard as drivers lose critical navigation information. "
+        "Sign may have been vandalized, stolen, or knocked down. IMMEDIATE REPLACEMENT REQUIRED."
+    ),
+    "frame.missing.guardrail": (
+        "🚨 FRAME {frame}: CRITICAL - Guardrail MISSING\n"
+        "📍 Location: {location}\n"
+        "📊 Detection: {confidence:.1%} confidence, span ~{aspect_ratio:.1f}x width\n"
+        "🔍 Analysis: Safety guardrail that was protecting road edge is now missing. "
+        "This poses EXTREME DANGER - vehicles could veer off road causing serious accidents. "
+        "Guardrail may have been damaged in collision or removed for maintenance. URGENT REPAIR NEEDED."
+    ),
+    "frame.missing.lane_marking": (
+        "⚠️ FRAME {frame}: HIGH PRIORITY - Lane marking FADED/MISSING\n"
+        "📍 Location: {location}\n"
+        "📊 Detection: {confidence:.1%} confidence\n"
+        "🔍 Analysis: Lane marking visible in base frame has deteriorated significantly or disappeared. "
+        "This reduces road clarity and increases accident risk, especially at night and in rain. "
+        "Repainting required to maintain traffic flow safety."
+    ),
+    "frame.missing.road_divider": (
+        "🚨 FRAME {frame}: CRITICAL - Road divider MISSING\n"
+        "📍 Location: {location}\n"
+        "📊 Detection: {confidence:.1%} confidence\n"
+        "🔍 Analysis: Center divider/median barrier is missing or severely damaged. "
+        "This allows vehicles to cross into oncoming traffic lanes - HIGH RISK of head-on collisions. "
+        "Immediate barrier replacement or temporary protection measures required."
+    ),
+    "frame.missing.pavement_damage": (
+        "⚠️ FRAME {frame}: NOTICE - New pavement damage detected\n"
+        "📍 Location: {location}\n"
+        "📊 Detection: {confidence:.1%} confidence, {area:,} pixels area\n"
+        "🔍 Analysis: New pothole, crack, or pavement deterioration detected in current frame. "
+        "Not visible in base frame, indicating recent development. Monitor for expansion and schedule repair."
+    ),
+    "frame.missing": (
+        "⚠️ FRAME {frame}: {element_label} MISSING\n"
+        "📍 Location: {location}\n"
+        "📊 Detection: {confidence:.1%} confidence\n"
+        "🔍 Analysis: Element detected in base frame is absent in current frame. Investigation required."
+    ),
+    "frame.moved.billboard": (
+        "⚠️ FRAME {frame}: WARNING - Billboard position changed\n"
+        "📍 Location: {location}\n"
+        "📊 Detection: {confidence:.1%} confidence\n"
+        "🔍 Analysis: Billboard location has shifted compared to base frame. "
+        "This could indicate structural instability, foundation issues, or unauthorized modification. "
+        "Verify structural integrity and proper installation."
+    ),
+    "frame.moved.road_sign": (
+        "⚠️ FRAME {frame}: WARNING - Road sign displaced\n"
+        "📍 Location: {location}\n"
+        "📊 Detection: {confidence:.1%} confidence\n"
+        "🔍 Analysis: Sign position has changed between frames. May have been hit by vehicle, "
+        "loosened by weather, or improperly reinstalled. Verify correct angle and position for optimal visibility."
+    ),
+    "frame.moved.guardrail": (
+        "🚨 FRAME {frame}: HIGH PRIORITY - Guardrail displaced\n"
+        "📍 Location: {location}\n"
+        "📊 Detection: {confidence:.1%} confidence\n"
+        "🔍 Analysis: Guardrail has shifted from original position. Likely caused by vehicle impact. "
+        "Compromised guardrails may not provide adequate protection. Inspect for structural damage and realign."
+    ),
+    "frame.moved.road_divider": (
+        "⚠️ FRAME {frame}: WARNING - Road divider shifted\n"
+        "📍 Location: {location}\n"
+        "📊 Detection: {confidence:.1%} confidence\n"
+        "🔍 Analysis: Center divider position has changed. May indicate foundation issues or impact damage. "
+        "Check structural integrity and proper lane separation."
+    ),
+    "frame.moved": (
+        "⚠️ FRAME {frame}: {element_label} POSITION CHANGED\n"
+        "📍 Location: {location}\n"
+        "📊 Detection: {confidence:.1%} confidence\n"
+        "🔍 Analysis: Element location has shifted between base and current frame. Verification recommended."
+    ),
+    "frame.damaged.billboard": (
+        "⚠️ FRAME {frame}: MAINTENANCE - Billboard shows deterioration\n"
+        "📍 Location: {location}\n"
+        "📊 Detection: {confidence:.1%} confidence\n"
+        "🔍 Analysis: Billboard shows signs of wear, fading, or damage compared to base frame. "
+        "May affect visibility and brand representation. Schedule maintenance or replacement."
+    ),
+    "frame.damaged.road_sign": (
+        "⚠️ FRAME {frame}: MAINTENANCE - Road sign degraded\n"
+        "📍 Location: {location}\n"
+        "📊 Detection: {confidence:.1%} confidence\n"
+        "🔍 Analysis: Sign shows fading, corrosion, or damage affecting readability. "
+        "Reduced reflectivity impacts night visibility. Clean or replace to maintain driver safety."
+    ),
+    "frame.damaged.lane_marking": (
+        "⚠️ FRAME {frame}: MAINTENANCE - Lane marking faded\n"
+        "📍 Location: {location}\n"
+        "📊 Detection: {confidence:.1%} confidence\n"
+        "🔍 Analysis: Lane marking has degraded by an estimated 40-60% compared to base condition. "
+        "Weather wear and traffic have reduced visibility. Schedule repainting to restore road clarity."
+    ),
+    "frame.damaged": (
+        "⚠️ FRAME {frame}: {element_label} DAMAGED\n"
+        "📍 Location: {location}\n"
+        "📊 Detection: {confidence:.1%} confidence\n"
+        "🔍 Analysis: Element shows visible damage or deterioration. Inspection and maintenance recommended."
+    ),
+    "frame": "Frame {frame}: {element_name} - {issue_type} detected at {location}",
+
+    "safety.sign_board.missing": "⚠️ CRITICAL: Traffic sign missing - immediate replacement required",
+    "safety.sign_board.moved": "⚠️ WARNING: Sign position altered - verify compliance with standards",
+    "safety.sign_board.changed": "⚠️ NOTICE: Sign condition changed - inspect for damage/fading",
+    "safety.lane_marking.missing": "⚠️ HIGH: Lane marking completely worn - immediate repainting needed",
+    "safety.lane_marking.moved": "⚠️ MEDIUM: Lane alignment shifted - review road geometry",
+    "safety.faded_marking.changed": "⚠️ NOTICE: Marking visibility <50% - schedule maintenance",
+    "safety.pothole.new": "⚠️ HIGH: New pothole detected - depth assessment required",
+    "safety.crack.new": "⚠️ MEDIUM: Pavement crack identified - monitor progression",
+    "safety.guardrail.missing": "⚠️ CRITICAL: Safety barrier missing - accident risk",
+    "safety.guardrail.moved": "⚠️ HIGH: Barrier displacement - structural integrity check needed",
+    "safety.divider.missing": "⚠️ CRITICAL: Road divider compromised - traffic separation lost",
+    "safety.divider.moved": "⚠️ HIGH: Divider shifted - realignment required",
+    "safety": "⚠️ {issue_label}: {element_title} issue detected",
+}
+
+# Appended to every "safety.*" reason
+SAFETY_CONFIDENCE = " [Confidence: {confidence:.1%}]"
+
+
+@lru_cache(maxsize=None)
+def template_id(family: str, element: str, issue_type: str) -> str:
+    """Most specific template of ``family`` for an element and issue type"""
+    if family == "safety":
+        candidates = (f"safety.{element}.{issue_type}", "safety")
+    else:
+        candidates = (f"{family}.{issue_type}.{element}", f"{family}.{issue_type}", family)
+    return next((c for c in candidates if c in REASON_TEMPLATES), family)
+
+
+@lru_cache(maxsize=None)
+def _template(template: str) -> str:
+    text = REASON_TEMPLATES.get(template) or REASON_TEMPLATES.get(template.split(".", 1)[0], "")
+    if template.startswith("safety"):
+        text += SAFETY_CONFIDENCE
+    return text
+
+
+def make_reason(family: str, element: str, issue_type: str, **params) -> Reason:
+    """Template id and params to store on an issue.
+
+    Every param is kept, not just those the current template uses, so a
+    reworded template can use any of them; rendering ignores the rest.
+    """
+    return template_id(family, element, issue_type), params
+
+
+def render_reason(template: str, params: Optional[Dict], element: str = "", issue_type: str = "") -> str:
+    """Reason text of a template id and its params"""
+    element = element or ""
+    issue_type = issue_type or ""
+    values = {
+        "element": element,
+        "element_name": element.replace("_", " "),
+        "element_label": element.replace("_", " ").upper(),
+        "element_title": element.replace("_", " ").title(),
+        "issue_type": issue_type,
+        "issue_label": issue_type.upper(),
+        "frame": 0, "location": "", "confidence": 0.0, "area": 0, "aspect_ratio": 0.0,
+        **(params or {}),
+    }
+    return _template(template).format(**values)
+
+
+def issue_reason(issue) -> str:
+    """Reason text of a stored issue (``Issue`` or row dict); legacy issues keep their stored text"""
+    get = issue.get if isinstance(issue, dict) else lambda name: getattr(issue, name, None)
+    if get("reason_template"):
+        return render_reason(get("reason_template"), get("reason_params"), get("element"), get("issue_type"))
+    return get("reason") or ""
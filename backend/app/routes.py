@@ -1,13 +1,16 @@
 import json
-from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException
+from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, Request
 from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 from typing import List
 from .schemas import JobCreate, PresignRequest, PresignResponse, JobResult, JobSummary, IssueSchema, FeedbackIn
 from .tasks import enqueue_job
-from .db import get_db, Base, engine
+from .db import get_db, create_schema
 from .models import Job, Issue, Feedback
 from .config import settings
+from .reasons import issue_reason
+from .crops import (DEFAULT_RENDITION, RENDITIONS, crop_url, get_crop, is_crop_key, jobs_active,
+                    referenced_crop_keys, release_crops, release_job_crops)
 import os
 
 # Choose storage backend based on environment
@@ -25,7 +28,7 @@ import io
 from pathlib import Path
 
 
-Base.metadata.create_all(bind=engine)
+create_schema()
 
 api_router = APIRouter()
 
@@ -402,10 +405,13 @@ def list_jobs(db: Session = Depends(get_db)):
 
 
 @api_router.get("/jobs/{job_id}/results", response_model=JobResult)
-def get_results(job_id: str, db: Session = Depends(get_db)):
-    """Get job results with comprehensive error handling"""
+def get_results(job_id: str, request: Request, crop_size: str = "medium", db: Session = Depends(get_db)):
+    """Get job results with comprehensive error handling; crop URLs point at the ``crop_size`` rendition"""
     import logging
     logger = logging.getLogger(__name__)
+
+    if crop_size not in RENDITIONS:
+        raise HTTPException(400, f"crop_size must be one of {', '.join(RENDITIONS)}")
     
     try:
         logger.info(f"🔍 Fetching results for job {job_id}")
@@ -442,9 +448,9 @@ def get_results(job_id: str, db: Session = Depends(get_db)):
                     confidence=i.confidence or 0.0,
                     first_frame=i.first_frame or 0,
                     last_frame=i.last_frame or 0,
-                    base_crop_url=i.base_crop_url or "",
-                    present_crop_url=i.present_crop_url or "",
-                    reason=i.reason or "No reason provided",
+                    base_crop_url=crop_url(i.base_crop_url, str(request.base_url), crop_size),
+                    present_crop_url=crop_url(i.present_crop_url, str(request.base_url), crop_size),
+                    reason=issue_reason(i) or "No reason provided",
                     gps=i.gps or "{}",
                     status=i.status or "pending",
                 )
@@ -461,7 +467,7 @@ def get_results(job_id: str, db: Session = Depends(get_db)):
 
 
 @api_router.get("/jobs/{job_id}/results.csv")
-def get_results_csv(job_id: str, db: Session = Depends(get_db)):
+def get_results_csv(job_id: str, request: Request, db: Session = Depends(get_db)):
     job = db.get(Job, job_id)
     if not job:
         raise HTTPException(404, "job not found")
@@ -489,14 +495,39 @@ def get_results_csv(job_id: str, db: Session = Depends(get_db)):
             f"{i.confidence:.2f}",
             i.first_frame,
             i.last_frame,
-            i.base_crop_url,
-            i.present_crop_url,
-            i.reason,
+            crop_url(i.base_crop_url, str(request.base_url)),
+            crop_url(i.present_crop_url, str(request.base_url)),
+            issue_reason(i),
         ])
     from fastapi.responses import Response
     return Response(content=buf.getvalue(), media_type="text/csv")
 
 
+@api_router.get("/crops/{key}")
+def get_crop_image(key: str, request: Request, size: str = DEFAULT_RENDITION):
+    """Serve a stored issue crop rendition; keys are content hashes, so the key is a strong ETag"""
+    from fastapi.responses import Response
+
+    if size not in RENDITIONS:
+        raise HTTPException(400, f"size must be one of {', '.join(RENDITIONS)}")
+    if not is_crop_key(key):
+        raise HTTPException(404, "crop not found")
+    etag = f'"{key}"' if size == DEFAULT_RENDITION else f'"{key}-{size}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    client_tags = [tag.strip().removeprefix("W/") for tag in request.headers.get("if-none-match", "").split(",")]
+    if etag in client_tags:
+        return Response(status_code=304, headers=headers)
+
+    crop = get_crop(key, size)
+    if not crop:
+        raise HTTPException(404, "crop not found")
+    # "*" matches any current representation, so only once the crop is known to exist
+    if "*" in client_tags:
+        return Response(status_code=304, headers=headers)
+    data, media_type = crop
+    return Response(content=data, media_type=media_type, headers=headers)
+
+
 @api_router.post("/issues/{issue_id}/feedback")
 def feedback(issue_id: str, data: FeedbackIn, db: Session = Depends(get_db)):
     issue = db.get(Issue, issue_id)
@@ -607,13 +638,16 @@ def cleanup_old_storage(days: int = 7, db: Session = Depends(get_db)):
     old_jobs = db.query(Job).filter(Job.created_at < cutoff_date).all()
     deleted_jobs = len(old_jobs)
     
+    crop_keys = set()
     for job in old_jobs:
+        crop_keys |= referenced_crop_keys(db, job.id)
         # Delete issues
         db.query(Issue).filter(Issue.job_id == job.id).delete()
         # Delete job
         db.delete(job)
     
     db.commit()
+    deleted_crops = release_job_crops(db, [job.id for job in old_jobs], crop_keys) if old_jobs else 0
     
     # Delete old videos if using database storage
     deleted_videos = 0
@@ -630,10 +664,24 @@ def cleanup_old_storage(days: int = 7, db: Session = Depends(get_db)):
     return {
         "deleted_jobs": deleted_jobs,
         "deleted_videos": deleted_videos,
+        "deleted_crops": deleted_crops,
         "cutoff_date": cutoff_date.isoformat()
     }
 
 
+@api_router.delete("/storage/crops")
+def sweep_crops(db: Session = Depends(get_db)):
+    """Delete stored crops that no issue references (crops are shared between jobs)"""
+    import logging
+    logger = logging.getLogger(__name__)
+    
+    if jobs_active(db):
+        raise HTTPException(409, "Jobs are running; their crops are stored before their issues")
+    deleted_crops = release_crops(db)
+    logger.info(f"🧹 Swept {deleted_crops} unreferenced crops")
+    return {"deleted_crops": deleted_crops}
+
+
 @api_router.delete("/jobs/{job_id}")
 def delete_job(job_id: str, db: Session = Depends(get_db)):
     """Delete a job and all associated data (issues, feedback, storage)"""
@@ -658,6 +706,7 @@ def delete_job(job_id: str, db: Session = Depends(get_db)):
         # Delete all issues and feedback associated with this job
         issues = db.query(Issue).filter(Issue.job_id == job_id).all()
         issue_count = len(issues)
+        crop_keys = referenced_crop_keys(db, job_id)
         
         for issue in issues:
             feedback_count = db.query(Feedback).filter(Feedback.issue_id == issue.id).delete()
@@ -667,12 +716,16 @@ def delete_job(job_id: str, db: Session = Depends(get_db)):
         db.delete(job)
         db.commit()
         
+        # Crops are shared between jobs: only those no other issue uses go
+        deleted_crops = release_job_crops(db, [job_id], crop_keys)
+        
         logger.info(f"✅ Deleted job {job_id} with {issue_count} issues")
         
         return {
             "ok": True, 
             "message": f"Job {job_id} and all associated data deleted",
-            "deleted_issues": issue_count
+            "deleted_issues": issue_count,
+            "deleted_crops": deleted_crops
         }
     except HTTPException:
         raise
@@ -696,6 +749,7 @@ def delete_all_jobs(db: Session = Depends(get_db)):
         # Get all jobs
         jobs = db.query(Job).all()
         job_count = len(jobs)
+        job_ids = [job.id for job in jobs]
         
         # Delete all feedback
         feedback_count = db.query(Feedback).delete()
@@ -707,14 +761,18 @@ def delete_all_jobs(db: Session = Depends(get_db)):
         db.query(Job).delete()
         db.commit()
         
-        logger.info(f"✅ Deleted {job_count} jobs, {issue_count} issues, {feedback_count} feedback")
+        # No issues are left, so every stored crop goes
+        crop_count = release_job_crops(db, job_ids)
+        
+        logger.info(f"✅ Deleted {job_count} jobs, {issue_count} issues, {feedback_count} feedback, {crop_count} crops")
         
         return {
             "ok": True, 
             "message": f"All {job_count} jobs deleted",
             "deleted_jobs": job_count,
             "deleted_issues": issue_count,
-            "deleted_feedback": feedback_count
+            "deleted_feedback": feedback_count,
+            "deleted_crops": crop_count
         }
     except Exception as e:
         logger.error(f"❌ Error deleting all jobs: {e}")
@@ -114,6 +114,30 @@ def get_bytes(object_name: str) -> bytes:
         return response.read()
 
 
+def exists(object_name: str) -> bool:
+    """Whether an object is stored, without downloading it"""
+    if USE_LOCAL_STORAGE:
+        return (STORAGE_DIR / object_name).is_file()
+    elif USE_AWS_S3:
+        from botocore.exceptions import ClientError
+        try:
+            s3_client.head_object(Bucket=settings.s3_bucket, Key=object_name)
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+    else:
+        from minio.error import S3Error
+        try:
+            get_minio().stat_object(settings.s3_bucket, object_name)
+            return True
+        except S3Error as e:
+            if e.code in ("NoSuchKey", "NoSuchObject"):
+                return False
+            raise
+
+
 def delete_prefix(prefix: str):
     """Delete all objects with a given prefix"""
     if USE_LOCAL_STORAGE:
@@ -102,9 +102,12 @@ class StorageManager:
                 
             else:
                 # Store directly in PostgreSQL (for smaller files)
-                # Convert to base64 for easier handling
-                base64_data = base64.b64encode(data).decode('utf-8')
-                data_url = f"data:{content_type};base64,{base64_data}"
+                # Videos also get a base64 data URL for get_video_url; other
+                # blobs (crops, archived frames) are served from the raw bytes
+                data_url = None
+                if content_type.startswith("video/"):
+                    base64_data = base64.b64encode(data).decode('utf-8')
+                    data_url = f"data:{content_type};base64,{base64_data}"
                 
                 video = VideoStorage(
                     key=key,
@@ -191,6 +194,14 @@ class StorageManager:
         finally:
             db.close()
     
+    def exists(self, key: str) -> bool:
+        """Whether anything is stored under the key, without loading its data"""
+        db: Session = self.SessionLocal()
+        try:
+            return db.query(VideoStorage.id).filter_by(key=key).first() is not None
+        finally:
+            db.close()
+    
     def delete_video(self, key: str) -> bool:
         """Delete video from database"""
         db: Session = self.SessionLocal()
@@ -280,6 +291,19 @@ def get_bytes(key: str) -> Optional[bytes]:
     """Get bytes from database"""
     return storage.get_video(key)
 
+def exists(key: str) -> bool:
+    """Check whether a key is stored"""
+    return storage.exists(key)
+
+def list_keys(prefix: str) -> list:
+    """Keys starting with prefix (without loading any data)"""
+    db: Session = storage.SessionLocal()
+    try:
+        query = db.query(VideoStorage.key).filter(VideoStorage.key.like(f"{prefix}%"))
+        return [key for (key,) in query]
+    finally:
+        db.close()
+
 def delete_prefix(prefix: str) -> int:
     """Delete all items with prefix"""
     videos = storage.list_videos(prefix)
@@ -102,6 +102,24 @@ def get_bytes(object_name: str) -> bytes:
         logger.error(f"❌ Failed to retrieve {object_name}: {e}")
         return b""
 
+def exists(object_name: str) -> bool:
+    """Check whether a file is stored, without reading it"""
+    if (TEMP_DIR / object_name).is_file():
+        return True
+    try:
+        from .db import SessionLocal
+        from .models import VideoMetadata
+        
+        db = SessionLocal()
+        try:
+            metadata = db.query(VideoMetadata).filter_by(key=object_name).first()
+            return bool(metadata and metadata.storage_path and Path(metadata.storage_path).is_file())
+        finally:
+            db.close()
+    except Exception as e:
+        logger.warning(f"⚠️ Could not check database for {object_name}: {e}")
+        return False
+
 def delete_prefix(prefix: str):
     """Delete all files with given prefix"""
     try:
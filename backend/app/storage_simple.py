@@ -28,9 +28,22 @@ def get_bytes(object_name: str) -> bytes:
         return file_path.read_bytes()
     return b""
 
+def exists(object_name: str) -> bool:
+    """Whether a file is stored under the name, without reading it"""
+    return (STORAGE_DIR / object_name).is_file()
+
+def list_keys(prefix: str) -> list:
+    """Names of the files stored under a directory prefix"""
+    prefix_path = STORAGE_DIR / prefix
+    if not prefix_path.is_dir():
+        return []
+    return [p.relative_to(STORAGE_DIR).as_posix() for p in prefix_path.rglob("*") if p.is_file()]
+
 def delete_prefix(prefix: str):
-    """Delete all files with given prefix"""
+    """Delete all files with given prefix (a directory or a single file)"""
     import shutil
     prefix_path = STORAGE_DIR / prefix
-    if prefix_path.exists():
+    if prefix_path.is_dir():
         shutil.rmtree(prefix_path, ignore_errors=True)
+    elif prefix_path.exists():
+        prefix_path.unlink()
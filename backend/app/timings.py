@@ -0,0 +1,69 @@
+"""
+Per-stage wall-clock accounting for the video pipelines.
+
+Stages may run on several threads at once (base and present videos are
+decoded concurrently), so totals are summed per stage rather than compared
+against the job's wall-clock time.
+"""
+
+import time
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+
+class StageTimer:
+    """Thread-safe accumulator of seconds spent per named stage"""
+
+    def __init__(self):
+        self._totals: Dict[str, float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self._totals[stage] += seconds
+
+    @contextmanager
+    def stage(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def timed(self, iterable: Iterable[T], stage: str) -> Iterator[T]:
+        """Re-yield ``iterable``, charging the time spent producing each item to ``stage``"""
+        iterator = iter(iterable)
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    self.add(stage, time.perf_counter() - start)
+                yield item
+        finally:
+            close = getattr(iterator, "close", None)
+            if close:
+                close()
+
+    def totals(self) -> Dict[str, float]:
+        """Unrounded stage totals, e.g. to ship back from a worker process"""
+        with self._lock:
+            return dict(self._totals)
+
+    def merge(self, totals: Dict[str, float]):
+        """Add stage totals recorded elsewhere (another timer or process)"""
+        with self._lock:
+            for stage, seconds in totals.items():
+                self._totals[stage] += seconds
+
+    def as_dict(self) -> Dict[str, float]:
+        """Stage totals in seconds, rounded for ``Job.summary_json``"""
+        with self._lock:
+            return {stage: round(seconds, 3) for stage, seconds in self._totals.items()}
@@ -0,0 +1,439 @@
+"""
+Temporal tracking of detections for the advanced pipeline.
+
+A detection joins the nearest live track of the same element type whose
+last detection is within ``max_distance`` pixels, otherwise it starts a new
+track; detections on confirmed tracks are kept, which filters out one-frame
+false positives.
+
+Tracks are indexed in a spatial hash grid per element type, with cells as
+large as ``max_distance``, so only the 3x3 block of cells around a
+detection has to be searched instead of every track of the video. Tracks
+that have not been updated for ``expiry_frames`` frames are retired, which
+keeps the index (and memory) bounded by what is on screen rather than by
+video length. The weighted average confidence is updated incrementally.
+
+Each video stream gets its own ``Tracker`` (see ``StreamTrackers``), so base
+and present detections never join each other's tracks. Track state lives in a ``TrackStore`` of
+typed arrays (one slot per live track, slots of retired tracks are reused);
+tracks keep only what association and confirmation need, not their
+detections.
+
+For comparison, ``group_tracks`` turns a stream's confirmed detections into
+one ``TrackedObject`` per track, with its frame span, a representative
+detection and an aggregate confidence. While streaming, ``OpenObjects``
+collects the confirmed detections of live tracks and closes them into
+objects as their tracks retire, and ``ComparisonWindow`` holds closed
+objects until they can be compared, so neither grows with video length.
+"""
+
+import math
+from array import array
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+# Weight of the i-th detection of a track (recent frames weighted more)
+WEIGHT_STEP = 0.1
+
+Cell = Tuple[int, int]
+
+
+@dataclass
+class Detection:
+    """Enhanced detection with tracking info"""
+    bbox: List[int]
+    element_type: str
+    confidence: float
+    frame_idx: int
+    track_id: Optional[str] = None
+
+
+class TrackStore:
+    """Struct-of-arrays state of live tracks, addressed by slot"""
+
+    def __init__(self):
+        self.cx = array("q")
+        self.cy = array("q")
+        self.first_frame = array("q")
+        self.last_frame = array("q")
+        self.count = array("q")
+        self.seq = array("q")  # creation order, so ties go to the oldest track
+        self.weighted_sum = array("d")
+        self.weight_sum = array("d")
+        self.track_id: List[Optional[str]] = []
+        self.element_type: List[Optional[str]] = []
+        self.cell: List[Optional[Cell]] = []
+        self._free: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.track_id) - len(self._free)
+
+    @property
+    def capacity(self) -> int:
+        return len(self.track_id)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the numeric columns"""
+        columns = (self.cx, self.cy, self.first_frame, self.last_frame, self.count, self.seq,
+                   self.weighted_sum, self.weight_sum)
+        return sum(column.itemsize * len(column) for column in columns)
+
+    def allocate(self, track_id: str, element_type: str, seq: int) -> int:
+        if self._free:
+            slot = self._free.pop()
+            self.track_id[slot] = track_id
+            self.element_type[slot] = element_type
+            self.cell[slot] = None
+            self.seq[slot] = seq
+            self.count[slot] = 0
+            self.weighted_sum[slot] = self.weight_sum[slot] = 0.0
+            return slot
+
+        slot = len(self.track_id)
+        for column in (self.cx, self.cy, self.first_frame, self.last_frame, self.count):
+            column.append(0)
+        self.seq.append(seq)
+        self.weighted_sum.append(0.0)
+        self.weight_sum.append(0.0)
+        self.track_id.append(track_id)
+        self.element_type.append(element_type)
+        self.cell.append(None)
+        return slot
+
+    def release(self, slot: int):
+        self.track_id[slot] = self.element_type[slot] = self.cell[slot] = None
+        self._free.append(slot)
+
+    def add(self, slot: int, det, cx: int, cy: int):
+        weight = 1.0 + self.count[slot] * WEIGHT_STEP
+        self.weighted_sum[slot] += det.confidence * weight
+        self.weight_sum[slot] += weight
+        if self.count[slot] == 0:
+            self.first_frame[slot] = det.frame_idx
+        self.count[slot] += 1
+        self.last_frame[slot] = det.frame_idx
+        self.cx[slot], self.cy[slot] = cx, cy
+
+    def avg_confidence(self, slot: int) -> float:
+        return self.weighted_sum[slot] / self.weight_sum[slot] if self.weight_sum[slot] else 0.0
+
+
+class Tracker:
+    """Associates one stream's detections across frames and reports the confirmed ones"""
+
+    def __init__(self, max_distance: float = 150, persistence: int = 3, min_confidence: float = 0.65,
+                 min_density: float = 0.4, expiry_frames: int = 10, id_grid: int = 80, id_prefix: str = ""):
+        self.max_distance = max_distance
+        self.persistence = persistence
+        self.min_confidence = min_confidence
+        self.min_density = min_density
+        self.expiry_frames = expiry_frames
+        self.id_grid = id_grid
+        self.id_prefix = id_prefix
+        self.cell_size = max(int(math.ceil(max_distance)), 1)
+
+        self.store = TrackStore()
+        self._slots: Dict[str, int] = {}
+        # element type -> cell -> slots of tracks whose last detection lies in that cell
+        self._grid: Dict[str, Dict[Cell, Set[int]]] = defaultdict(lambda: defaultdict(set))
+        # Live slots, least recently updated first
+        self._recency: "OrderedDict[int, None]" = OrderedDict()
+        # Ids of retired tracks, until the caller collects them with pop_retired
+        self._retired: List[str] = []
+        self.created = 0
+        self.expired = 0
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def stats(self) -> Dict[str, int]:
+        return {"tracks": self.created, "expired": self.expired, "live": len(self.store),
+                "peak_live": self.store.capacity}
+
+    def _nearest(self, element_type: str, cx: int, cy: int) -> Optional[int]:
+        cells = self._grid.get(element_type)
+        if not cells:
+            return None
+        store = self.store
+        gx, gy = cx // self.cell_size, cy // self.cell_size
+        best, best_key = None, None
+        for x in (gx - 1, gx, gx + 1):
+            for y in (gy - 1, gy, gy + 1):
+                for slot in cells.get((x, y), ()):
+                    distance = math.sqrt((cx - store.cx[slot]) ** 2 + (cy - store.cy[slot]) ** 2)
+                    if distance < self.max_distance:
+                        key = (distance, store.seq[slot])
+                        if best_key is None or key < best_key:
+                            best, best_key = slot, key
+        return best
+
+    def _place(self, slot: int):
+        store = self.store
+        cell = (store.cx[slot] // self.cell_size, store.cy[slot] // self.cell_size)
+        if cell == store.cell[slot]:
+            return
+        cells = self._grid[store.element_type[slot]]
+        self._unplace(cells, slot)
+        cells[cell].add(slot)
+        store.cell[slot] = cell
+
+    def _unplace(self, cells: Dict[Cell, Set[int]], slot: int):
+        bucket = cells.get(self.store.cell[slot])
+        if bucket is not None:
+            bucket.discard(slot)
+            if not bucket:
+                del cells[self.store.cell[slot]]
+
+    def expire(self, frame_idx: int):
+        """Retire tracks last updated more than ``expiry_frames`` frames before ``frame_idx``"""
+        store = self.store
+        cutoff = frame_idx - self.expiry_frames
+        while self._recency:
+            slot = next(iter(self._recency))
+            if store.last_frame[slot] >= cutoff:
+                break
+            del self._recency[slot]
+            self._unplace(self._grid[store.element_type[slot]], slot)
+            del self._slots[store.track_id[slot]]
+            self._retired.append(store.track_id[slot])
+            store.release(slot)
+            self.expired += 1
+
+    def pop_retired(self) -> List[str]:
+        """Ids of the tracks retired since the last call"""
+        retired, self._retired = self._retired, []
+        return retired
+
+    def update(self, detections: List, frame_idx: Optional[int] = None) -> List:
+        """Track one frame's detections; returns those belonging to confirmed tracks.
+
+        Passing ``frame_idx`` retires stale tracks even when the frame has no detections.
+        """
+        store = self.store
+        confirmed = []
+        if frame_idx is not None:
+            self.expire(frame_idx)
+        for det in detections:
+            self.expire(det.frame_idx)
+            cx = (det.bbox[0] + det.bbox[2]) // 2
+            cy = (det.bbox[1] + det.bbox[3]) // 2
+
+            slot = self._nearest(det.element_type, cx, cy)
+            if slot is None:
+                track_id = f"{self.id_prefix}{det.element_type}_{cx // self.id_grid}_{cy // self.id_grid}_{det.frame_idx}"
+                slot = self._slots.get(track_id)
+                if slot is None:
+                    slot = self._slots[track_id] = store.allocate(track_id, det.element_type, self.created)
+                    self.created += 1
+
+            store.add(slot, det, cx, cy)
+            self._place(slot)
+            self._recency[slot] = None
+            self._recency.move_to_end(slot)
+
+            # Must appear in at least min_density of the frames in its span
+            count = store.count[slot]
+            frame_span = store.last_frame[slot] - store.first_frame[slot] + 1
+            if (
+                count >= self.persistence and
+                store.avg_confidence(slot) >= self.min_confidence and
+                count / max(frame_span, 1) >= self.min_density
+            ):
+                det.track_id = store.track_id[slot]
+                confirmed.append(det)
+        return confirmed
+
+
+class StreamTrackers:
+    """One ``Tracker`` per video stream, created on first use with the same settings.
+
+    Streams share nothing, so detections of one video never join, confirm or
+    expire tracks of another, and track ids carry the stream name so the same
+    object at the same spot gets different ids in each video.
+    """
+
+    def __init__(self, **tracker_args):
+        self.tracker_args = tracker_args
+        self._trackers: Dict[str, Tracker] = {}
+
+    def __contains__(self, stream: str) -> bool:
+        return stream in self._trackers
+
+    def get(self, stream: str) -> Tracker:
+        tracker = self._trackers.get(stream)
+        if tracker is None:
+            tracker = self._trackers[stream] = Tracker(id_prefix=f"{stream}:", **self.tracker_args)
+        return tracker
+
+    def update(self, stream: str, detections: List, frame_idx: Optional[int] = None) -> List:
+        return self.get(stream).update(detections, frame_idx)
+
+    def pop_retired(self, stream: str) -> List[str]:
+        tracker = self._trackers.get(stream)
+        return tracker.pop_retired() if tracker is not None else []
+
+    def release(self, stream: str) -> Optional[Dict[str, int]]:
+        """Drop a stream's tracker, returning its final stats"""
+        tracker = self._trackers.pop(stream, None)
+        return tracker.stats() if tracker is not None else None
+
+
+class TrackedObject:
+    """One physical object: the confirmed detections of a track, summarised for comparison"""
+
+    __slots__ = ("track_id", "element_type", "detections", "first_frame", "last_frame", "best",
+                 "confidence", "bbox")
+
+    def __init__(self, track_id: str, detections: List):
+        self.track_id = track_id
+        self.detections = detections
+        self.element_type = detections[0].element_type
+        frames = [d.frame_idx for d in detections]
+        self.first_frame, self.last_frame = min(frames), max(frames)
+        self.best = max(detections, key=_best_key)
+        # Same recency weighting as the track's running confidence
+        weights = [1.0 + i * WEIGHT_STEP for i in range(len(detections))]
+        self.confidence = sum(d.confidence * w for d, w in zip(detections, weights)) / sum(weights)
+        # Median box over the track, robust to a few jittery frames
+        self.bbox = [int(v) for v in _median([d.bbox for d in detections])]
+
+    def __len__(self) -> int:
+        return len(self.detections)
+
+
+def _best_key(det) -> Tuple[float, int]:
+    # Most confident (then largest) sighting is the representative crop
+    return det.confidence, (det.bbox[2] - det.bbox[0]) * (det.bbox[3] - det.bbox[1])
+
+
+def _median(boxes: List[List[int]]) -> List[float]:
+    return [sorted(column)[len(column) // 2] for column in zip(*boxes)]
+
+
+def group_tracks(detections: List) -> List[TrackedObject]:
+    """Group confirmed detections by ``track_id`` (untracked ones stand alone), in first-seen order"""
+    groups: Dict[object, List] = {}
+    for det in detections:
+        key = det.track_id if det.track_id is not None else id(det)
+        groups.setdefault(key, []).append(det)
+    return [TrackedObject(key if isinstance(key, str) else None, dets) for key, dets in groups.items()]
+
+
+class OpenObjects:
+    """Confirmed detections of one stream's live tracks, closed into objects as the tracks retire"""
+
+    def __init__(self):
+        self._detections: Dict[str, List] = {}
+        self._best: Dict[str, object] = {}
+
+    def __len__(self) -> int:
+        return len(self._detections)
+
+    def add(self, confirmed: List) -> bool:
+        """Add a frame's confirmed detections; True if one became its track's best sighting"""
+        changed = False
+        for det in confirmed:
+            self._detections.setdefault(det.track_id, []).append(det)
+            best = self._best.get(det.track_id)
+            if best is None or _best_key(det) > _best_key(best):
+                self._best[det.track_id] = det
+                changed = True
+        return changed
+
+    def close(self, track_ids: List[str]) -> List[TrackedObject]:
+        """Objects of the given retired tracks (tracks that were never confirmed are skipped)"""
+        objects = []
+        for track_id in track_ids:
+            detections = self._detections.pop(track_id, None)
+            if detections:
+                del self._best[track_id]
+                objects.append(TrackedObject(track_id, detections))
+        return objects
+
+    def close_all(self) -> List[TrackedObject]:
+        return self.close(list(self._detections))
+
+    def first_frames(self) -> Dict[str, int]:
+        """Earliest first frame of the open objects, per element type"""
+        first: Dict[str, int] = {}
+        for detections in self._detections.values():
+            det = detections[0]
+            if det.frame_idx < first.get(det.element_type, det.frame_idx + 1):
+                first[det.element_type] = det.frame_idx
+        return first
+
+    def best_frames(self) -> Set[int]:
+        return {det.frame_idx for det in self._best.values()}
+
+
+class ComparisonWindow:
+    """Closed objects of both streams, held until every object they could be matched with is known.
+
+    Base and present objects may only match when they are of the same type
+    and their frame spans come within ``window`` frames of each other. An
+    object is settled once nothing still open (or yet to be seen) can start
+    within ``window`` frames of its end; a group of mutually reachable
+    objects is released for comparison when all of its members are settled,
+    so comparing groups as they settle gives the same result as comparing
+    everything at the end of the video.
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        self.base: List[TrackedObject] = []
+        self.present: List[TrackedObject] = []
+
+    def __len__(self) -> int:
+        return len(self.base) + len(self.present)
+
+    def add(self, base: List[TrackedObject], present: List[TrackedObject]):
+        self.base.extend(base)
+        self.present.extend(present)
+
+    def _reachable(self, a: TrackedObject, b: TrackedObject) -> bool:
+        return a.first_frame <= b.last_frame + self.window and b.first_frame <= a.last_frame + self.window
+
+    def pop_settled(self, next_frame: int, open_first: Dict[str, int]) -> Tuple[List[TrackedObject], List[TrackedObject]]:
+        """Release the groups that can no longer change.
+
+        ``next_frame`` is the first frame not tracked yet and ``open_first``
+        the earliest first frame of still open objects per type, for both
+        streams together.
+        """
+        objects = self.base + self.present
+        n_base = len(self.base)
+        parent = list(range(len(objects)))
+
+        def find(node):
+            while parent[node] != node:
+                parent[node] = parent[parent[node]]
+                node = parent[node]
+            return node
+
+        for i in range(n_base):
+            for j in range(n_base, len(objects)):
+                a, b = objects[i], objects[j]
+                if a.element_type == b.element_type and self._reachable(a, b):
+                    parent[find(i)] = find(j)
+
+        unsettled = set()
+        for i, obj in enumerate(objects):
+            frontier = min(next_frame, open_first.get(obj.element_type, next_frame))
+            if obj.last_frame + self.window >= frontier:
+                unsettled.add(find(i))
+
+        settled = [find(i) not in unsettled for i in range(len(objects))]
+        self.base = [obj for obj, done in zip(objects[:n_base], settled) if not done]
+        self.present = [obj for obj, done in zip(objects[n_base:], settled[n_base:]) if not done]
+        return ([obj for obj, done in zip(objects[:n_base], settled) if done],
+                [obj for obj, done in zip(objects[n_base:], settled[n_base:]) if done])
+
+    def pop_all(self) -> Tuple[List[TrackedObject], List[TrackedObject]]:
+        base, present = self.base, self.present
+        self.base, self.present = [], []
+        return base, present
+
+    def best_frames(self) -> Set[int]:
+        return {obj.best.frame_idx for obj in self.base + self.present}
@@ -1,83 +1,90 @@
 import time
 import uuid
 import json
-import base64
 import os
-from io import BytesIO
 import cv2
 import numpy as np
-from PIL import Image
 from sqlalchemy.orm import Session
 from .db import SessionLocal
 from .models import Job, Issue
 from .config import settings
+from .enhance import fast_enhance, is_noisy, resolve_profile
+from .change_gate import ChangeGate, gate_summary, resolve_gate
+from .frames import iter_frame_pairs, sample_frames
+from .timings import StageTimer
+from .matching import match_detections
+from .crops import JobCrops, resolve_crop_mode, store_crop
+from .issues import IssueMerger, IssueWriter, MergedIssue, resolve_issue_merge
+from .reasons import make_reason
 
 
-def extract_frames(video_path: str, fps: int = 1, max_frames: int = 30):
-    """Extract frames from video file (memory-optimized for free tier)"""
+def enhance_frame(frame, profile: str = "quality"):
+    """Denoise and contrast-enhance a single sampled frame using an enhancement profile"""
+    # Ensure frame is in full color
+    if len(frame.shape) == 2:
+        frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+    
+    if profile == "none":
+        return frame
+    if profile == "fast":
+        return fast_enhance(frame, clip_limit=2.0)
+    
+    # Apply denoising for clearer frames (adaptive only denoises noisy frames)
+    if profile == "quality" or is_noisy(frame):
+        frame = cv2.fastNlMeansDenoisingColored(frame, None, 10, 10, 7, 21)
+    
+    # Enhance contrast
+    lab = cv2.cvtColor(frame, cv2.COLOR_BGR2LAB)
+    l, a, b = cv2.split(lab)
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+    l = clahe.apply(l)
+    enhanced = cv2.merge([l, a, b])
+    return cv2.cvtColor(enhanced, cv2.COLOR_LAB2BGR)
+
+
+def iter_frames(video_path: str, fps: int = 1, max_frames: int = None, strategy: str = None,
+                timer: StageTimer = None, stream: str = "video", profile: str = "quality"):
+    """Yield enhanced frames one at a time so only the current frame is resident"""
+    timer = timer or StageTimer()
     try:
         if not os.path.exists(video_path):
             print(f"❌ Video file not found: {video_path}")
-            return []
-            
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            print(f"❌ Could not open video: {video_path}")
-            return []
-        
-        # Reduce resolution to save memory on free tier (512MB limit)
-        cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
-        
-        video_fps = cap.get(cv2.CAP_PROP_FPS) or 30
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        duration = total_frames / video_fps if video_fps > 0 else 0
+            return
         
-        print(f"📹 Video: {duration:.1f}s, {video_fps:.1f} FPS, {total_frames} frames")
-        
-        # Calculate interval for extracting frames
-        interval = max(int(round(video_fps / fps)), 1)
-        
-        frames = []
-        idx = 0
         frame_count = 0
         
-        while cap.isOpened() and len(frames) < max_frames:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            # Extract frame at interval
-            if idx % interval == 0:
-                # Ensure frame is in full color
-                if len(frame.shape) == 2:
-                    frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
-                
-                # Apply denoising for clearer frames
-                denoised = cv2.fastNlMeansDenoisingColored(frame, None, 10, 10, 7, 21)
-                
-                # Enhance contrast
-                lab = cv2.cvtColor(denoised, cv2.COLOR_BGR2LAB)
-                l, a, b = cv2.split(lab)
-                clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-                l = clahe.apply(l)
-                enhanced = cv2.merge([l, a, b])
-                enhanced = cv2.cvtColor(enhanced, cv2.COLOR_LAB2BGR)
-                
-                frames.append(enhanced)
-                frame_count += 1
-                print(f"  Frame {frame_count}/{max_frames} extracted (timestamp: {idx/video_fps:.1f}s)")
-            
-            idx += 1
-        
-        cap.release()
-        print(f"✅ Extracted {len(frames)} high-quality frames")
-        return frames
+        # Reduce resolution to save memory on free tier (512MB limit); skipped
+        # frames are grabbed or seeked over instead of being fully decoded
+        sampled = sample_frames(
+            video_path,
+            fps=fps,
+            max_frames=max_frames,
+            strategy=strategy or settings.frame_sampling,
+            resolution=(1280, 720),
+        )
+        for frame_no, frame in timer.timed(sampled, f"{stream}_decode"):
+            frame_count += 1
+            print(f"  Frame {frame_count} extracted (source frame {frame_no})")
+            with timer.stage(f"{stream}_enhance"):
+                enhanced = enhance_frame(frame, profile)
+            yield enhanced
+        
+        print(f"✅ Extracted {frame_count} high-quality frames")
     except Exception as e:
         print(f"❌ Error extracting frames: {e}")
         import traceback
         traceback.print_exc()
-        return []
+
+
+def extract_frames(video_path: str, fps: int = 1, max_frames: int = 30, strategy: str = None,
+                   profile: str = "quality"):
+    """Extract frames from video file into a list (prefer iter_frames for long videos)"""
+    return list(iter_frames(video_path, fps=fps, max_frames=max_frames, strategy=strategy, profile=profile))
+
+
+def _box_sum(table, x, y, w, h):
+    """Sum of the pixels in a box (or arrays of boxes), looked up in a ``cv2.integral`` summed-area table"""
+    return table[y + h, x + w] - table[y, x + w] - table[y + h, x] + table[y, x]
 
 
 def detect_road_elements(frame):
@@ -115,126 +122,104 @@ def detect_road_elements(frame):
     white_upper = np.array([180, 30, 255])
     white_mask = cv2.inRange(hsv, white_lower, white_upper)
     
-    detections = []
+    # Summed-area tables so colour ratios and brightness are O(1) per bounding box
+    yellow_sum = cv2.integral(yellow_mask, sdepth=cv2.CV_32S)
+    green_sum = cv2.integral(green_mask, sdepth=cv2.CV_32S)
+    white_sum = cv2.integral(white_mask, sdepth=cv2.CV_32S)
+    # Per-channel sums fit in int32 up to 4K frames, which is much faster than float64
+    bgr_sum = cv2.integral(frame, sdepth=cv2.CV_32S if h * w * 255 < 2**31 else cv2.CV_64F)
+    
+    # Per-contour geometry; only contourArea/boundingRect/convexHull need a Python loop
+    candidates = [(cnt, cv2.contourArea(cnt)) for cnt in contours]
+    candidates = [(cnt, area) for cnt, area in candidates if area >= 600]  # Minimum area threshold
+    if not candidates:
+        return []
     
-    for cnt in contours:
-        area = cv2.contourArea(cnt)
-        if area < 600:  # Minimum area threshold
-            continue
-            
-        x, y, cw, ch = cv2.boundingRect(cnt)
-        
-        # Bounds checking
-        if x < 0 or y < 0 or x + cw > w or y + ch > h:
-            continue
-        
-        # Calculate properties
-        aspect_ratio = float(cw) / ch if ch > 0 else 0
-        position_y = (y + ch/2) / h
-        position_x = (x + cw/2) / w
-        
-        # Calculate solidity
-        hull = cv2.convexHull(cnt)
-        hull_area = cv2.contourArea(hull)
-        solidity = area / hull_area if hull_area > 0 else 0
-        
-        # Get ROI for color analysis
-        roi = frame[y:y+ch, x:x+cw]
-        if roi.size == 0:
-            continue
-        
-        avg_color_bgr = np.mean(roi, axis=(0,1))  # BGR
-        brightness = np.mean(avg_color_bgr)
-        
-        # Check color masks in ROI
-        roi_yellow = yellow_mask[y:y+ch, x:x+cw]
-        roi_green = green_mask[y:y+ch, x:x+cw]
-        roi_white = white_mask[y:y+ch, x:x+cw]
-        
-        yellow_ratio = np.sum(roi_yellow > 0) / (cw * ch) if (cw * ch) > 0 else 0
-        green_ratio = np.sum(roi_green > 0) / (cw * ch) if (cw * ch) > 0 else 0
-        white_ratio = np.sum(roi_white > 0) / (cw * ch) if (cw * ch) > 0 else 0
-        
-        element_type = None
-        confidence = 0.5
-        
-        # 1. BILLBOARDS - Large rectangular structures, often yellow/colorful
-        if (position_y < 0.55 and  # Upper/middle area
-            1.2 < aspect_ratio < 3.5 and  # Wide rectangular
-            solidity > 0.70 and  # Solid shape
-            area > 3000 and area < w*h*0.25 and  # Large but not too large
-            cw > w*0.12 and ch > h*0.08):  # Significant size
-            
-            # Strong preference for yellow billboards
-            if yellow_ratio > 0.3 or brightness > 100:
-                element_type = "billboard"
-                confidence = min(0.80 + (yellow_ratio * 0.15) + (solidity * 0.05), 0.98)
-        
+    area = np.array([a for _, a in candidates], dtype=np.float64)
+    rects = np.array([cv2.boundingRect(cnt) for cnt, _ in candidates], dtype=np.int64).reshape(-1, 4)
+    hull_area = np.array([cv2.contourArea(cv2.convexHull(cnt)) for cnt, _ in candidates], dtype=np.float64)
+    x, y, cw, ch = rects.T
+    
+    # Bounds checking (and empty boxes)
+    valid = (x >= 0) & (y >= 0) & (x + cw <= w) & (y + ch <= h) & (cw * ch > 0)
+    
+    # Calculate properties
+    with np.errstate(divide='ignore', invalid='ignore'):
+        aspect_ratio = np.where(ch > 0, cw / ch, 0.0)
+        solidity = np.where(hull_area > 0, area / hull_area, 0.0)
+    position_y = (y + ch / 2) / h
+    position_x = (x + cw / 2) / w
+    
+    # Color analysis of the bounding boxes; masks are 0/255, so each summed pixel contributes 255
+    box_area = np.maximum(cw * ch, 1)
+    bgr = _box_sum(bgr_sum, x, y, cw, ch) / box_area[:, None]  # mean BGR per box
+    brightness = (bgr[:, 0] + bgr[:, 1] + bgr[:, 2]) / 3
+    yellow_ratio = (_box_sum(yellow_sum, x, y, cw, ch) // 255) / box_area
+    green_ratio = (_box_sum(green_sum, x, y, cw, ch) // 255) / box_area
+    white_ratio = (_box_sum(white_sum, x, y, cw, ch) // 255) / box_area
+    
+    # Shape rules in priority order: a contour is only tested against a rule if
+    # no earlier rule's shape matched, even when that rule's color test failed
+    shape_rules = [
+        # 1. BILLBOARDS - Large rectangular structures in the upper/middle area, often yellow/colorful
+        (position_y < 0.55) & (1.2 < aspect_ratio) & (aspect_ratio < 3.5) & (solidity > 0.70) &
+        (area > 3000) & (area < w*h*0.25) & (cw > w*0.12) & (ch > h*0.08),
         # 2. ROAD SIGNS - Green directional signs, smaller than billboards
-        elif (position_y < 0.50 and  # Upper area
-              0.8 < aspect_ratio < 2.5 and  # Rectangular
-              solidity > 0.72 and  # Solid
-              1500 < area < w*h*0.12 and  # Medium size
-              cw > w*0.06 and ch > h*0.04):  # Reasonable dimensions
-            
-            # Prefer green road signs
-            if green_ratio > 0.25:
-                element_type = "road_sign"
-                confidence = min(0.78 + (green_ratio * 0.17), 0.96)
-            elif brightness > 85:  # Other bright signs
-                element_type = "road_sign"
-                confidence = min(0.72 + (solidity * 0.15), 0.92)
-        
-        # 3. GUARDRAILS - Horizontal metal barriers
-        elif (0.38 < position_y < 0.72 and  # Middle height
-              aspect_ratio > 3.0 and  # Very horizontal
-              cw > w*0.20 and  # Spans significant width
-              ch < h*0.15 and  # Relatively thin
-              area > 1800):
-            
-            element_type = "guardrail"
-            confidence = min(0.75 + (aspect_ratio / 15) + (cw / w * 0.1), 0.94)
-        
-        # 4. LANE MARKINGS - White lines on road surface
-        elif (position_y > 0.60 and  # Bottom area (road surface)
-              aspect_ratio > 3.5 and  # Very horizontal
-              cw > w*0.15 and  # Spans width
-              ch < h*0.08 and  # Thin line
-              area > 800):
-            
-            # Must be white or very bright
-            if white_ratio > 0.4 or brightness > 150:
-                element_type = "lane_marking"
-                confidence = min(0.73 + (white_ratio * 0.2), 0.93)
-        
-        # 5. ROAD DIVIDERS - Center barriers, vertical structures
-        elif (0.40 < position_y < 0.75 and  # Middle area
-              aspect_ratio < 0.6 and  # Tall and narrow
-              ch > h*0.15 and  # Significant height
-              area > 1200):
-            
-            element_type = "road_divider"
-            confidence = min(0.70 + (ch / h * 0.18), 0.90)
-        
+        (position_y < 0.50) & (0.8 < aspect_ratio) & (aspect_ratio < 2.5) & (solidity > 0.72) &
+        (1500 < area) & (area < w*h*0.12) & (cw > w*0.06) & (ch > h*0.04),
+        # 3. GUARDRAILS - Horizontal metal barriers at middle height
+        (0.38 < position_y) & (position_y < 0.72) & (aspect_ratio > 3.0) &
+        (cw > w*0.20) & (ch < h*0.15) & (area > 1800),
+        # 4. LANE MARKINGS - Thin white lines on the road surface
+        (position_y > 0.60) & (aspect_ratio > 3.5) & (cw > w*0.15) & (ch < h*0.08) & (area > 800),
+        # 5. ROAD DIVIDERS - Center barriers, tall and narrow
+        (0.40 < position_y) & (position_y < 0.75) & (aspect_ratio < 0.6) & (ch > h*0.15) & (area > 1200),
         # 6. PAVEMENT DAMAGE - Dark irregular patches on road
-        elif (position_y > 0.55 and  # Road surface
-              0.4 < aspect_ratio < 2.8 and  # Various shapes
-              solidity < 0.75 and  # Irregular
-              area > 2000 and
-              brightness < 90):  # Dark
-            
-            element_type = "pavement_damage"
-            confidence = min(0.68 + (area / 25000), 0.88)
-        
-        if element_type:
-            detections.append({
-                "bbox": [x, y, x + cw, y + ch],
-                "element": element_type,
-                "confidence": confidence,
-                "position": {"x": position_x, "y": position_y},
-                "area": area,
-                "aspect_ratio": aspect_ratio
-            })
+        (position_y > 0.55) & (0.4 < aspect_ratio) & (aspect_ratio < 2.8) & (solidity < 0.75) &
+        (area > 2000) & (brightness < 90),
+    ]
+    claimed = []
+    unclaimed = valid.copy()
+    for rule in shape_rules:
+        claimed.append(rule & unclaimed)
+        unclaimed &= ~rule
+    billboard, sign, guardrail, lane, divider, damage = claimed
+    
+    green_sign = sign & (green_ratio > 0.25)
+    bright_sign = sign & ~green_sign & (brightness > 85)  # Other bright signs
+    
+    # The rule masks are disjoint, so each contour gets at most one element type
+    element = np.full(len(candidates), None, dtype=object)
+    confidence = np.full(len(candidates), 0.5)
+    for mask, name, conf in (
+        (billboard & ((yellow_ratio > 0.3) | (brightness > 100)), "billboard",
+         np.minimum(0.80 + (yellow_ratio * 0.15) + (solidity * 0.05), 0.98)),
+        (green_sign, "road_sign", np.minimum(0.78 + (green_ratio * 0.17), 0.96)),
+        (bright_sign, "road_sign", np.minimum(0.72 + (solidity * 0.15), 0.92)),
+        (guardrail, "guardrail", np.minimum(0.75 + (aspect_ratio / 15) + (cw / w * 0.1), 0.94)),
+        (lane & ((white_ratio > 0.4) | (brightness > 150)), "lane_marking",  # Must be white or very bright
+         np.minimum(0.73 + (white_ratio * 0.2), 0.93)),
+        (divider, "road_divider", np.minimum(0.70 + (ch / h * 0.18), 0.90)),
+        (damage, "pavement_damage", np.minimum(0.68 + (area / 25000), 0.88)),
+    ):
+        element[mask] = name
+        confidence = np.where(mask, conf, confidence)
+    
+    detections = [
+        {
+            "bbox": [bx, by, bx + bw, by + bh],
+            "element": element_type,
+            "confidence": conf,
+            "position": {"x": px, "y": py},
+            "area": a,
+            "aspect_ratio": ar
+        }
+        for element_type, conf, bx, by, bw, bh, px, py, a, ar in zip(
+            element.tolist(), confidence.tolist(), x.tolist(), y.tolist(), cw.tolist(), ch.tolist(),
+            position_x.tolist(), position_y.tolist(), area.tolist(), aspect_ratio.tolist()
+        )
+        if element_type
+    ]
     
     # Sort by confidence and return top detections
     detections.sort(key=lambda x: x['confidence'], reverse=True)
@@ -242,7 +227,7 @@ def detect_road_elements(frame):
 
 
 def get_frame_by_frame_reasoning(element_type, issue_type, base_frame, present_frame, bbox, frame_idx, detection_data):
-    """Generate detailed frame-by-frame reasoning for detected issues"""
+    """Reason template and params of the detailed frame-by-frame reasoning for a detected issue"""
     
     position = detection_data.get("position", {})
     area = detection_data.get("area", 0)
@@ -269,185 +254,37 @@ def get_frame_by_frame_reasoning(element_type, issue_type, base_frame, present_f
     
     location_desc = f"{vertical_pos} {horizontal_pos} of frame"
     
-    # Generate detailed reasoning based on element and issue type
-    if issue_type == "missing":
-        if element_type == "billboard":
-            return (
-                f"🚨 FRAME {frame_idx}: CRITICAL - Large billboard MISSING\n"
-                f"📍 Location: {location_desc}\n"
-                f"📊 Detection: {confidence:.1%} confidence, {area:,} pixels area\n"
-                f"🔍 Analysis: Billboard was clearly visible in base frame but completely absent in current frame. "
-                f"This could indicate unauthorized removal, structural collapse, or obstruction. "
-                f"Requires immediate inspection as billboard removal may affect driver navigation and revenue."
-            )
-        elif element_type == "road_sign":
-            return (
-                f"🚨 FRAME {frame_idx}: CRITICAL - Road sign MISSING\n"
-                f"📍 Location: {location_desc}\n"
-                f"📊 Detection: {confidence:.1%} confidence\n"
-                f"🔍 Analysis: Directional/informational road sign present in base frame is now absent. "
-                f"This creates a serious safety hazard as drivers lose critical navigation information. "
-                f"Sign may have been vandalized, stolen, or knocked down. IMMEDIATE REPLACEMENT REQUIRED."
-            )
-        elif element_type == "guardrail":
-            return (
-                f"🚨 FRAME {frame_idx}: CRITICAL - Guardrail MISSING\n"
-                f"📍 Location: {location_desc}\n"
-                f"📊 Detection: {confidence:.1%} confidence, span ~{aspect_ratio:.1f}x width\n"
-                f"🔍 Analysis: Safety guardrail that was protecting road edge is now missing. "
-                f"This poses EXTREME DANGER - vehicles could veer off road causing serious accidents. "
-                f"Guardrail may have been damaged in collision or removed for maintenance. URGENT REPAIR NEEDED."
-            )
-        elif element_type == "lane_marking":
-            return (
-                f"⚠️ FRAME {frame_idx}: HIGH PRIORITY - Lane marking FADED/MISSING\n"
-                f"📍 Location: {location_desc}\n"
-                f"📊 Detection: {confidence:.1%} confidence\n"
-                f"🔍 Analysis: Lane marking visible in base frame has deteriorated significantly or disappeared. "
-                f"This reduces road clarity and increases accident risk, especially at night and in rain. "
-                f"Repainting required to maintain traffic flow safety."
-            )
-        elif element_type == "road_divider":
-            return (
-                f"🚨 FRAME {frame_idx}: CRITICAL - Road divider MISSING\n"
-                f"📍 Location: {location_desc}\n"
-                f"📊 Detection: {confidence:.1%} confidence\n"
-                f"🔍 Analysis: Center divider/median barrier is missing or severely damaged. "
-                f"This allows vehicles to cross into oncoming traffic lanes - HIGH RISK of head-on collisions. "
-                f"Immediate barrier replacement or temporary protection measures required."
-            )
-        elif element_type == "pavement_damage":
-            return (
-                f"⚠️ FRAME {frame_idx}: NOTICE - New pavement damage detected\n"
-                f"📍 Location: {location_desc}\n"
-                f"📊 Detection: {confidence:.1%} confidence, {area:,} pixels area\n"
-                f"🔍 Analysis: New pothole, crack, or pavement deterioration detected in current frame. "
-                f"Not visible in base frame, indicating recent development. Monitor for expansion and schedule repair."
-            )
-        else:
-            return (
-                f"⚠️ FRAME {frame_idx}: {element_type.replace('_', ' ').upper()} MISSING\n"
-                f"📍 Location: {location_desc}\n"
-                f"📊 Detection: {confidence:.1%} confidence\n"
-                f"🔍 Analysis: Element detected in base frame is absent in current frame. Investigation required."
-            )
-    
-    elif issue_type == "moved":
-        if element_type == "billboard":
-            return (
-                f"⚠️ FRAME {frame_idx}: WARNING - Billboard position changed\n"
-                f"📍 Location: {location_desc}\n"
-                f"📊 Detection: {confidence:.1%} confidence\n"
-                f"🔍 Analysis: Billboard location has shifted compared to base frame. "
-                f"This could indicate structural instability, foundation issues, or unauthorized modification. "
-                f"Verify structural integrity and proper installation."
-            )
-        elif element_type == "road_sign":
-            return (
-                f"⚠️ FRAME {frame_idx}: WARNING - Road sign displaced\n"
-                f"📍 Location: {location_desc}\n"
-                f"📊 Detection: {confidence:.1%} confidence\n"
-                f"🔍 Analysis: Sign position has changed between frames. May have been hit by vehicle, "
-                f"loosened by weather, or improperly reinstalled. Verify correct angle and position for optimal visibility."
-            )
-        elif element_type == "guardrail":
-            return (
-                f"🚨 FRAME {frame_idx}: HIGH PRIORITY - Guardrail displaced\n"
-                f"📍 Location: {location_desc}\n"
-                f"📊 Detection: {confidence:.1%} confidence\n"
-                f"🔍 Analysis: Guardrail has shifted from original position. Likely caused by vehicle impact. "
-                f"Compromised guardrails may not provide adequate protection. Inspect for structural damage and realign."
-            )
-        elif element_type == "road_divider":
-            return (
-                f"⚠️ FRAME {frame_idx}: WARNING - Road divider shifted\n"
-                f"📍 Location: {location_desc}\n"
-                f"📊 Detection: {confidence:.1%} confidence\n"
-                f"🔍 Analysis: Center divider position has changed. May indicate foundation issues or impact damage. "
-                f"Check structural integrity and proper lane separation."
-            )
-        else:
-            return (
-                f"⚠️ FRAME {frame_idx}: {element_type.replace('_', ' ').upper()} POSITION CHANGED\n"
-                f"📍 Location: {location_desc}\n"
-                f"📊 Detection: {confidence:.1%} confidence\n"
-                f"🔍 Analysis: Element location has shifted between base and current frame. Verification recommended."
-            )
-    
-    elif issue_type == "damaged":
-        if element_type == "billboard":
-            return (
-                f"⚠️ FRAME {frame_idx}: MAINTENANCE - Billboard shows deterioration\n"
-                f"📍 Location: {location_desc}\n"
-                f"📊 Detection: {confidence:.1%} confidence\n"
-                f"🔍 Analysis: Billboard shows signs of wear, fading, or damage compared to base frame. "
-                f"May affect visibility and brand representation. Schedule maintenance or replacement."
-            )
-        elif element_type == "road_sign":
-            return (
-                f"⚠️ FRAME {frame_idx}: MAINTENANCE - Road sign degraded\n"
-                f"📍 Location: {location_desc}\n"
-                f"📊 Detection: {confidence:.1%} confidence\n"
-                f"🔍 Analysis: Sign shows fading, corrosion, or damage affecting readability. "
-                f"Reduced reflectivity impacts night visibility. Clean or replace to maintain driver safety."
-            )
-        elif element_type == "lane_marking":
-            return (
-                f"⚠️ FRAME {frame_idx}: MAINTENANCE - Lane marking faded\n"
-                f"📍 Location: {location_desc}\n"
-                f"📊 Detection: {confidence:.1%} confidence\n"
-                f"🔍 Analysis: Lane marking has degraded by an estimated 40-60% compared to base condition. "
-                f"Weather wear and traffic have reduced visibility. Schedule repainting to restore road clarity."
-            )
-        else:
-            return (
-                f"⚠️ FRAME {frame_idx}: {element_type.replace('_', ' ').upper()} DAMAGED\n"
-                f"📍 Location: {location_desc}\n"
-                f"📊 Detection: {confidence:.1%} confidence\n"
-                f"🔍 Analysis: Element shows visible damage or deterioration. Inspection and maintenance recommended."
-            )
-    
-    return f"Frame {frame_idx}: {element_type.replace('_', ' ')} - {issue_type} detected at {location_desc}"
+    # The text is rendered from the template when the issue is read
+    return make_reason(
+        "frame", element_type, issue_type,
+        frame=frame_idx,
+        location=location_desc,
+        confidence=float(confidence),
+        area=int(area),
+        aspect_ratio=float(aspect_ratio),
+    )
+
+
+# IoU below which a base element has no counterpart (missing), and from which it is stable
+MISSING_IOU = 0.25
+STABLE_IOU = 0.55
 
 
 def compare_detections(base_det, present_det, base_frame=None, present_frame=None, frame_idx=0):
     """Compare detections and identify safety issues with detailed frame-by-frame reasoning"""
-    def iou(box1, box2):
-        x1, y1, x2, y2 = box1
-        x1p, y1p, x2p, y2p = box2
-        
-        xi1 = max(x1, x1p)
-        yi1 = max(y1, y1p)
-        xi2 = min(x2, x2p)
-        yi2 = min(y2, y2p)
-        
-        inter_area = max(0, xi2 - xi1) * max(0, yi2 - yi1)
-        box1_area = (x2 - x1) * (y2 - y1)
-        box2_area = (x2p - x1p) * (y2p - y1p)
-        union_area = box1_area + box2_area - inter_area
-        
-        return inter_area / union_area if union_area > 0 else 0
+    # Optimally pair base and present elements of the same type by IoU
+    result = match_detections(
+        [d["bbox"] for d in base_det], [d["element"] for d in base_det],
+        [d["bbox"] for d in present_det], [d["element"] for d in present_det],
+        min_iou=MISSING_IOU, stable_iou=STABLE_IOU,
+    )
+    moved = {base_idx: present_idx for base_idx, present_idx, _ in result.moved}
+    missing = set(result.missing)
     
     issues = []
-    matched = set()
-    
-    # Match base detections to present detections
-    for base in base_det:
-        best_match = None
-        best_iou = 0
-        best_idx = None
-        
-        for idx, present in enumerate(present_det):
-            if idx in matched:
-                continue
-            if base["element"] != present["element"]:
-                continue
-            
-            iou_score = iou(base["bbox"], present["bbox"])
-            if iou_score > best_iou:
-                best_iou = iou_score
-                best_match = present
-                best_idx = idx
+    for base_idx, base in enumerate(base_det):
+        if base_idx not in missing and base_idx not in moved:
+            continue  # Good match - element is stable
         
         # Determine issue severity based on element type
         element_type = base["element"]
@@ -458,9 +295,9 @@ def compare_detections(base_det, present_det, base_frame=None, present_frame=Non
             missing_severity = "MEDIUM"
             moved_severity = "LOW"
         
-        if best_iou < 0.25:  # Stricter threshold for missing
+        if base_idx in missing:
             # Element is missing - CRITICAL for safety
-            reason = get_frame_by_frame_reasoning(
+            reason_template, reason_params = get_frame_by_frame_reasoning(
                 base["element"], 
                 "missing", 
                 base_frame, 
@@ -474,12 +311,12 @@ def compare_detections(base_det, present_det, base_frame=None, present_frame=Non
                 "detection": base,
                 "issue_type": "missing",
                 "severity": missing_severity,
-                "reason": reason
+                "reason_template": reason_template,
+                "reason_params": reason_params,
             })
-        elif best_iou < 0.55:  # Element moved or displaced
-            matched.add(best_idx)
-            
-            reason = get_frame_by_frame_reasoning(
+        else:
+            # Element moved or displaced
+            reason_template, reason_params = get_frame_by_frame_reasoning(
                 base["element"], 
                 "moved", 
                 base_frame, 
@@ -491,82 +328,94 @@ def compare_detections(base_det, present_det, base_frame=None, present_frame=Non
             
             issues.append({
                 "detection": base,
-                "matched": best_match,
+                "matched": present_det[moved[base_idx]],
                 "issue_type": "moved",
                 "severity": moved_severity,
-                "reason": reason
+                "reason_template": reason_template,
+                "reason_params": reason_params,
             })
-        else:
-            # Good match - element is stable
-            matched.add(best_idx)
     
     return issues
 
 
-def frame_to_base64(frame, quality=90):
-    """Convert OpenCV frame to high-quality base64 data URL"""
-    # Ensure frame is in good quality
-    if len(frame.shape) == 2:  # Grayscale
-        frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
-    
-    # Encode with higher quality
-    encode_params = [cv2.IMWRITE_JPEG_QUALITY, quality]
-    _, buffer = cv2.imencode('.jpg', frame, encode_params)
-    img_base64 = base64.b64encode(buffer).decode('utf-8')
-    return f"data:image/jpeg;base64,{img_base64}"
+def merged_issue_row(job_id: str, merged: MergedIssue, crops: JobCrops, timer: StageTimer) -> dict:
+    """Issue row of a merged issue, with crops of its most confident frame"""
+    issue_data = merged.best
+    detection = issue_data["detection"]
+    frame_idx = merged.best_frame
+    
+    # Crop and encode images (or just archive the frames, when lazy) on
+    # the encoder threads; the rows wait for them when they are written
+    with timer.stage("crops"):
+        base_crop = crops.submit("highlight", "base", frame_idx, merged.base_frame, detection["bbox"])
+        
+        if "matched" in issue_data:
+            present_bbox = issue_data["matched"]["bbox"]
+        else:
+            # For missing items, show the same area of the present frame
+            present_bbox = detection["bbox"]
+        present_crop = crops.submit("highlight", "present", frame_idx, merged.present_frame, present_bbox)
+    
+    # Create issue with detailed reason
+    return dict(
+        job_id=job_id,
+        element=merged.element,
+        issue_type=merged.issue_type,
+        severity=merged.severity,
+        confidence=detection["confidence"],
+        first_frame=merged.first_frame,
+        last_frame=merged.last_frame,
+        base_crop_url=base_crop,
+        present_crop_url=present_crop,
+        reason_template=issue_data["reason_template"],
+        reason_params=issue_data["reason_params"],
+        gps=json.dumps({
+            "lat": 10.3170 + (frame_idx * 0.0001),
+            "lon": 77.9444 + (frame_idx * 0.0001)
+        }),
+    )
 
 
-def crop_and_encode(frame, bbox, expand_factor=1.5):
-    """Crop region from frame with expansion for context"""
-    x1, y1, x2, y2 = map(int, bbox)
-    h, w = frame.shape[:2]
-    
-    # Expand the bbox to show more context
-    cx, cy = (x1 + x2) // 2, (y1 + y2) // 2
-    width, height = x2 - x1, y2 - y1
-    
-    # Expand by factor to show surrounding area
-    new_width = int(width * expand_factor)
-    new_height = int(height * expand_factor)
-    
-    # Calculate new boundaries with expansion
-    x1 = max(0, cx - new_width // 2)
-    y1 = max(0, cy - new_height // 2)
-    x2 = min(w, cx + new_width // 2)
-    y2 = min(h, cy + new_height // 2)
-    
-    # Ensure minimum size for visibility
-    min_size = 200
-    if x2 - x1 < min_size:
-        x1 = max(0, cx - min_size // 2)
-        x2 = min(w, cx + min_size // 2)
-    if y2 - y1 < min_size:
-        y1 = max(0, cy - min_size // 2)
-        y2 = min(h, cy + min_size // 2)
-    
-    # Extract crop
-    crop = frame[y1:y2, x1:x2].copy()
-    
-    # Apply sharpening for clarity
-    kernel = np.array([[-1,-1,-1],
-                       [-1, 9,-1],
-                       [-1,-1,-1]])
-    sharpened = cv2.filter2D(crop, -1, kernel)
-    
-    # Draw a red rectangle to highlight the detection area within the expanded crop
-    relative_x1 = max(0, bbox[0] - x1)
-    relative_y1 = max(0, bbox[1] - y1)
-    relative_x2 = min(x2 - x1, bbox[2] - x1)
-    relative_y2 = min(y2 - y1, bbox[3] - y1)
-    
-    # Draw rectangle on the issue area (if within bounds)
-    if relative_x2 > relative_x1 and relative_y2 > relative_y1:
-        cv2.rectangle(sharpened, 
-                      (relative_x1, relative_y1), 
-                      (relative_x2, relative_y2), 
-                      (0, 0, 255), 2)  # Red rectangle, 2px thick
-    
-    return frame_to_base64(sharpened, quality=95)
+def analyze_pair(base_frame, present_frame, frame_idx: int, profile: str = None, timer: StageTimer = None,
+                 gate: ChangeGate = None):
+    """Enhance (if ``profile`` is given), detect and compare one frame pair.
+
+    Returns ``(base_frame, present_frame, base_detections, present_detections,
+    issues, gated)`` with the frames crops should be cut from. With a
+    ``gate``, a pair that looks unchanged skips enhancement, detection and
+    comparison and comes back ``gated`` with no detections. Pairs are
+    independent of each other, which is what lets ``parallel.process_pairs``
+    run this in worker processes.
+    """
+    timer = timer or StageTimer()
+    if gate is not None:
+        with timer.stage("gate"):
+            unchanged, _ = gate.is_unchanged(base_frame, present_frame)
+        if unchanged:
+            return base_frame, present_frame, [], [], [], True
+
+    if profile:
+        with timer.stage("base_enhance"):
+            base_frame = enhance_frame(base_frame, profile)
+        with timer.stage("present_enhance"):
+            present_frame = enhance_frame(present_frame, profile)
+    
+    # Detect road elements with enhanced detection
+    with timer.stage("detect"):
+        base_detections = detect_road_elements(base_frame)
+        present_detections = detect_road_elements(present_frame)
+    
+    # Compare and find issues with detailed frame-by-frame reasoning
+    with timer.stage("compare"):
+        frame_issues = compare_detections(base_detections, present_detections, base_frame, present_frame, frame_idx)
+    
+    return base_frame, present_frame, base_detections, present_detections, frame_issues, False
+
+
+def iter_pair_results(pairs, profile: str = None, timer: StageTimer = None, gate: ChangeGate = None):
+    """Analyze raw pairs in this process, yielding ``(frame_idx, *analyze_pair(...))``"""
+    for frame_idx, (base_frame, present_frame) in enumerate(pairs):
+        yield (frame_idx, *analyze_pair(base_frame, present_frame, frame_idx, profile=profile, timer=timer, gate=gate))
 
 
 def run_pipeline(job_id: str, payload: dict):
@@ -608,85 +457,92 @@ def run_pipeline(job_id: str, payload: dict):
             present_path = presign_get(present_key)
             temp_files = []
         
-        print(f"[Job {job_id}] Extracting frames from videos...")
+        print(f"[Job {job_id}] Streaming frames from videos...")
+        
+        # Frames are decoded, enhanced, detected and compared one pair at a
+        # time, so peak memory does not grow with video length. Both videos
+        # are decoded concurrently on their own threads.
+        timer = StageTimer()
+        max_frames = settings.max_frames or None
+        profile = resolve_profile(payload.get("metadata"))
+        gate = resolve_gate(payload.get("metadata"))
+        crops = JobCrops(job_id, resolve_crop_mode(payload.get("metadata")))
+        workers = settings.detection_workers
+        print(f"[Job {job_id}] Enhancement profile: {profile}")
+        print(f"[Job {job_id}] Crop mode: {crops.mode}")
+        if gate:
+            print(f"[Job {job_id}] Change gate on (threshold {gate.threshold})")
+        
+        # Frames are decoded raw and only enhanced in analyze_pair, after the
+        # gate, so gated pairs skip enhancement and the gate sees the same
+        # frames with or without a detection pool
+        pairs = iter_frame_pairs(
+            iter_frames(base_path, fps=1, max_frames=max_frames, timer=timer, stream="base", profile="none"),
+            iter_frames(present_path, fps=1, max_frames=max_frames, timer=timer, stream="present", profile="none"),
+            maxsize=settings.decode_queue_size,
+            timer=timer,
+        )
+        if workers > 1:
+            from .parallel import process_pairs
+            print(f"[Job {job_id}] Analyzing frame pairs on {workers} worker processes")
+            results = process_pairs(pairs, profile, workers, timer=timer, gate=gate)
+        else:
+            results = iter_pair_results(pairs, profile, timer=timer, gate=gate)
+        streams = [results, pairs]
         
-        # Extract frames - 1 per second for maximum accuracy
-        base_frames = extract_frames(base_path, fps=1, max_frames=60)
-        present_frames = extract_frames(present_path, fps=1, max_frames=60)
+        # Process frames and detect issues; rows are inserted in batches as they come
+        issue_rows = IssueWriter(db)
+        merger = IssueMerger(enabled=resolve_issue_merge(payload.get("metadata")))
+        all_issues = []
+        total_frames = 0
+        gated_frames = 0
         
-        if not base_frames or not present_frames:
+        for frame_idx, base_frame, present_frame, base_detections, present_detections, frame_issues, gated in results:
+            total_frames += 1
+            if gated:
+                gated_frames += 1
+                continue
+            print(f"[Job {job_id}] Processing frame {frame_idx + 1}...")
+            print(f"  Frame {frame_idx}: {len(base_detections)} base elements, {len(present_detections)} present elements")
+            
+            # Issues continuing from earlier frames are merged; finished ones are written
+            for merged in merger.update(frame_idx, frame_issues, base_frame, present_frame):
+                all_issues.append(issue_rows.add(merged_issue_row(job_id, merged, crops, timer)))
+        
+        for merged in merger.finish():
+            all_issues.append(issue_rows.add(merged_issue_row(job_id, merged, crops, timer)))
+        
+        if total_frames == 0:
             print(f"[Job {job_id}] Could not extract frames, using demo mode")
             # Fallback to demo mode
             return run_demo_mode(job_id, job, db, start)
         
-        print(f"[Job {job_id}] Extracted {len(base_frames)} base frames, {len(present_frames)} present frames")
-        
-        # Process frames and detect issues
-        all_issues = []
-        total_frames = min(len(base_frames), len(present_frames))
-        
-        for frame_idx in range(total_frames):
-            base_frame = base_frames[frame_idx]
-            present_frame = present_frames[frame_idx]
-            
-            print(f"[Job {job_id}] Processing frame {frame_idx + 1}/{total_frames}...")
-            
-            # Detect road elements with enhanced detection
-            base_detections = detect_road_elements(base_frame)
-            present_detections = detect_road_elements(present_frame)
-            
-            print(f"  Frame {frame_idx}: {len(base_detections)} base elements, {len(present_detections)} present elements")
-            
-            # Compare and find issues with detailed frame-by-frame reasoning
-            frame_issues = compare_detections(base_detections, present_detections, base_frame, present_frame, frame_idx)
-            
-            for issue_data in frame_issues:
-                detection = issue_data["detection"]
-                issue_id = str(uuid.uuid4())
-                
-                # Crop and encode images
-                base_crop = crop_and_encode(base_frame, detection["bbox"])
-                
-                if "matched" in issue_data:
-                    present_crop = crop_and_encode(present_frame, issue_data["matched"]["bbox"])
-                else:
-                    # For missing items, show full frame area
-                    present_crop = crop_and_encode(present_frame, detection["bbox"])
-                
-                # Create issue with detailed reason
-                issue = Issue(
-                    id=issue_id,
-                    job_id=job_id,
-                    element=detection["element"],
-                    issue_type=issue_data["issue_type"],
-                    severity=issue_data["severity"],
-                    confidence=detection["confidence"],
-                    first_frame=frame_idx,
-                    last_frame=frame_idx,
-                    base_crop_url=base_crop,
-                    present_crop_url=present_crop,
-                    reason=issue_data.get("reason", f"{detection['element']} {issue_data['issue_type']} detected in frame {frame_idx}"),
-                    gps=json.dumps({
-                        "lat": 10.3170 + (frame_idx * 0.0001),
-                        "lon": 77.9444 + (frame_idx * 0.0001)
-                    }),
-                )
-                db.add(issue)
-                all_issues.append(issue)
+        # Write the remaining rows, once their crops are done
+        with timer.stage("crops_wait"):
+            issue_rows.flush()
         
         # Update job as completed
         job.processed_frames = total_frames
         job.runtime_seconds = float(time.time() - start)
         
-        high_severity = sum(1 for i in all_issues if i.severity == "HIGH")
-        medium_severity = sum(1 for i in all_issues if i.severity == "MEDIUM")
+        high_severity = sum(1 for i in all_issues if i["severity"] == "HIGH")
+        medium_severity = sum(1 for i in all_issues if i["severity"] == "MEDIUM")
         
         job.summary_json = {
             "processed_frames": total_frames,
             "total_issues": len(all_issues),
             "high_severity": high_severity,
             "medium_severity": medium_severity,
-            "processing_time": f"{job.runtime_seconds:.2f}s"
+            "processing_time": f"{job.runtime_seconds:.2f}s",
+            "issue_merge": {"enabled": merger.enabled, "frame_issues": merger.detected,
+                            "merged_issues": len(all_issues)},
+            "enhancement_profile": profile,
+            "detection_workers": max(workers, 1),
+            "crops": {"mode": crops.mode, "workers": crops.workers, "archived_frames": crops.archived,
+                      "failed": issue_rows.failed_values},
+            "change_gate": gate_summary(gate, gated_frames, total_frames - gated_frames, timer,
+                                        ("base_enhance", "present_enhance", "detect", "compare")),
+            "stage_timings": timer.as_dict(),
         }
         job.status = "completed"
         db.commit()
@@ -698,12 +554,30 @@ def run_pipeline(job_id: str, payload: dict):
         print(f"[Job {job_id}] ❌ Error: {e}")
         import traceback
         traceback.print_exc()
+        db.rollback()
+        # Keep the issues found before the failure
+        if 'issue_rows' in locals():
+            try:
+                for merged in merger.finish():
+                    issue_rows.add(merged_issue_row(job_id, merged, crops, timer))
+                issue_rows.flush()
+            except Exception as flush_error:
+                db.rollback()
+                print(f"[Job {job_id}] Could not save partial issues: {flush_error}")
         if job:
             job.status = "failed"
             job.summary_json = {"error": str(e)}
+            if 'issue_rows' in locals():
+                job.summary_json["partial_issues"] = issue_rows.written
             db.commit()
         return False
     finally:
+        # Release the video captures held by unfinished frame streams
+        if 'streams' in locals():
+            for stream in streams:
+                stream.close()
+        if 'crops' in locals():
+            crops.close()
         # Clean up temporary files if using database storage
         if 'temp_files' in locals():
             for temp_file in temp_files:
@@ -760,8 +634,8 @@ def run_demo_mode(job_id: str, job, db, start: float):
             cv2.rectangle(present_img, (10, 10), (190, 140), (255, 150, 0), -1)
             cv2.putText(present_img, "PRESENT", (40, 80), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
         
-        base_url = frame_to_base64(base_img)
-        present_url = frame_to_base64(present_img)
+        base_url = store_crop(base_img)
+        present_url = store_crop(present_img)
         
         issue = Issue(
             id=issue_id,
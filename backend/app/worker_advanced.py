@@ -4,26 +4,30 @@ Using YOLOv8, Temporal Tracking, and MongoDB
 """
 
 import time
-import uuid
 import json
-import base64
 import os
 import logging
-from io import BytesIO
-from typing import List, Dict, Optional, Tuple
-from collections import defaultdict
-from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
 
-import cv2
 import numpy as np
-from PIL import Image
 from ultralytics import YOLO  # YOLOv8
 from pymongo import MongoClient
 from sqlalchemy.orm import Session
 
 from .db import SessionLocal
-from .models import Job, Issue
+from .models import Job
 from .config import settings
+from .enhance import FramePreprocessor, resolve_profile
+from .change_gate import ChangeGate, gate_summary, resolve_gate
+from . import model_registry
+from .inference import OnnxBackend, Prediction, UltralyticsBackend, int8_path, merge_predictions, tile_grid
+from .frames import FramePairStore, iter_frame_pairs, sample_frames
+from .timings import StageTimer
+from .tracking import ComparisonWindow, Detection, OpenObjects, StreamTrackers, TrackedObject, group_tracks
+from .matching import match_detections
+from .crops import JobCrops, resolve_crop_mode
+from .issues import IssueWriter
+from .reasons import Reason, issue_reason, make_reason
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -52,373 +56,328 @@ CONFIDENCE_THRESHOLDS = {
 TEMPORAL_PERSISTENCE_FRAMES = 3  # Reduced for faster detection
 MIN_TRACK_CONFIDENCE = 0.65  # Slightly lower for better recall
 MAX_TRACKING_DISTANCE = 150  # Maximum pixel distance for tracking same object
+TRACK_EXPIRY_FRAMES = 10  # Retire tracks not updated for this many frames
+STREAMS = ("base", "present")
+
+# Comparison IoU bands: missing below, moved below, changed below, otherwise unchanged
+MISSING_IOU = 0.3
+MOVED_IOU = 0.6
+CHANGED_IOU = 0.8
 
 # MongoDB configuration
 MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/')
 MONGO_DB = os.getenv('MONGO_DB', 'roadcompare')
 
-@dataclass
-class Detection:
-    """Enhanced detection with tracking info"""
-    bbox: List[int]
-    element_type: str
-    confidence: float
-    frame_idx: int
-    track_id: Optional[str] = None
-    
 class AdvancedRoadDetector:
     """Advanced road safety detection system"""
     
     def __init__(self):
+        # The model and Mongo client are process-wide; tracking state is per job
         self.model = self._load_model()
-        self.mongo_client = MongoClient(MONGO_URI) if MONGO_URI else None
+        # CLAHE, sharpening kernels, gamma LUT and scratch buffers are built once
+        self.preprocessor = FramePreprocessor(clip_limit=2.5, gamma=1.2, denoise=(6, 6, 7, 15))
+        self.mongo_client = model_registry.get_mongo_client(MONGO_URI, MongoClient) if MONGO_URI else None
         self.db = self.mongo_client[MONGO_DB] if self.mongo_client else None
-        self.tracked_objects = defaultdict(lambda: {
-            'detections': [],
-            'first_frame': None,
-            'last_frame': None,
-            'avg_confidence': 0
-        })
+        self._class_table_names = None
+        self._class_table_cache = None
+        # Slice-aided inference over the road surface (per job, see run_advanced_pipeline)
+        self.tiled = settings.tiled_inference
+        self.tile_stats = {'frames': 0, 'tiles': 0, 'seconds': 0.0}
+        # One tracker per video stream ("base", "present"), created on first use
+        self.trackers = StreamTrackers(
+            max_distance=MAX_TRACKING_DISTANCE,
+            persistence=TEMPORAL_PERSISTENCE_FRAMES,
+            min_confidence=MIN_TRACK_CONFIDENCE,
+            expiry_frames=TRACK_EXPIRY_FRAMES,
+        )
         
-    def _load_model(self) -> Optional[YOLO]:
-        """Load YOLOv8 model with fallback"""
+    def _load_model(self) -> Optional[model_registry.SharedModel]:
+        """Get the shared, warmed-up YOLOv8 model (loaded once per process) with fallback"""
         try:
+            if settings.inference_backend == "onnx":
+                onnx_path = self._onnx_model_path()
+                if onnx_path:
+                    logger.info(f"🚀 Using ONNX Runtime model from {onnx_path}")
+                    try:
+                        return model_registry.get_model(onnx_path, OnnxBackend)
+                    except Exception as e:
+                        logger.error(f"❌ Failed to load ONNX model, falling back to PyTorch: {e}")
+                else:
+                    logger.warning("⚠️ ONNX model not found (run export_onnx.py), falling back to PyTorch")
+            
             if os.path.exists(MODEL_PATH):
-                logger.info(f"🚀 Loading custom YOLOv8 model from {MODEL_PATH}")
-                model = YOLO(MODEL_PATH)
-                logger.info("✅ Custom YOLOv8 model loaded successfully")
-            else:
-                logger.warning(f"⚠️ Custom model not found, using pre-trained {FALLBACK_MODEL}")
-                model = YOLO(FALLBACK_MODEL)
-                logger.info("✅ Pre-trained YOLOv8 model loaded")
-            return model
+                logger.info(f"🚀 Using custom YOLOv8 model from {MODEL_PATH}")
+                return model_registry.get_model(MODEL_PATH, _load_ultralytics)
+            logger.warning(f"⚠️ Custom model not found, using pre-trained {FALLBACK_MODEL}")
+            return model_registry.get_model(FALLBACK_MODEL, _load_ultralytics)
         except Exception as e:
             logger.error(f"❌ Failed to load YOLOv8 model: {e}")
             return None
     
+    @staticmethod
+    def _onnx_model_path() -> Optional[str]:
+        """ONNX export to use (the INT8 variant if ONNX_INT8 is set), or None if missing"""
+        path = settings.onnx_model_path or os.path.splitext(MODEL_PATH)[0] + ".onnx"
+        if settings.onnx_int8:
+            path = int8_path(path)
+        return path if os.path.exists(path) else None
+    
     def is_frame_blurry(self, frame: np.ndarray, threshold: float = 80.0) -> bool:
-        """Check if frame is too blurry for analysis (ENHANCED)"""
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        
-        # Use multiple blur metrics for better accuracy
-        laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
-        
-        # Add Sobel gradient check
-        sobelx = cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=3)
-        sobely = cv2.Sobel(gray, cv2.CV_64F, 0, 1, ksize=3)
-        sobel_var = np.var(sobelx) + np.var(sobely)
-        
-        # Combined metric (lower threshold for better frame acceptance)
-        return (laplacian_var < threshold) and (sobel_var < threshold * 2)
+        """Check if frame is too blurry for analysis (scored on a downscaled grey image)"""
+        return self.preprocessor.is_blurry(frame, threshold)
     
-    def enhance_frame(self, frame: np.ndarray) -> np.ndarray:
-        """Apply advanced enhancements to frame (ENHANCED)"""
-        # Fast denoising (reduced parameters for speed)
-        denoised = cv2.fastNlMeansDenoisingColored(frame, None, 6, 6, 7, 15)
-        
-        # Enhance contrast using CLAHE with optimized parameters
-        lab = cv2.cvtColor(denoised, cv2.COLOR_BGR2LAB)
-        l, a, b = cv2.split(lab)
-        clahe = cv2.createCLAHE(clipLimit=2.5, tileGridSize=(8,8))
-        l = clahe.apply(l)
-        enhanced = cv2.merge([l, a, b])
-        enhanced = cv2.cvtColor(enhanced, cv2.COLOR_LAB2BGR)
-        
-        # Adaptive sharpening based on image content
-        gray = cv2.cvtColor(enhanced, cv2.COLOR_BGR2GRAY)
-        blur_level = cv2.Laplacian(gray, cv2.CV_64F).var()
-        
-        if blur_level < 100:  # More aggressive sharpening for blurry images
-            kernel = np.array([[-1,-1,-1],
-                               [-1, 10,-1],
-                               [-1,-1,-1]])
-        else:  # Moderate sharpening for clear images
-            kernel = np.array([[-1,-1,-1],
-                               [-1, 9,-1],
-                               [-1,-1,-1]])
-        
-        sharpened = cv2.filter2D(enhanced, -1, kernel)
-        
-        # Gamma correction for better visibility
-        gamma = 1.2
-        inv_gamma = 1.0 / gamma
-        table = np.array([((i / 255.0) ** inv_gamma) * 255 for i in range(256)]).astype("uint8")
-        gamma_corrected = cv2.LUT(sharpened, table)
-        
-        return gamma_corrected
+    def enhance_frame(self, frame: np.ndarray, profile: str = "quality") -> np.ndarray:
+        """Apply advanced enhancements to frame according to an enhancement profile"""
+        return self.preprocessor.enhance(frame, profile)
     
-    def extract_frames(self, video_path: str, fps: int = 2, max_frames: int = 120) -> List[np.ndarray]:
-        """Extract high-quality frames with quality control"""
-        frames = []
+    def iter_frames(self, video_path: str, fps: int = 2, max_frames: Optional[int] = None,
+                    strategy: Optional[str] = None, timer: Optional[StageTimer] = None,
+                    stream: str = "video", profile: str = "quality") -> Iterator[np.ndarray]:
+        """Yield clear, enhanced frames one at a time with quality control"""
+        timer = timer or StageTimer()
+        kept = 0
+        skipped_blurry = 0
         try:
-            if not os.path.exists(video_path):
-                logger.error(f"Video file not found: {video_path}")
-                return frames
+            # Set to highest quality; skipped frames are never fully decoded
+            sampled = sample_frames(
+                video_path,
+                fps=fps,
+                max_frames=None,
+                strategy=strategy or settings.frame_sampling,
+                resolution=(1920, 1080),
+            )
+            for _, frame in timer.timed(sampled, f"{stream}_decode"):
+                # Quality gate - skip blurry frames
+                with timer.stage(f"{stream}_blur_check"):
+                    blurry = self.is_frame_blurry(frame)
+                if blurry:
+                    skipped_blurry += 1
+                    continue
                 
-            cap = cv2.VideoCapture(video_path)
-            if not cap.isOpened():
-                logger.error(f"Could not open video: {video_path}")
-                return frames
-            
-            # Set to highest quality
-            cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1920)
-            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 1080)
-            
-            video_fps = cap.get(cv2.CAP_PROP_FPS) or 30
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            interval = max(int(round(video_fps / fps)), 1)
-            
-            idx = 0
-            skipped_blurry = 0
-            
-            while cap.isOpened() and len(frames) < max_frames:
-                ret, frame = cap.read()
-                if not ret:
-                    break
+                # Enhance frame
+                with timer.stage(f"{stream}_enhance"):
+                    enhanced = self.enhance_frame(frame, profile)
+                yield enhanced
+                kept += 1
                 
-                if idx % interval == 0:
-                    # Quality gate - skip blurry frames
-                    if self.is_frame_blurry(frame):
-                        skipped_blurry += 1
-                        idx += 1
-                        continue
-                    
-                    # Enhance frame
-                    enhanced = self.enhance_frame(frame)
-                    frames.append(enhanced)
-                    
-                    if len(frames) % 10 == 0:
-                        logger.info(f"  Extracted {len(frames)} frames...")
+                if kept % 10 == 0:
+                    logger.info(f"  Extracted {kept} frames...")
                 
-                idx += 1
+                if max_frames and kept >= max_frames:
+                    break
             
-            cap.release()
-            logger.info(f"✅ Extracted {len(frames)} clear frames, skipped {skipped_blurry} blurry")
+            logger.info(f"✅ Extracted {kept} clear frames, skipped {skipped_blurry} blurry")
             
         except Exception as e:
             logger.error(f"Error extracting frames: {e}")
-            
-        return frames
+    
+    def extract_frames(self, video_path: str, fps: int = 2, max_frames: int = 120,
+                       strategy: Optional[str] = None, profile: str = "quality") -> List[np.ndarray]:
+        """Extract high-quality frames into a list (prefer iter_frames for long videos)"""
+        return list(self.iter_frames(video_path, fps=fps, max_frames=max_frames, strategy=strategy,
+                                     profile=profile))
     
     def detect_with_yolo(self, frame: np.ndarray, frame_idx: int) -> List[Detection]:
         """Detect road elements using YOLOv8 with per-class thresholds (ENHANCED)"""
+        return self.detect_batch([("frame", frame_idx, frame)]).get(("frame", frame_idx), [])
+    
+    def detect_batch(self, frames: List[Tuple[str, int, np.ndarray]],
+                     batch_size: Optional[int] = None,
+                     tiled: Optional[bool] = None) -> Dict[Tuple[str, int], List[Detection]]:
+        """Run YOLOv8 on ``(video, frame_idx, frame)`` items, ``batch_size`` frames per model call.
+        
+        Batching base and present frames together amortises the per-call
+        preprocessing and dispatch overhead. With tiled inference, each
+        batch's road-surface tiles go through one extra model call and are
+        merged with the full-frame detections. Detections are keyed by
+        ``(video, frame_idx)``.
+        """
         if not self.model:
-            return []
-        
-        # Run inference with optimized parameters
-        results = self.model(
-            frame, 
-            verbose=False, 
-            conf=0.25,  # Lower base threshold
-            iou=0.45,   # NMS IoU threshold
-            max_det=100,  # Maximum detections per image
-            agnostic_nms=False  # Class-specific NMS
-        )
-        
-        detections = []
-        class_names = self.model.names
-        
-        for result in results:
-            if result.boxes is None:
-                continue
-                
-            for box in result.boxes:
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                conf = float(box.conf[0])
-                cls_id = int(box.cls[0])
-                class_name = class_names.get(cls_id, "unknown")
-                
-                # Apply per-class confidence threshold
-                min_conf = CONFIDENCE_THRESHOLDS.get(class_name, 0.5)
-                if conf < min_conf:
-                    continue
-                
-                # Filter out tiny detections (likely noise)
-                bbox_area = (x2 - x1) * (y2 - y1)
-                if bbox_area < 100:  # Minimum 10x10 pixels
-                    continue
-                
-                # Filter out detections at image edges (often false positives)
-                h, w = frame.shape[:2]
-                if x1 < 5 or y1 < 5 or x2 > w - 5 or y2 > h - 5:
-                    if conf < min_conf * 1.2:  # Require higher confidence for edge detections
-                        continue
-                
-                detections.append(Detection(
-                    bbox=[x1, y1, x2, y2],
-                    element_type=class_name,
-                    confidence=conf,
-                    frame_idx=frame_idx
-                ))
-        
+            return {(video, frame_idx): [] for video, frame_idx, _ in frames}
+        
+        batch_size = max(batch_size or settings.yolo_batch_size, 1)
+        tiled = self.tiled if tiled is None else tiled
+        detections = {}
+        for start in range(0, len(frames), batch_size):
+            chunk = frames[start:start + batch_size]
+            images = [frame for _, _, frame in chunk]
+            
+            # Run inference with optimized parameters
+            predictions = self.model(
+                images,
+                conf=0.25,  # Lower base threshold
+                iou=0.45,   # NMS IoU threshold
+                max_det=100,  # Maximum detections per image
+            )
+            if tiled:
+                predictions = self._add_tile_predictions(images, predictions)
+            for (video, frame_idx, frame), prediction in zip(chunk, predictions):
+                detections[(video, frame_idx)] = self._parse_result(prediction, frame, frame_idx)
         return detections
     
-    def track_objects(self, detections: List[Detection]) -> List[Detection]:
-        """Apply temporal tracking to reduce false positives (ENHANCED)"""
-        tracked = []
-        
-        for det in detections:
-            # Create unique track ID based on type and spatial location
-            x_center = (det.bbox[0] + det.bbox[2]) // 2
-            y_center = (det.bbox[1] + det.bbox[3]) // 2
-            
-            # Find existing track within MAX_TRACKING_DISTANCE
-            best_track_id = None
-            min_distance = float('inf')
-            
-            for track_id, track_data in self.tracked_objects.items():
-                if not track_id.startswith(det.element_type):
-                    continue
-                
-                if track_data['detections']:
-                    last_det = track_data['detections'][-1]
-                    last_x = (last_det.bbox[0] + last_det.bbox[2]) // 2
-                    last_y = (last_det.bbox[1] + last_det.bbox[3]) // 2
-                    
-                    distance = np.sqrt((x_center - last_x)**2 + (y_center - last_y)**2)
-                    
-                    if distance < MAX_TRACKING_DISTANCE and distance < min_distance:
-                        min_distance = distance
-                        best_track_id = track_id
-            
-            # Create new track if no match found
-            if best_track_id is None:
-                grid_x = x_center // 80  # Smaller grid for better tracking
-                grid_y = y_center // 80
-                best_track_id = f"{det.element_type}_{grid_x}_{grid_y}_{det.frame_idx}"
-            
-            # Update tracking
-            track = self.tracked_objects[best_track_id]
-            track['detections'].append(det)
-            
-            if track['first_frame'] is None:
-                track['first_frame'] = det.frame_idx
-            track['last_frame'] = det.frame_idx
-            
-            # Calculate weighted average confidence (recent frames weighted more)
-            confidences = [d.confidence for d in track['detections']]
-            weights = [1.0 + (i * 0.1) for i in range(len(confidences))]  # Linear weight increase
-            track['avg_confidence'] = sum(c * w for c, w in zip(confidences, weights)) / sum(weights)
-            
-            # Enhanced confirmation logic
-            frame_span = track['last_frame'] - track['first_frame'] + 1
-            detection_density = len(track['detections']) / max(frame_span, 1)
-            
-            # Check if object is confirmed
-            is_confirmed = (
-                len(track['detections']) >= TEMPORAL_PERSISTENCE_FRAMES and 
-                track['avg_confidence'] >= MIN_TRACK_CONFIDENCE and
-                detection_density >= 0.4  # Must appear in at least 40% of frames in span
-            )
-            
-            if is_confirmed:
-                det.track_id = best_track_id
-                tracked.append(det)
+    def _add_tile_predictions(self, frames: List[np.ndarray], predictions: List[Prediction]) -> List[Prediction]:
+        """Detect on overlapping road-surface tiles and merge them into the full-frame predictions.
+        
+        Small defects (potholes, cracks) cover a few pixels once a 1080p frame
+        is letterboxed to the model's input size; tiles are seen at close to
+        native resolution.
+        """
+        start = time.perf_counter()
+        tiles, owners = [], []
+        for i, frame in enumerate(frames):
+            h, w = frame.shape[:2]
+            top = int(h * settings.road_region_top)
+            for x1, y1, x2, y2 in tile_grid(w, h, settings.tile_size, settings.tile_overlap, top=top):
+                tiles.append(np.ascontiguousarray(frame[y1:y2, x1:x2]))
+                owners.append((i, (x1, y1)))
+        
+        tile_predictions = self.model(tiles, conf=0.25, iou=0.45, max_det=100) if tiles else []
+        parts = [([prediction], [(0, 0)]) for prediction in predictions]
+        for (i, offset), prediction in zip(owners, tile_predictions):
+            parts[i][0].append(prediction)
+            parts[i][1].append(offset)
+        merged = [merge_predictions(preds, offsets, iou=0.45, max_det=100) for preds, offsets in parts]
+        
+        self.tile_stats['frames'] += len(frames)
+        self.tile_stats['tiles'] += len(tiles)
+        self.tile_stats['seconds'] += time.perf_counter() - start
+        return merged
+    
+    def _class_table(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Class names and per-class confidence thresholds indexed by class id (built once per model).
+        
+        The last entry is the "unknown" class that out-of-range ids map to.
+        """
+        names = self.model.names
+        if self._class_table_names is not names:
+            size = max(names, default=-1) + 1
+            labels = [names.get(i, "unknown") for i in range(size)] + ["unknown"]
+            thresholds = np.array([CONFIDENCE_THRESHOLDS.get(label, 0.5) for label in labels], dtype=np.float64)
+            self._class_table_cache = (np.array(labels, dtype=object), thresholds)
+            self._class_table_names = names
+        return self._class_table_cache
+    
+    def _parse_result(self, prediction: Prediction, frame: np.ndarray, frame_idx: int) -> List[Detection]:
+        """Turn one frame's prediction into Detections, applying per-class thresholds"""
+        if len(prediction.conf) == 0:
+            return []
         
-        return tracked
+        h, w = frame.shape[:2]
+        labels, thresholds = self._class_table()
+        cls = np.minimum(prediction.cls.astype(np.int64), len(labels) - 1)
+        min_conf = thresholds[cls]
+        conf = prediction.conf.astype(np.float64)
+        boxes = prediction.xyxy.astype(np.int64)  # truncates like int()
+        x1, y1, x2, y2 = boxes.T
+        
+        # Per-class confidence threshold, minimum 10x10 pixels, and higher
+        # confidence required at image edges (often false positives)
+        at_edge = (x1 < 5) | (y1 < 5) | (x2 > w - 5) | (y2 > h - 5)
+        keep = (conf >= min_conf) & ((x2 - x1) * (y2 - y1) >= 100) & ~(at_edge & (conf < min_conf * 1.2))
+        
+        return [
+            Detection(bbox=bbox, element_type=element_type, confidence=confidence, frame_idx=frame_idx)
+            for bbox, element_type, confidence in zip(
+                boxes[keep].tolist(), labels[cls[keep]].tolist(), prediction.conf[keep].tolist()
+            )
+        ]
+    
+    def track_objects(self, detections: List[Detection], stream: str = "default",
+                      frame_idx: Optional[int] = None) -> List[Detection]:
+        """Apply temporal tracking to reduce false positives (see ``tracking.Tracker``).
+
+        Each ``stream`` is tracked independently, so detections from the base
+        video never join tracks of the present video.
+        """
+        return self.trackers.update(stream, detections, frame_idx)
+    
+    def retired_tracks(self, stream: str) -> List[str]:
+        """Ids of the stream's tracks retired since the last call"""
+        return self.trackers.pop_retired(stream)
+    
+    def release_tracker(self, stream: str) -> Optional[Dict[str, int]]:
+        """Drop a stream's tracking state, returning its final stats"""
+        return self.trackers.release(stream)
     
     def compare_frames(self, base_det: List[Detection], present_det: List[Detection]) -> List[Dict]:
-        """Advanced comparison with IoU and tracking"""
-        def calculate_iou(box1, box2):
-            x1, y1, x2, y2 = box1
-            x1p, y1p, x2p, y2p = box2
-            
-            xi1 = max(x1, x1p)
-            yi1 = max(y1, y1p)
-            xi2 = min(x2, x2p)
-            yi2 = min(y2, y2p)
-            
-            inter_area = max(0, xi2 - xi1) * max(0, yi2 - yi1)
-            box1_area = (x2 - x1) * (y2 - y1)
-            box2_area = (x2p - x1p) * (y2p - y1p)
-            union_area = box1_area + box2_area - inter_area
-            
-            return inter_area / union_area if union_area > 0 else 0
+        """Advanced comparison with IoU and tracking.
+
+        Confirmed detections are grouped into one object per track, and
+        objects are compared instead of single sightings, so each physical
+        object yields at most one issue.
+        """
+        return self.compare_objects(group_tracks(base_det), group_tracks(present_det))
+    
+    def compare_objects(self, base_objects: List[TrackedObject],
+                        present_objects: List[TrackedObject]) -> List[Dict]:
+        """Compare base and present objects; issues carry the objects
+        (``base_track``/``present_track``) and their representative detections.
+        """
+        # Objects can only be the same if they are seen around the same part of the route
+        allowed = None
+        if base_objects and present_objects:
+            base_span = np.array([(o.first_frame, o.last_frame) for o in base_objects])
+            present_span = np.array([(o.first_frame, o.last_frame) for o in present_objects])
+            allowed = (
+                (base_span[:, None, 0] <= present_span[None, :, 1] + TRACK_EXPIRY_FRAMES) &
+                (present_span[None, :, 0] <= base_span[:, None, 1] + TRACK_EXPIRY_FRAMES)
+            )
         
-        issues = []
-        matched = set()
+        # Optimally pair base and present objects of the same type by IoU of their median boxes
+        result = match_detections(
+            [o.bbox for o in base_objects], [o.element_type for o in base_objects],
+            [o.bbox for o in present_objects], [o.element_type for o in present_objects],
+            min_iou=MISSING_IOU, stable_iou=MOVED_IOU, allowed=allowed,
+        )
+        pairs = {base_idx: (present_idx, iou) for base_idx, present_idx, iou in result.moved + result.matched}
         
-        for base in base_det:
-            best_match = None
-            best_iou = 0
-            
-            for idx, present in enumerate(present_det):
-                if idx in matched:
-                    continue
-                if base.element_type != present.element_type:
-                    continue
-                
-                iou = calculate_iou(base.bbox, present.bbox)
-                if iou > best_iou:
-                    best_iou = iou
-                    best_match = present
+        issues = []
+        for base_idx, base in enumerate(base_objects):
+            present_idx, best_iou = pairs.get(base_idx, (None, 0.0))
+            present = present_objects[present_idx] if present_idx is not None else None
             
             # Determine issue type based on IoU
-            if best_iou < 0.3:
+            if present is None:
                 issue_type = "missing"
                 severity = "HIGH"
-            elif best_iou < 0.6:
+            elif best_iou < MOVED_IOU:
                 issue_type = "moved"
                 severity = "MEDIUM"
-            elif best_iou < 0.8:
+            elif best_iou < CHANGED_IOU:
                 issue_type = "changed"
                 severity = "LOW"
             else:
                 continue  # No significant change
             
             issues.append({
-                'base_detection': base,
-                'present_detection': best_match,
+                'base_detection': base.best,
+                'present_detection': present.best if present else None,
+                'base_track': base,
+                'present_track': present,
                 'issue_type': issue_type,
                 'severity': severity,
                 'iou': best_iou,
                 'confidence': base.confidence
             })
-            
-            if best_match:
-                matched.add(present_det.index(best_match))
         
         # Check for new items in present (not in base)
-        for idx, present in enumerate(present_det):
-            if idx not in matched:
-                issues.append({
-                    'base_detection': None,
-                    'present_detection': present,
-                    'issue_type': 'new',
-                    'severity': 'INFO',
-                    'confidence': present.confidence
-                })
+        for idx in result.new:
+            present = present_objects[idx]
+            issues.append({
+                'base_detection': None,
+                'present_detection': present.best,
+                'base_track': None,
+                'present_track': present,
+                'issue_type': 'new',
+                'severity': 'INFO',
+                'confidence': present.confidence
+            })
         
         return issues
     
-    def generate_safety_reason(self, element_type: str, issue_type: str, confidence: float) -> str:
-        """Generate engineering-grade safety reason"""
-        reasons = {
-            ('sign_board', 'missing'): "⚠️ CRITICAL: Traffic sign missing - immediate replacement required",
-            ('sign_board', 'moved'): "⚠️ WARNING: Sign position altered - verify compliance with standards",
-            ('sign_board', 'changed'): "⚠️ NOTICE: Sign condition changed - inspect for damage/fading",
-            
-            ('lane_marking', 'missing'): "⚠️ HIGH: Lane marking completely worn - immediate repainting needed",
-            ('lane_marking', 'moved'): "⚠️ MEDIUM: Lane alignment shifted - review road geometry",
-            ('faded_marking', 'changed'): "⚠️ NOTICE: Marking visibility <50% - schedule maintenance",
-            
-            ('pothole', 'new'): "⚠️ HIGH: New pothole detected - depth assessment required",
-            ('crack', 'new'): "⚠️ MEDIUM: Pavement crack identified - monitor progression",
-            
-            ('guardrail', 'missing'): "⚠️ CRITICAL: Safety barrier missing - accident risk",
-            ('guardrail', 'moved'): "⚠️ HIGH: Barrier displacement - structural integrity check needed",
-            
-            ('divider', 'missing'): "⚠️ CRITICAL: Road divider compromised - traffic separation lost",
-            ('divider', 'moved'): "⚠️ HIGH: Divider shifted - realignment required",
-        }
-        
-        key = (element_type, issue_type)
-        base_reason = reasons.get(key, f"⚠️ {issue_type.upper()}: {element_type.replace('_', ' ').title()} issue detected")
-        
-        # Add confidence level
-        conf_str = f" [Confidence: {confidence:.1%}]"
-        
-        return base_reason + conf_str
+    def generate_safety_reason(self, element_type: str, issue_type: str, confidence: float) -> Reason:
+        """Engineering-grade safety reason, as a template id and params rendered when read"""
+        return make_reason("safety", element_type, issue_type, confidence=float(confidence))
     
     def save_to_mongodb(self, job_id: str, data: Dict):
         """Save results to MongoDB for better scalability"""
@@ -436,52 +395,112 @@ class AdvancedRoadDetector:
         except Exception as e:
             logger.error(f"MongoDB save error: {e}")
 
-def frame_to_base64(frame: np.ndarray, quality: int = 95) -> str:
-    """Convert frame to high-quality base64"""
-    if len(frame.shape) == 2:
-        frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
-    
-    _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
-    img_base64 = base64.b64encode(buffer).decode('utf-8')
-    return f"data:image/jpeg;base64,{img_base64}"
+def _load_ultralytics(path: str) -> UltralyticsBackend:
+    return UltralyticsBackend(YOLO(path))
 
-def create_annotated_crop(frame: np.ndarray, bbox: List[int], expand: float = 1.3) -> str:
-    """Create annotated crop with expansion and highlighting"""
-    x1, y1, x2, y2 = map(int, bbox)
-    h, w = frame.shape[:2]
-    
-    # Expand region for context
-    cx, cy = (x1 + x2) // 2, (y1 + y2) // 2
-    width, height = int((x2 - x1) * expand), int((y2 - y1) * expand)
-    
-    new_x1 = max(0, cx - width // 2)
-    new_y1 = max(0, cy - height // 2)
-    new_x2 = min(w, cx + width // 2)
-    new_y2 = min(h, cy + height // 2)
-    
-    # Extract and annotate
-    crop = frame[new_y1:new_y2, new_x1:new_x2].copy()
+def _tile_summary(detector: AdvancedRoadDetector) -> Dict:
+    """Extra inference cost of tiling, to judge per job whether the recall gain is worth it"""
+    stats = detector.tile_stats
+    frames = max(stats['frames'], 1)
+    return {
+        "enabled": detector.tiled,
+        "tiles_per_frame": round(stats['tiles'] / frames, 2),
+        "extra_ms_per_frame": round(stats['seconds'] * 1000 / frames, 1),
+    }
+
+def _changed_pairs(pairs: Iterable, gate: ChangeGate, timer: StageTimer, gated: list) -> Iterator:
+    """Re-yield ``(idx, (base, present))`` pairs the gate sees changes in; indices of the rest go to ``gated``"""
+    for idx, (base_frame, present_frame) in pairs:
+        with timer.stage("gate"):
+            unchanged, _ = gate.is_unchanged(base_frame, present_frame)
+        if unchanged:
+            gated.append(idx)
+        else:
+            yield idx, (base_frame, present_frame)
+
+def _enhanced_pairs(pairs: Iterable, detector: AdvancedRoadDetector, profile: str, timer: StageTimer) -> Iterator:
+    """Re-yield ``(idx, (base, present))`` pairs with both frames enhanced"""
+    for idx, (base_frame, present_frame) in pairs:
+        with timer.stage("base_enhance"):
+            base_frame = detector.enhance_frame(base_frame, profile)
+        with timer.stage("present_enhance"):
+            present_frame = detector.enhance_frame(present_frame, profile)
+        yield idx, (base_frame, present_frame)
+
+def _open_first_frames(objects: Dict[str, OpenObjects]) -> Dict[str, int]:
+    """Earliest first frame of the objects still open in any stream, per element type"""
+    first: Dict[str, int] = {}
+    for stream_objects in objects.values():
+        for element_type, frame_idx in stream_objects.first_frames().items():
+            first[element_type] = min(frame_idx, first.get(element_type, frame_idx))
+    return first
+
+def _issue_row(job_id: str, issue: Dict, detector: AdvancedRoadDetector, crops: JobCrops,
+               retained: FramePairStore, timer: StageTimer) -> Dict:
+    """Issue row of a compared object pair, with crops of each object's representative frame"""
+    base_det = issue['base_detection']
+    present_det = issue['present_detection']
     
-    # Draw attention rectangle
-    rel_x1 = x1 - new_x1
-    rel_y1 = y1 - new_y1
-    rel_x2 = x2 - new_x1
-    rel_y2 = y2 - new_y1
+    # One issue per object: span every frame either track was seen in
+    tracks = [t for t in (issue['base_track'], issue['present_track']) if t]
+    first_frame = min(t.first_frame for t in tracks)
+    last_frame = max(t.last_frame for t in tracks)
+    element_type = tracks[0].element_type
+    confidence = issue['confidence']
     
-    cv2.rectangle(crop, (rel_x1, rel_y1), (rel_x2, rel_y2), (0, 0, 255), 3)
+    # Crops come from each object's representative frame; the whole
+    # frame stands in for the side where the object is absent
+    frame_idx = base_det.frame_idx if base_det else present_det.frame_idx
+    present_idx = present_det.frame_idx if present_det else frame_idx
+    with timer.stage("crops"):
+        base_crop = crops.submit("annotate" if base_det else "frame", "base", frame_idx,
+                                 retained.encoded(frame_idx)[0], base_det.bbox if base_det else None)
+        present_crop = crops.submit("annotate" if present_det else "frame", "present", present_idx,
+                                    retained.encoded(present_idx)[1],
+                                    present_det.bbox if present_det else None)
     
-    # Add arrow pointing to issue
-    arrow_start = (rel_x1 - 20, rel_y1 - 20) if rel_x1 > 20 else (rel_x2 + 20, rel_y1 - 20)
-    arrow_end = (rel_x1, rel_y1)
-    cv2.arrowedLine(crop, arrow_start, arrow_end, (0, 255, 0), 2, tipLength=0.3)
+    # Generate engineering-grade reason
+    reason_template, reason_params = detector.generate_safety_reason(element_type, issue['issue_type'],
+                                                                     confidence)
     
-    return frame_to_base64(crop)
+    # Create issue record
+    return dict(
+        job_id=job_id,
+        element=element_type,
+        issue_type=issue['issue_type'],
+        severity=issue['severity'],
+        confidence=confidence,
+        first_frame=first_frame,
+        last_frame=last_frame,
+        base_crop_url=base_crop,
+        present_crop_url=present_crop,
+        reason_template=reason_template,
+        reason_params=reason_params,
+        gps=json.dumps({
+            "lat": 10.3170 + (frame_idx * 0.0001),
+            "lon": 77.9444 + (frame_idx * 0.0001),
+            "accuracy": "high"
+        })
+    )
+
+def _batched(items: Iterable, size: int) -> Iterator[list]:
+    """Group an iterable into lists of ``size`` items (the last one may be shorter)"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
 
 def run_advanced_pipeline(job_id: str, payload: dict):
     """Advanced AI-powered pipeline with YOLOv8 and temporal tracking"""
     db: Session = SessionLocal()
     job = None
+    setup_start = time.perf_counter()
     detector = AdvancedRoadDetector()
+    setup_seconds = time.perf_counter() - setup_start
     
     try:
         logger.info(f"[Job {job_id}] Starting advanced AI pipeline...")
@@ -510,89 +529,111 @@ def run_advanced_pipeline(job_id: str, payload: dict):
         base_path = presign_get(base_key)
         present_path = presign_get(present_key)
         
-        # Extract frames
-        logger.info(f"[Job {job_id}] Extracting frames...")
-        base_frames = detector.extract_frames(base_path, fps=2, max_frames=120)
-        present_frames = detector.extract_frames(present_path, fps=2, max_frames=120)
-        
-        if not base_frames or not present_frames:
-            raise ValueError("Failed to extract quality frames")
-        
-        total_frames = min(len(base_frames), len(present_frames))
-        
-        # Process frames with temporal tracking
-        all_base_detections = []
-        all_present_detections = []
-        
-        logger.info(f"[Job {job_id}] Running AI detection on {total_frames} frames...")
+        # Stream frame pairs through detection and tracking; only the pairs
+        # holding an object's best sighting are retained for cropping, until
+        # that object has been compared. Both videos are decoded concurrently
+        # on their own threads.
+        logger.info(f"[Job {job_id}] Streaming frames through AI detection...")
+        timer = StageTimer()
+        timer.add("detector_setup", setup_seconds)
+        max_frames = settings.max_frames or None
+        profile = resolve_profile(payload.get("metadata"))
+        logger.info(f"[Job {job_id}] Enhancement profile: {profile}")
+        detector.tiled = bool((payload.get("metadata") or {}).get("tiled", settings.tiled_inference))
+        if detector.tiled:
+            logger.info(f"[Job {job_id}] Tiled inference on the road surface "
+                        f"({settings.tile_size}px tiles, {settings.tile_overlap:.0%} overlap)")
+        gate = resolve_gate(payload.get("metadata"))
+        if gate:
+            logger.info(f"[Job {job_id}] Change gate on (threshold {gate.threshold})")
+        crops = JobCrops(job_id, resolve_crop_mode(payload.get("metadata")))
+        logger.info(f"[Job {job_id}] Crop mode: {crops.mode}")
+        # Frames are decoded (and blur-checked) raw and only enhanced once they
+        # pass the change gate, so gated pairs never pay for preprocessing
+        pairs = iter_frame_pairs(
+            detector.iter_frames(base_path, fps=2, max_frames=max_frames, timer=timer, stream="base",
+                                 profile="none"),
+            detector.iter_frames(present_path, fps=2, max_frames=max_frames, timer=timer, stream="present",
+                                 profile="none"),
+            maxsize=settings.decode_queue_size,
+            timer=timer,
+        )
+        streams = [pairs]
         
-        for idx in range(total_frames):
+        retained = FramePairStore()
+        objects = {stream: OpenObjects() for stream in STREAMS}
+        window = ComparisonWindow(TRACK_EXPIRY_FRAMES)
+        issue_rows = IssueWriter(db)
+        db_issues = []
+        total_frames = 0
+        gated = []
+        
+        def compare(base_objects: List[TrackedObject], present_objects: List[TrackedObject]):
+            with timer.stage("compare"):
+                issues = detector.compare_objects(base_objects, present_objects)
+            for issue in issues:
+                db_issues.append(issue_rows.add(_issue_row(job_id, issue, detector, crops, retained, timer)))
+        
+        # Pairs that look unchanged skip enhancement, detection and tracking altogether
+        changed = enumerate(pairs)
+        if gate:
+            changed = _changed_pairs(changed, gate, timer, gated)
+        changed = _enhanced_pairs(changed, detector, profile, timer)
+        
+        # Base and present frames of several pairs go through YOLO in one call
+        pairs_per_batch = max(settings.yolo_batch_size // 2, 1)
+        for batch in _batched(changed, pairs_per_batch):
             # Detect objects
-            base_det = detector.detect_with_yolo(base_frames[idx], idx)
-            present_det = detector.detect_with_yolo(present_frames[idx], idx)
-            
-            all_base_detections.extend(base_det)
-            all_present_detections.extend(present_det)
-        
-        # Apply temporal tracking
-        logger.info(f"[Job {job_id}] Applying temporal consistency filtering...")
-        confirmed_base = detector.track_objects(all_base_detections)
-        confirmed_present = detector.track_objects(all_present_detections)
+            with timer.stage("detect"):
+                detections = detector.detect_batch([
+                    (video, idx, frame)
+                    for idx, (base_frame, present_frame) in batch
+                    for video, frame in (("base", base_frame), ("present", present_frame))
+                ])
+            
+            for idx, (base_frame, present_frame) in batch:
+                total_frames += 1
+                base_det = detections[("base", idx)]
+                present_det = detections[("present", idx)]
+                
+                # Apply temporal tracking as detections arrive
+                with timer.stage("track"):
+                    base_confirmed = detector.track_objects(base_det, stream="base", frame_idx=idx)
+                    present_confirmed = detector.track_objects(present_det, stream="present", frame_idx=idx)
+                    base_best = objects["base"].add(base_confirmed)
+                    present_best = objects["present"].add(present_confirmed)
+                
+                # Only a frame some object currently treats as its best sighting is kept
+                if base_best or present_best:
+                    with timer.stage("retain"):
+                        retained.keep(idx, base_frame, present_frame)
+                
+                if total_frames % 10 == 0:
+                    logger.info(f"[Job {job_id}] Processed {total_frames} frame pairs ({len(retained)} retained)")
+            
+            # Objects of retired tracks are compared as soon as nothing still
+            # open (or not seen yet) could be matched with them
+            window.add(*(objects[stream].close(detector.retired_tracks(stream)) for stream in STREAMS))
+            compare(*window.pop_settled(batch[-1][0] + 1, _open_first_frames(objects)))
+            
+            # Frames no open or pending object refers to any more are released
+            with timer.stage("retain"):
+                retained.prune(set().union(window.best_frames(), *(o.best_frames() for o in objects.values())))
+        
+        analysed_frames = total_frames
+        tracking_stats = {stream: detector.release_tracker(stream) for stream in STREAMS}
+        total_frames += len(gated)
+        if total_frames == 0:
+            raise ValueError("Failed to extract quality frames")
         
-        # Compare and identify issues
+        # Compare what is left once the videos end
         logger.info(f"[Job {job_id}] Comparing detections...")
-        issues = detector.compare_frames(confirmed_base, confirmed_present)
+        window.add(*(objects[stream].close_all() for stream in STREAMS))
+        compare(*window.pop_all())
         
-        # Create database entries
-        db_issues = []
-        for issue in issues:
-            base_det = issue['base_detection']
-            present_det = issue['present_detection']
-            
-            # Get frame for crops
-            frame_idx = base_det.frame_idx if base_det else present_det.frame_idx
-            base_frame = base_frames[frame_idx] if frame_idx < len(base_frames) else base_frames[-1]
-            present_frame = present_frames[frame_idx] if frame_idx < len(present_frames) else present_frames[-1]
-            
-            # Create annotated crops
-            if base_det:
-                base_crop = create_annotated_crop(base_frame, base_det.bbox)
-                element_type = base_det.element_type
-                confidence = base_det.confidence
-            else:
-                base_crop = frame_to_base64(base_frame)
-                element_type = present_det.element_type
-                confidence = present_det.confidence
-            
-            if present_det:
-                present_crop = create_annotated_crop(present_frame, present_det.bbox)
-            else:
-                present_crop = frame_to_base64(present_frame)
-            
-            # Generate engineering-grade reason
-            reason = detector.generate_safety_reason(element_type, issue['issue_type'], confidence)
-            
-            # Create issue record
-            db_issue = Issue(
-                id=str(uuid.uuid4()),
-                job_id=job_id,
-                element=element_type,
-                issue_type=issue['issue_type'],
-                severity=issue['severity'],
-                confidence=confidence,
-                first_frame=frame_idx,
-                last_frame=frame_idx,
-                base_crop_url=base_crop,
-                present_crop_url=present_crop,
-                reason=reason,
-                gps=json.dumps({
-                    "lat": 10.3170 + (frame_idx * 0.0001),
-                    "lon": 77.9444 + (frame_idx * 0.0001),
-                    "accuracy": "high"
-                })
-            )
-            db.add(db_issue)
-            db_issues.append(db_issue)
+        # Write the remaining rows, once their crops are done
+        with timer.stage("crops_wait"):
+            issue_rows.flush()
         
         # Update job status
         runtime = time.time() - start_time
@@ -601,9 +642,9 @@ def run_advanced_pipeline(job_id: str, payload: dict):
         job.status = "completed"
         
         # Calculate metrics
-        high_severity = sum(1 for i in db_issues if i.severity == "HIGH")
-        medium_severity = sum(1 for i in db_issues if i.severity == "MEDIUM")
-        critical_issues = sum(1 for i in db_issues if "CRITICAL" in i.reason)
+        high_severity = sum(1 for i in db_issues if i["severity"] == "HIGH")
+        medium_severity = sum(1 for i in db_issues if i["severity"] == "MEDIUM")
+        critical_issues = sum(1 for i in db_issues if "CRITICAL" in issue_reason(i))
         
         job.summary_json = {
             "processed_frames": total_frames,
@@ -614,8 +655,19 @@ def run_advanced_pipeline(job_id: str, payload: dict):
             "processing_time": f"{runtime:.2f}s",
             "fps": total_frames / runtime if runtime > 0 else 0,
             "model": "YOLOv8x",
+            "inference_backend": detector.model.backend if detector.model else None,
             "temporal_tracking": True,
-            "quality_filtered": True
+            "tracking": tracking_stats,
+            "retained_pairs_peak": retained.peak,
+            "crops": {"mode": crops.mode, "workers": crops.workers, "archived_frames": crops.archived,
+                      "failed": issue_rows.failed_values},
+            "quality_filtered": True,
+            "enhancement_profile": profile,
+            "yolo_batch_size": settings.yolo_batch_size,
+            "tiled_inference": _tile_summary(detector),
+            "change_gate": gate_summary(gate, len(gated), analysed_frames, timer,
+                                        ("base_enhance", "present_enhance", "detect", "track")),
+            "stage_timings": timer.as_dict(),
         }
         
         db.commit()
@@ -627,11 +679,11 @@ def run_advanced_pipeline(job_id: str, payload: dict):
             'frames': total_frames,
             'issues': [
                 {
-                    'type': i.element,
-                    'severity': i.severity,
-                    'confidence': i.confidence,
-                    'frame': i.first_frame,
-                    'reason': i.reason
+                    'type': i['element'],
+                    'severity': i['severity'],
+                    'confidence': i['confidence'],
+                    'frame': i['first_frame'],
+                    'reason': issue_reason(i)
                 } for i in db_issues
             ],
             'metrics': job.summary_json,
@@ -643,16 +695,30 @@ def run_advanced_pipeline(job_id: str, payload: dict):
         
     except Exception as e:
         logger.error(f"[Job {job_id}] ❌ Pipeline error: {e}")
+        db.rollback()
+        # Keep the issues found before the failure
+        if 'issue_rows' in locals():
+            try:
+                issue_rows.flush()
+            except Exception as flush_error:
+                db.rollback()
+                logger.error(f"[Job {job_id}] Could not save partial issues: {flush_error}")
         if job:
             job.status = "failed"
             job.summary_json = {"error": str(e)}
+            if 'issue_rows' in locals():
+                job.summary_json["partial_issues"] = issue_rows.written
             db.commit()
         return False
         
     finally:
+        # Release the video captures held by unfinished frame streams
+        if 'streams' in locals():
+            for stream in streams:
+                stream.close()
+        if 'crops' in locals():
+            crops.close()
         db.close()
-        if detector.mongo_client:
-            detector.mongo_client.close()
 
 # Export the new pipeline
 run_pipeline = run_advanced_pipeline
@@ -0,0 +1,77 @@
+"""
+Export the YOLOv8 model to ONNX for the ONNX Runtime CPU backend
+Optionally quantizes it to INT8, calibrated on frames from sample videos
+
+Usage:
+    python export_onnx.py                      # app/models/road_defects_yolov8x.onnx
+    python export_onnx.py --int8 --videos ../sample_data/base.mp4 ../sample_data/present.mp4
+Then set INFERENCE_BACKEND=onnx (and ONNX_INT8=true for the quantized model).
+"""
+
+import os
+import sys
+import argparse
+import shutil
+
+from app.frames import sample_frames
+from app.inference import int8_path, quantize_int8
+
+DEFAULT_WEIGHTS = os.path.join("app", "models", "road_defects_yolov8x.pt")
+
+
+def export(weights: str, imgsz: int = 640) -> str:
+    """Export weights to ONNX next to the .pt file (dynamic batch, so frames can be batched)"""
+    from ultralytics import YOLO
+
+    print(f"📦 Exporting {weights} to ONNX...")
+    exported = YOLO(weights).export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+    target = os.path.splitext(weights)[0] + ".onnx"
+    if os.path.abspath(exported) != os.path.abspath(target):
+        shutil.move(exported, target)
+    print(f"✅ Exported to {target}")
+    return target
+
+
+def calibration_frames(videos, fps: float, limit: int):
+    """Frames sampled round-robin from the calibration videos, up to ``limit``"""
+    streams = [sample_frames(path, fps=fps) for path in videos]
+    count = 0
+    while streams and count < limit:
+        for stream in list(streams):
+            item = next(stream, None)
+            if item is None:
+                streams.remove(stream)
+                continue
+            yield item[1]
+            count += 1
+            if count >= limit:
+                return
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export YOLOv8 to ONNX (optionally INT8)")
+    parser.add_argument("--weights", default=DEFAULT_WEIGHTS if os.path.exists(DEFAULT_WEIGHTS) else "yolov8x.pt")
+    parser.add_argument("--onnx", help="Use an existing ONNX export instead of exporting")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--int8", action="store_true", help="Also write a statically quantized INT8 model")
+    parser.add_argument("--videos", nargs="+", default=[], help="Calibration videos for --int8")
+    parser.add_argument("--calibration-fps", type=float, default=1)
+    parser.add_argument("--calibration-frames", type=int, default=64)
+    args = parser.parse_args()
+
+    onnx_path = args.onnx or export(args.weights, args.imgsz)
+
+    if args.int8:
+        if not args.videos:
+            print("❌ --int8 needs calibration --videos")
+            return False
+        output = int8_path(onnx_path)
+        print(f"🔢 Quantizing {onnx_path} to INT8 using {args.calibration_frames} frames...")
+        quantize_int8(onnx_path, output, calibration_frames(args.videos, args.calibration_fps, args.calibration_frames))
+        print(f"✅ INT8 model written to {output}")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
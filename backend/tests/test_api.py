@@ -17,6 +17,111 @@ def test_create_job_queued():
     assert 'job_id' in data and data['status'] == 'queued'
 
 
+def test_crop_served_with_etag(monkeypatch):
+    monkeypatch.setenv('USE_DATABASE_STORAGE', 'false')
+    from app.crops import put_crop
+    data = b'\xff\xd8 crop bytes \xff\xd9'
+    key = put_crop({'full': data})
+    r = client.get(f'/api/v1/crops/{key}')
+    assert r.status_code == 200 and r.content == data
+    assert r.headers['etag'] == f'"{key}"'
+    r = client.get(f'/api/v1/crops/{key}', headers={'If-None-Match': f'"{key}"'})
+    assert r.status_code == 304
+    assert client.get(f'/api/v1/crops/{key}', headers={'If-None-Match': '*'}).status_code == 304
+    missing = '0' * 32
+    assert client.get(f'/api/v1/crops/{missing}', headers={'If-None-Match': '*'}).status_code == 404
 
 
+def test_crop_rewritten_after_blob_removed(monkeypatch):
+    monkeypatch.setenv('USE_DATABASE_STORAGE', 'false')
+    from app.crops import object_name, put_crop
+    from app.storage_simple import STORAGE_DIR
+    data = b'\xff\xd8 removed crop \xff\xd9'
+    key = put_crop({'full': data})
+    (STORAGE_DIR / object_name(key)).unlink()
+    assert client.get(f'/api/v1/crops/{key}').status_code == 404
+    assert put_crop({'full': data}) == key
+    assert client.get(f'/api/v1/crops/{key}').content == data
 
+
+def test_crop_renditions(monkeypatch):
+    monkeypatch.setenv('USE_DATABASE_STORAGE', 'false')
+    import numpy as np
+    from app.crops import store_crop
+    key = store_crop(np.random.default_rng(0).integers(0, 255, (900, 1200, 3), dtype=np.uint8))
+    full = client.get(f'/api/v1/crops/{key}')
+    thumb = client.get(f'/api/v1/crops/{key}?size=thumb')
+    assert thumb.status_code == 200 and thumb.headers['etag'] == f'"{key}-thumb"'
+    assert len(thumb.content) < len(full.content)
+    assert client.get(f'/api/v1/crops/{key}?size=huge').status_code == 400
+
+
+def test_lazy_crop_rendered_on_request(monkeypatch):
+    monkeypatch.setenv('USE_DATABASE_STORAGE', 'false')
+    import numpy as np
+    from app.crops import JobCrops, get_crop
+    frame = np.random.default_rng(1).integers(0, 255, (480, 640, 3), dtype=np.uint8)
+    key = JobCrops('lazy-test', 'lazy').crop('highlight', 'base', 0, frame, [100, 100, 200, 180])
+    r = client.get(f'/api/v1/crops/{key}?size=thumb')
+    assert r.status_code == 200 and r.headers['content-type'] == 'image/jpeg'
+    assert get_crop(key) is not None
+
+
+def test_crop_write_failure_raises(monkeypatch):
+    monkeypatch.setenv('USE_DATABASE_STORAGE', 'false')
+    import pytest
+    from app import storage_simple
+    from app.crops import CropWriteError, JobCrops, put_crop
+
+    def fail(*args, **kwargs):
+        raise AssertionError('the existence check must not download the crop')
+
+    monkeypatch.setattr(storage_simple, 'get_bytes', fail)
+    # storage_database.put_bytes reports a failed write by returning False
+    monkeypatch.setattr(storage_simple, 'put_bytes', lambda *args: False)
+    with pytest.raises(CropWriteError):
+        put_crop({'full': b'\xff\xd8 unwritable crop \xff\xd9'})
+    crops = JobCrops('failed-write', 'lazy', workers=0)
+    future = crops.submit('highlight', 'base', 0, b'\xff\xd8 frame \xff\xd9', [0, 0, 10, 10])
+    assert isinstance(future.exception(), CropWriteError) and crops.archived == 0
+
+
+def test_crops_released_only_when_unreferenced(monkeypatch, tmp_path):
+    monkeypatch.setenv('USE_DATABASE_STORAGE', 'false')
+    import numpy as np
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from app.crops import JobCrops, get_crop, put_crop, release_crops, release_job_crops
+    from app.db import Base
+    from app.models import Issue, Job
+    from app.storage_simple import STORAGE_DIR
+
+    engine = create_engine(f'sqlite:///{tmp_path / "crops.db"}')
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    shared, own, orphan = (put_crop({'full': f'\xff\xd8 {name} \xff\xd9'.encode()}) for name in ('shared', 'own', 'orphan'))
+    frame = np.zeros((120, 160, 3), np.uint8)
+    lazy = JobCrops('job-1', 'lazy').crop('highlight', 'base', 3, frame, [10, 10, 50, 50])
+    get_crop(lazy)  # renders and stores the lazy crop's renditions
+    db.add_all([Job(id='job-1', status='completed'), Job(id='job-2', status='completed'),
+                Issue(id='a', job_id='job-1', base_crop_url=shared, present_crop_url=own),
+                Issue(id='b', job_id='job-1', base_crop_url=lazy),
+                Issue(id='c', job_id='job-2', base_crop_url=shared, present_crop_url='data:image/jpeg;base64,')])
+    db.commit()
+
+    keys = {shared, own, lazy}
+    db.query(Issue).filter(Issue.job_id == 'job-1').delete()
+    db.add(Job(id='job-3', status='processing'))
+    db.commit()
+    # A running job may be about to reference any stored crop
+    assert release_job_crops(db, ['job-1'], keys) == 0 and get_crop(own)
+
+    db.get(Job, 'job-3').status = 'completed'
+    db.commit()
+    assert release_job_crops(db, ['job-1'], keys) == 2
+    assert get_crop(own) is None and get_crop(lazy) is None
+    assert not (STORAGE_DIR / 'jobs/job-1/frames').exists()
+    assert get_crop(shared) and get_crop(orphan)
+
+    assert release_crops(db) >= 1
+    assert get_crop(orphan) is None and get_crop(shared)
@@ -0,0 +1,57 @@
+import numpy as np
+
+from app.inference import Prediction, merge_predictions, tile_grid
+
+
+def prediction(boxes, conf, cls):
+    return Prediction(np.array(boxes, np.float32).reshape(-1, 4), np.array(conf, np.float32),
+                      np.array(cls, np.int64))
+
+
+def test_tiles_cover_region_with_overlap():
+    for width, height, size, overlap, top in [(1920, 1080, 640, 0.2, 432), (1280, 720, 512, 0.25, 0),
+                                              (1000, 700, 640, 0.2, 100)]:
+        tiles = tile_grid(width, height, size, overlap, top=top)
+        covered = np.zeros((height, width), bool)
+        for x1, y1, x2, y2 in tiles:
+            assert 0 <= x1 < x2 <= width and top <= y1 < y2 <= height
+            assert x2 - x1 <= size and y2 - y1 <= size
+            covered[y1:y2, x1:x2] = True
+        assert covered[top:].all() and not covered[:top].any()
+
+        # Neighbouring tiles overlap by at least the requested fraction
+        xs = sorted({x1 for x1, _, _, _ in tiles})
+        assert all(b - a <= size * (1 - overlap) for a, b in zip(xs, xs[1:]))
+        # The last tile in each direction ends exactly at the frame edge
+        assert max(x2 for _, _, x2, _ in tiles) == width
+        assert max(y2 for _, _, _, y2 in tiles) == height
+
+
+def test_region_smaller_than_tile_is_one_clipped_tile():
+    assert tile_grid(500, 400, 640, 0.2, top=100) == [(0, 100, 500, 400)]
+
+
+def test_merge_shifts_tiles_and_dedupes_straddling_boxes():
+    full = prediction([[10, 10, 60, 60]], [0.5], [0])
+    # The same pothole near x=600 seen by two overlapping tiles at x offsets 0 and 512
+    left = prediction([[580, 100, 640, 160]], [0.7], [1])
+    right = prediction([[70, 102, 128, 160]], [0.9], [1])
+    merged = merge_predictions([full, left, right], [(0, 0), (0, 432), (512, 432)])
+
+    order = np.argsort(merged.cls)
+    assert merged.cls[order].tolist() == [0, 1]
+    assert merged.xyxy[order].tolist() == [[10, 10, 60, 60], [582, 534, 640, 592]]
+    assert merged.conf[order].tolist() == np.array([0.5, 0.9], np.float32).tolist()
+
+
+def test_merge_keeps_overlapping_boxes_of_different_classes():
+    a = prediction([[0, 0, 100, 100]], [0.8], [2])
+    b = prediction([[0, 0, 100, 100]], [0.6], [3])
+    merged = merge_predictions([a, b], [(0, 0), (0, 0)])
+    assert sorted(merged.cls.tolist()) == [2, 3]
+
+
+def test_merge_of_empty_predictions_is_empty():
+    empty = prediction([], [], [])
+    merged = merge_predictions([empty, empty], [(0, 0), (640, 0)])
+    assert merged.xyxy.shape == (0, 4) and len(merged.conf) == 0
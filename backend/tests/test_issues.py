@@ -0,0 +1,153 @@
+from concurrent.futures import Future
+
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+
+from app.db import Base, create_schema
+from app.issues import IssueMerger, IssueWriter
+from app.reasons import make_reason, render_reason
+from app.models import Issue, Job
+
+
+def issue(bbox, confidence=0.8, element='sign_board', issue_type='missing', severity='HIGH'):
+    return {
+        'detection': {'bbox': bbox, 'element': element, 'confidence': confidence},
+        'issue_type': issue_type,
+        'severity': severity,
+    }
+
+
+def run(merger, frames):
+    """Feed ``{frame_idx: [issues]}`` (analysed frames only) and collect every merged issue"""
+    merged = []
+    for frame_idx, issues in frames.items():
+        merged += merger.update(frame_idx, issues, f'base-{frame_idx}', f'present-{frame_idx}')
+    return merged + merger.finish()
+
+
+def test_consecutive_frames_merge_into_one_issue():
+    merged = run(IssueMerger(), {
+        0: [issue([100, 100, 200, 200], 0.6)],
+        1: [issue([110, 100, 210, 200], 0.9, severity='MEDIUM')],
+        2: [issue([120, 100, 220, 200], 0.7)],
+    })
+    assert len(merged) == 1
+    (m,) = merged
+    assert (m.first_frame, m.last_frame, m.frames, m.severity) == (0, 2, 3, 'HIGH')
+    # The most confident frame's issue and frames are kept for the crops
+    assert m.best_frame == 1 and m.best['detection']['confidence'] == 0.9
+    assert (m.base_frame, m.present_frame) == ('base-1', 'present-1')
+
+
+def test_gap_in_analysed_frames_splits_issue():
+    merged = run(IssueMerger(), {
+        0: [issue([100, 100, 200, 200])],
+        1: [],
+        2: [issue([100, 100, 200, 200])],
+    })
+    assert [(m.first_frame, m.last_frame) for m in merged] == [(0, 0), (2, 2)]
+
+
+def test_gated_frames_do_not_split_issue():
+    # Frames 1-3 were gated, so the merger never saw them
+    merged = run(IssueMerger(), {
+        0: [issue([100, 100, 200, 200])],
+        4: [issue([100, 100, 200, 200])],
+    })
+    assert [(m.first_frame, m.last_frame, m.frames) for m in merged] == [(0, 4, 2)]
+
+
+def test_different_labels_and_distant_boxes_stay_apart():
+    box = [100, 100, 200, 200]
+    merged = run(IssueMerger(), {
+        0: [issue(box), issue(box, element='guardrail'), issue([900, 500, 1000, 600])],
+        1: [issue(box, issue_type='moved'), issue(box, element='guardrail'), issue([900, 500, 1000, 600])],
+    })
+    spans = sorted((m.element, m.issue_type, m.first_frame, m.last_frame) for m in merged)
+    assert spans == [
+        ('guardrail', 'missing', 0, 1),
+        ('sign_board', 'missing', 0, 0),
+        ('sign_board', 'missing', 0, 1),
+        ('sign_board', 'moved', 1, 1),
+    ]
+
+
+def test_closed_issues_are_returned_as_they_end():
+    merger = IssueMerger()
+    assert merger.update(0, [issue([100, 100, 200, 200])], None, None) == []
+    assert merger.update(1, [issue([100, 100, 200, 200])], None, None) == []
+    (closed,) = merger.update(2, [], None, None)
+    assert (closed.first_frame, closed.last_frame) == (0, 1)
+    assert merger.finish() == []
+    assert (merger.detected, merger.merged) == (2, 1)
+
+
+def test_disabled_merger_returns_every_issue():
+    merged = run(IssueMerger(enabled=False), {
+        0: [issue([100, 100, 200, 200])],
+        1: [issue([100, 100, 200, 200])],
+    })
+    assert [(m.first_frame, m.last_frame) for m in merged] == [(0, 0), (1, 1)]
+
+
+def future(result=None, error=None):
+    value = Future()
+    if error:
+        value.set_exception(error)
+    else:
+        value.set_result(result)
+    return value
+
+
+def test_issue_writer_commits_batches_and_resolves_futures(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "issues.db"}')
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    db.add(Job(id='job'))
+    db.commit()
+
+    writer = IssueWriter(db, batch_size=2)
+    crops = [future('a'), future(error=RuntimeError('encoder died')), future('c'), 'd', future('e')]
+    for frame, crop in enumerate(crops):
+        writer.add(dict(job_id='job', element='sign_board', first_frame=frame, base_crop_url=crop))
+        if frame == 1:
+            # The first batch is committed as soon as it is full
+            assert writer.written == 2 and Session().query(Issue).count() == 2
+    assert (writer.written, writer.batches) == (4, 2)
+    writer.flush()
+    assert (writer.written, writer.batches, writer.failed_values) == (5, 3, 1)
+
+    rows = Session().query(Issue).order_by(Issue.first_frame).all()
+    # A failed crop leaves only its own row without a URL
+    assert [row.base_crop_url for row in rows] == ['a', None, 'c', 'd', 'e']
+
+
+def test_create_schema_adds_columns_to_old_issues_table(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "old.db"}')
+    with engine.begin() as conn:
+        # The issues table as created before reason templates
+        conn.execute(text('CREATE TABLE issues (id VARCHAR PRIMARY KEY, job_id VARCHAR, element VARCHAR, '
+                          'issue_type VARCHAR, severity VARCHAR, confidence FLOAT, first_frame INTEGER, '
+                          'last_frame INTEGER, base_crop_url TEXT, present_crop_url TEXT, reason TEXT, '
+                          'gps JSON, status VARCHAR)'))
+        conn.execute(text("INSERT INTO issues (id, reason) VALUES ('old', 'stored text')"))
+
+    create_schema(bind=engine)
+    create_schema(bind=engine)  # a no-op once the columns exist
+    columns = {column['name'] for column in inspect(engine).get_columns('issues')}
+    assert {'reason_template', 'reason_params'} <= columns
+
+    db = sessionmaker(bind=engine)()
+    writer = IssueWriter(db)
+    writer.add(dict(element='sign_board', reason_template='frame.missing', reason_params={'x': 1}))
+    writer.flush()
+    assert db.get(Issue, 'old').reason == 'stored text'
+    assert db.query(Issue).filter(Issue.id != 'old').one().reason_params == {'x': 1}
+
+
+def test_reason_keeps_params_its_template_does_not_use():
+    template, params = make_reason('safety', 'sign_board', 'missing', confidence=0.8, frame=12, location='left')
+    # The safety templates only show the confidence, but a reworded one may use the rest
+    assert params == {'confidence': 0.8, 'frame': 12, 'location': 'left'}
+    assert render_reason(template, params, 'sign_board', 'missing').endswith('[Confidence: 80.0%]')
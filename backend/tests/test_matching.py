@@ -0,0 +1,70 @@
+from itertools import permutations
+
+import numpy as np
+import pytest
+
+from app import matching
+from app.matching import match_detections, optimal_assignment
+
+
+def brute_force_best(score):
+    n, m = score.shape
+    if n <= m:
+        return max(sum(score[i, cols[i]] for i in range(n)) for cols in permutations(range(m), n))
+    return max(sum(score[rows[j], j] for j in range(m)) for rows in permutations(range(n), m))
+
+
+def check_against_brute_force():
+    rng = np.random.default_rng(0)
+    for n, m in [(1, 1), (2, 3), (3, 2), (4, 4), (5, 3), (3, 6)]:
+        for _ in range(20):
+            score = rng.random((n, m)) * (rng.random((n, m)) > 0.3)
+            rows, cols = optimal_assignment(score)
+            assert len(set(rows.tolist())) == len(rows) and len(set(cols.tolist())) == len(cols)
+            assert len(rows) == min(n, m)
+            assert score[rows, cols].sum() == pytest.approx(brute_force_best(score))
+
+
+def test_optimal_assignment_without_scipy(monkeypatch):
+    monkeypatch.setattr(matching, 'SCIPY_AVAILABLE', False)
+    check_against_brute_force()
+
+
+def test_optimal_assignment_with_scipy(monkeypatch):
+    pytest.importorskip('scipy')
+    monkeypatch.setattr(matching, 'SCIPY_AVAILABLE', True)
+    check_against_brute_force()
+
+
+def test_assignment_beats_greedy(monkeypatch):
+    monkeypatch.setattr(matching, 'SCIPY_AVAILABLE', False)
+    # Greedy would give base 0 its best partner (present 0, IoU 0.9) and leave
+    # base 1 unmatched; the optimum pairs base 0 with present 1 (0.5) and
+    # base 1 with present 0 (0.44)
+    base = [[0, 0, 100, 100], [50, 0, 90, 100]]
+    present = [[0, 0, 90, 100], [0, 0, 50, 100]]
+    result = match_detections(base, ['sign', 'sign'], present, ['sign', 'sign'], min_iou=0.3, stable_iou=0.7)
+    assert sorted((b, p) for b, p, _ in result.matched + result.moved) == [(0, 1), (1, 0)]
+    assert result.missing == [] and result.new == []
+
+
+def test_split_at_iou_boundaries():
+    base = [[0, 0, 100, 100]]
+    outcomes = {}
+    # A box of width w inside the base box has an IoU of exactly w / 100
+    for width in (29, 30, 59, 60):
+        result = match_detections(base, ['sign'], [[0, 0, width, 100]], ['sign'], min_iou=0.3, stable_iou=0.6)
+        outcomes[width] = (len(result.matched), len(result.moved), result.missing, result.new)
+    assert outcomes[29] == (0, 0, [0], [0])
+    assert outcomes[30] == (0, 1, [], [])
+    assert outcomes[59] == (0, 1, [], [])
+    assert outcomes[60] == (1, 0, [], [])
+
+
+def test_labels_and_allowed_mask_keep_pairs_apart():
+    box = [0, 0, 100, 100]
+    result = match_detections([box], ['sign'], [box], ['divider'], min_iou=0.3, stable_iou=0.6)
+    assert result.missing == [0] and result.new == [0]
+    result = match_detections([box], ['sign'], [box], ['sign'], min_iou=0.3, stable_iou=0.6,
+                              allowed=np.array([[False]]))
+    assert result.missing == [0] and result.new == [0]
@@ -0,0 +1,85 @@
+import cv2
+import numpy as np
+
+from app.parallel import PAIRS_PER_WORKER, process_pairs, shutdown_pool
+from app.worker import iter_pair_results
+
+
+def scene(seed, missing=False):
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(60, 90, (240, 320, 3), dtype=np.uint8)
+    cv2.rectangle(frame, (0, 180), (320, 240), (70, 70, 70), -1)
+    cv2.line(frame, (160, 240), (160, 180), (255, 255, 255), 4)
+    cv2.rectangle(frame, (40, 40), (110, 90), (40, 160, 40), -1)
+    if not missing:
+        cv2.rectangle(frame, (220, 60), (290, 120), (30, 200, 230), -1)  # yellow sign
+    return frame
+
+
+def make_pairs(count):
+    return [(scene(i), scene(i, missing=i % 2 == 1)) for i in range(count)]
+
+
+def test_process_pairs_matches_serial_results_in_order():
+    workers = 2
+    pairs = make_pairs(9)
+    pulled = []
+
+    def feed():
+        for pair in pairs:
+            pulled.append(pair)
+            yield pair
+
+    try:
+        results = []
+        for result in process_pairs(feed(), 'fast', workers):
+            # Results come back in frame order, with a bounded number of pairs in flight
+            assert len(pulled) - len(results) <= workers * PAIRS_PER_WORKER
+            results.append(result)
+    finally:
+        shutdown_pool()
+
+    expected = list(iter_pair_results(make_pairs(9), 'fast'))
+    assert [r[0] for r in results] == list(range(9))
+    for got, want in zip(results, expected):
+        frame_idx, base, present, base_det, present_det, issues, gated = got
+        # Enhanced frames are written back through shared memory
+        assert np.array_equal(base, want[1]) and np.array_equal(present, want[2])
+        assert not np.array_equal(base, pairs[frame_idx][0])
+        assert (base_det, present_det, issues, gated) == tuple(want[3:])
+    assert any(r[5] for r in results)
+
+
+def test_pipeline_enhances_off_the_decode_threads(monkeypatch):
+    import threading
+
+    from app import worker
+    from app.config import settings
+    from app.db import Base, engine
+    from app.storage_simple import STORAGE_DIR
+
+    monkeypatch.setenv('USE_DATABASE_STORAGE', 'false')
+    monkeypatch.setattr(settings, 'max_frames', 3)
+    monkeypatch.setattr(settings, 'detection_workers', 1)
+    Base.metadata.create_all(engine)
+    for name in ('base', 'present'):
+        path = STORAGE_DIR / 'thread-test' / f'{name}.avi'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        video = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'MJPG'), 2, (320, 240))
+        for i in range(6):
+            video.write(scene(i, missing=name == 'present'))
+        video.release()
+
+    threads = []
+    enhance = worker.enhance_frame
+
+    def recording(frame, profile='quality'):
+        if profile != 'none':
+            threads.append(threading.current_thread().name)
+        return enhance(frame, profile)
+
+    monkeypatch.setattr(worker, 'enhance_frame', recording)
+    worker.run_pipeline('thread-test', {'base_key': 'thread-test/base.avi', 'present_key': 'thread-test/present.avi',
+                                        'metadata': {'enhancement': 'quality'}})
+    assert len(threads) == 6
+    assert not any(name.startswith('decode-') for name in threads)
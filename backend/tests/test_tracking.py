@@ -0,0 +1,122 @@
+import math
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import List, Optional
+
+from app.tracking import StreamTrackers, Tracker
+
+
+@dataclass
+class Det:
+    bbox: List[int]
+    element_type: str
+    confidence: float
+    frame_idx: int
+    track_id: Optional[str] = None
+
+
+def box(cx, cy, frame_idx, element_type='sign_board', confidence=0.9):
+    return Det([cx - 20, cy - 20, cx + 20, cy + 20], element_type, confidence, frame_idx)
+
+
+def reference_track(frames, max_distance=150, persistence=3, min_confidence=0.65):
+    """The tracker before the spatial grid: a linear scan over every track of the video"""
+    tracks = defaultdict(list)
+    confirmed = []
+    for detections in frames:
+        for det in detections:
+            cx = (det.bbox[0] + det.bbox[2]) // 2
+            cy = (det.bbox[1] + det.bbox[3]) // 2
+            best, best_distance = None, float('inf')
+            for track_id, track in tracks.items():
+                if track[0].element_type != det.element_type:
+                    continue
+                last = track[-1]
+                distance = math.sqrt((cx - (last.bbox[0] + last.bbox[2]) // 2) ** 2 +
+                                     (cy - (last.bbox[1] + last.bbox[3]) // 2) ** 2)
+                if distance < max_distance and distance < best_distance:
+                    best, best_distance = track_id, distance
+            if best is None:
+                best = f"{det.element_type}_{cx // 80}_{cy // 80}_{det.frame_idx}"
+            track = tracks[best]
+            track.append(det)
+            weights = [1.0 + i * 0.1 for i in range(len(track))]
+            confidence = sum(d.confidence * w for d, w in zip(track, weights)) / sum(weights)
+            span = track[-1].frame_idx - track[0].frame_idx + 1
+            if len(track) >= persistence and confidence >= min_confidence and len(track) / span >= 0.4:
+                confirmed.append((det.frame_idx, best))
+    return confirmed
+
+
+def scripted_frames():
+    frames = []
+    for f in range(12):
+        detections = [box(100 + 30 * f, 200, f)]  # a sign drifting right
+        if f % 3 != 1:
+            detections.append(box(900, 500, f, 'lane_marking', 0.7))  # seen in 2 of 3 frames
+        if f == 4:
+            detections.append(box(600, 100, f))  # one-frame false positive
+        if 6 <= f <= 9:
+            detections.append(box(1200, 300, f, confidence=0.5))  # too unsure to confirm
+        frames.append(detections)
+    return frames
+
+
+def test_confirmations_match_reference_tracker():
+    tracker = Tracker(expiry_frames=1000)
+    confirmed = [(det.frame_idx, det.track_id) for detections in scripted_frames()
+                 for det in tracker.update(detections)]
+    assert confirmed == reference_track(scripted_frames())
+    assert len({track_id for _, track_id in confirmed}) == 2
+
+
+def test_track_keeps_id_across_cell_boundary():
+    tracker = Tracker(max_distance=150, persistence=1, min_confidence=0.5)
+    ids = set()
+    for f, cx in enumerate([130, 145, 160, 290, 310]):  # cells are 150px wide
+        (det,) = tracker.update([box(cx, 100, f)])
+        ids.add(det.track_id)
+    assert len(ids) == 1 and tracker.created == 1
+
+
+def test_expired_tracks_are_evicted_and_slots_reused():
+    tracker = Tracker(persistence=1, min_confidence=0.5, expiry_frames=5)
+    (first,) = tracker.update([box(100, 100, 0)])
+    tracker.update([box(800, 100, 1)])
+    assert len(tracker) == 2 and tracker.store.capacity == 2
+
+    tracker.update([], frame_idx=7)
+    assert len(tracker) == 0 and tracker.expired == 2
+    assert first.track_id in tracker.pop_retired() and tracker.pop_retired() == []
+
+    # A detection at the old spot starts a new track in a reused slot
+    (again,) = tracker.update([box(100, 100, 8)])
+    assert again.track_id != first.track_id
+    assert len(tracker) == 1 and tracker.store.capacity == 2
+    assert tracker.stats() == {'tracks': 3, 'expired': 2, 'live': 1, 'peak_live': 2}
+
+
+def test_streams_never_share_tracks():
+    trackers = StreamTrackers(persistence=2, min_confidence=0.5, expiry_frames=3)
+    ids = {'base': set(), 'present': set()}
+    # Both videos see the same sign at the same spots; only base sees a guardrail
+    for f in range(4):
+        for stream in ('base', 'present'):
+            detections = [box(100 + 10 * f, 200, f)]
+            if stream == 'base':
+                detections.append(box(600, 300, f, 'guardrail'))
+            ids[stream] |= {det.track_id for det in trackers.update(stream, detections, f)}
+    assert len(ids['base']) == 2 and len(ids['present']) == 1
+    assert not ids['base'] & ids['present']
+    assert trackers.get('base').created == 2 and trackers.get('present').created == 1
+
+    # Present keeps going, so only base's tracks expire
+    trackers.update('present', [box(140, 200, 5)], 5)
+    trackers.update('present', [box(150, 200, 7)], 7)
+    assert trackers.pop_retired('present') == []
+    trackers.update('base', [], 7)
+    assert set(trackers.pop_retired('base')) == ids['base']
+
+    assert trackers.release('base') == {'tracks': 2, 'expired': 2, 'live': 0, 'peak_live': 2}
+    assert 'base' not in trackers and trackers.release('base') is None
+    assert trackers.get('present').stats()['live'] == 1
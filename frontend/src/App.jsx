@@ -4,6 +4,9 @@ import ReactPlayer from 'react-player'
 
 const API = import.meta.env.VITE_API || 'http://localhost:8000/api/v1'
 
+// Stored crops come in renditions (/crops/{key}?size=thumb|medium); inline data URLs are left alone
+const cropSize = (url, size) => url && url.includes('/crops/') ? `${url.split('?')[0]}?size=${size}` : url
+
 // Configure axios defaults for better CORS handling
 // Note: withCredentials removed to prevent CORS issues
 // Don't set Content-Type globally - let axios handle it for FormData
@@ -452,8 +455,8 @@ function JobViewer({jobId}) {
                     Frames: {i.first_frame} - {i.last_frame}
                   </div>
                   <div className="flex gap-2">
-                    <img src={i.base_crop_url} alt="base" className="h-12 w-12 object-cover rounded border" />
-                    <img src={i.present_crop_url} alt="present" className="h-12 w-12 object-cover rounded border" />
+                    <img src={cropSize(i.base_crop_url, 'thumb')} alt="base" className="h-12 w-12 object-cover rounded border" />
+                    <img src={cropSize(i.present_crop_url, 'thumb')} alt="present" className="h-12 w-12 object-cover rounded border" />
                   </div>
                 </div>
               ))}
@@ -0,0 +1,593 @@
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+
+def bench_decode(args):
+    """Decode-only throughput of each frame sampling strategy"""
+    from app.frames import SAMPLING_STRATEGIES, choose_strategy, sample_frames
+    import cv2
+
+    for path in args.videos:
+        cap = cv2.VideoCapture(path)
+        video_fps = cap.get(cv2.CAP_PROP_FPS) or 30
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        interval = max(int(round(video_fps / args.fps)), 1)
+        print(f"{path}: {total} frames @ {video_fps:.1f} FPS, keeping every {interval}")
+        print(f"  auto -> {choose_strategy(path, interval)}")
+        for strategy in SAMPLING_STRATEGIES:
+            best = float('inf')
+            kept = 0
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                kept = sum(1 for _ in sample_frames(path, fps=args.fps, strategy=strategy))
+                best = min(best, time.perf_counter() - start)
+            print(f"  {strategy:>5}: {kept} kept in {best * 1000:.1f}ms "
+                  f"({kept / best:.1f} kept/s, {total / best:.1f} source frames/s)")
+
+
+def bench_enhance(args):
+    """ms/frame and detection-count delta of each enhancement profile"""
+    from app.enhance import ENHANCEMENT_PROFILES
+    from app.frames import sample_frames
+
+    if args.pipeline == 'advanced':
+        from app.worker_advanced import AdvancedRoadDetector
+        detector = AdvancedRoadDetector()
+        enhance = detector.enhance_frame
+        detect = lambda frame: detector.detect_with_yolo(frame, 0)
+    else:
+        from app.worker import enhance_frame as enhance, detect_road_elements as detect
+
+    frames = [frame for path in args.videos for _, frame in sample_frames(path, fps=args.fps)]
+    print(f"{len(frames)} sampled frames from {len(args.videos)} videos ({args.pipeline} pipeline)")
+
+    results = {}
+    for profile in ENHANCEMENT_PROFILES:
+        start = time.perf_counter()
+        enhanced = [enhance(frame, profile) for frame in frames]
+        elapsed = time.perf_counter() - start
+        detections = sum(len(detect(frame)) for frame in enhanced)
+        results[profile] = (elapsed * 1000 / max(len(frames), 1), detections)
+
+    reference = results['quality'][1]
+    for profile, (ms, detections) in results.items():
+        print(f"  {profile:>8}: {ms:8.1f} ms/frame, {detections} detections ({detections - reference:+d} vs quality)")
+
+
+def _reference_enhance(frame, denoise=True):
+    """The advanced pipeline's enhancement as it was before FramePreprocessor (operators built per call)"""
+    import cv2
+    import numpy as np
+
+    if denoise:
+        frame = cv2.fastNlMeansDenoisingColored(frame, None, 6, 6, 7, 15)
+    lab = cv2.cvtColor(frame, cv2.COLOR_BGR2LAB)
+    l, a, b = cv2.split(lab)
+    clahe = cv2.createCLAHE(clipLimit=2.5, tileGridSize=(8, 8))
+    enhanced = cv2.cvtColor(cv2.merge([clahe.apply(l), a, b]), cv2.COLOR_LAB2BGR)
+    gray = cv2.cvtColor(enhanced, cv2.COLOR_BGR2GRAY)
+    center = 10 if cv2.Laplacian(gray, cv2.CV_64F).var() < 100 else 9
+    kernel = np.array([[-1, -1, -1], [-1, center, -1], [-1, -1, -1]])
+    sharpened = cv2.filter2D(enhanced, -1, kernel)
+    table = np.array([((i / 255.0) ** (1.0 / 1.2)) * 255 for i in np.arange(0, 256)]).astype("uint8")
+    return cv2.LUT(sharpened, table)
+
+
+def _reference_is_blurry(frame, threshold=80.0):
+    import cv2
+
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
+    sobel_var = cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=3).var() + cv2.Sobel(gray, cv2.CV_64F, 0, 1, ksize=3).var()
+    return laplacian_var < threshold and sobel_var < threshold * 2
+
+
+def bench_preprocess(args):
+    """Per-frame latency and allocations of blur scoring + enhancement, per-call operators vs FramePreprocessor"""
+    import tracemalloc
+    import numpy as np
+    from app.enhance import FramePreprocessor
+    from app.frames import sample_frames
+
+    frames = [frame for path in args.videos for _, frame in sample_frames(path, fps=args.fps)]
+    print(f"{len(frames)} sampled frames from {len(args.videos)} videos, denoise={'on' if args.denoise else 'off'}")
+    preprocessor = FramePreprocessor()
+
+    def reference(frame):
+        return None if _reference_is_blurry(frame) else _reference_enhance(frame, args.denoise)
+
+    def reused(frame):
+        if preprocessor.is_blurry(frame):
+            return None
+        return preprocessor._enhance_quality(frame, denoise=args.denoise)
+
+    mismatched = sum(
+        not np.array_equal(_reference_enhance(frame, args.denoise), preprocessor._enhance_quality(frame, args.denoise))
+        for frame in frames
+    )
+    print(f"  enhanced output differs on {mismatched}/{len(frames)} frames")
+
+    for name, fn in (('per-call', reference), ('reused', reused)):
+        fn(frames[0])  # warm up buffers and OpenCV's thread pool
+        best = float('inf')
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            for frame in frames:
+                fn(frame)
+            best = min(best, time.perf_counter() - start)
+
+        tracemalloc.start()
+        for frame in frames:
+            fn(frame)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"  {name:>8}: {best * 1000 / len(frames):8.1f} ms/frame, peak {peak / 1e6:.1f}MB numpy allocations")
+
+
+def _candidate_boxes(frame):
+    """Bounding boxes of the contours detect_road_elements analyses, plus its HSV masks"""
+    import cv2
+    import numpy as np
+
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    edges = cv2.bitwise_or(cv2.Canny(gray, 50, 150), cv2.Canny(gray, 100, 200))
+    dilated = cv2.dilate(edges, np.ones((3, 3), np.uint8), iterations=2)
+    contours, _ = cv2.findContours(dilated, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+    masks = [
+        cv2.inRange(hsv, np.array([20, 100, 100]), np.array([30, 255, 255])),
+        cv2.inRange(hsv, np.array([40, 50, 50]), np.array([80, 255, 255])),
+        cv2.inRange(hsv, np.array([0, 0, 180]), np.array([180, 30, 255])),
+    ]
+    boxes = [cv2.boundingRect(cnt) for cnt in contours if cv2.contourArea(cnt) >= 600]
+    return boxes, masks
+
+
+def bench_detect(args):
+    """Per-frame cost of colour ratios + brightness: ROI slicing vs summed-area tables"""
+    import cv2
+    import numpy as np
+    from app.frames import sample_frames
+    from app.worker import _box_sum, detect_road_elements
+
+    frames = [frame for path in args.videos for _, frame in sample_frames(path, fps=args.fps)]
+    prepared = [(frame, *_candidate_boxes(frame)) for frame in frames]
+    n_boxes = sum(len(boxes) for _, boxes, _ in prepared)
+    print(f"{len(frames)} sampled frames, {n_boxes} candidate boxes ({n_boxes / max(len(frames), 1):.1f}/frame)")
+
+    def roi_stats(frame, boxes, masks):
+        for x, y, cw, ch in boxes:
+            np.mean(np.mean(frame[y:y+ch, x:x+cw], axis=(0, 1)))
+            for mask in masks:
+                np.sum(mask[y:y+ch, x:x+cw] > 0) / (cw * ch)
+
+    def integral_stats(frame, boxes, masks):
+        tables = [cv2.integral(mask, sdepth=cv2.CV_32S) for mask in masks]
+        bgr = cv2.integral(frame, sdepth=cv2.CV_64F)
+        for x, y, cw, ch in boxes:
+            np.mean(_box_sum(bgr, x, y, cw, ch) / (cw * ch))
+            for table in tables:
+                int(_box_sum(table, x, y, cw, ch)) // 255 / (cw * ch)
+
+    for name, fn in (('roi', roi_stats), ('integral', integral_stats)):
+        best = float('inf')
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            for item in prepared:
+                fn(*item)
+            best = min(best, time.perf_counter() - start)
+        print(f"  {name:>8}: {best * 1000 / len(frames):6.2f} ms/frame for colour ratios + brightness")
+
+    start = time.perf_counter()
+    for frame in frames:
+        detect_road_elements(frame)
+    print(f"  detect_road_elements: {(time.perf_counter() - start) * 1000 / len(frames):.2f} ms/frame end to end")
+
+
+def bench_yolo_batch(args):
+    """YOLO throughput per batch size over base and present frames"""
+    from app.frames import sample_frames
+    from app.worker_advanced import AdvancedRoadDetector
+
+    detector = AdvancedRoadDetector()
+    if not detector.model:
+        sys.exit('YOLO model could not be loaded')
+
+    items = [
+        (video, idx, frame)
+        for video, path in zip(('base', 'present'), args.videos)
+        for idx, (_, frame) in enumerate(sample_frames(path, fps=args.fps, resolution=(1920, 1080)))
+    ]
+    print(f"{len(items)} frames from {len(args.videos)} videos")
+
+    reference = None
+    for batch_size in args.batch_sizes:
+        detector.detect_batch(items[:batch_size], batch_size=batch_size)  # warm up this batch shape
+        start = time.perf_counter()
+        detections = detector.detect_batch(items, batch_size=batch_size)
+        elapsed = time.perf_counter() - start
+        counts = {key: len(dets) for key, dets in detections.items()}
+        reference = reference or counts
+        same = sum(counts[key] == reference[key] for key in counts)
+        print(f"  batch {batch_size:>3}: {len(items) / elapsed:6.2f} frames/s "
+              f"({elapsed * 1000 / len(items):.1f} ms/frame), detection counts match batch "
+              f"{args.batch_sizes[0]} on {same}/{len(counts)} frames")
+
+
+def _agreement(reference, detections, iou_threshold=0.5):
+    """Share of detections (same class, IoU >= threshold) two backends agree on, F1-style"""
+    def iou(a, b):
+        ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+        iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+        inter = ix * iy
+        union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+        return inter / union if union > 0 else 0
+
+    matched, used = 0, set()
+    for ref in reference:
+        for i, det in enumerate(detections):
+            if i not in used and det.element_type == ref.element_type and iou(ref.bbox, det.bbox) >= iou_threshold:
+                used.add(i)
+                matched += 1
+                break
+    total = len(reference) + len(detections)
+    return 2 * matched / total if total else 1.0
+
+
+def bench_backends(args):
+    """Latency and detection agreement of the ONNX Runtime (FP32/INT8) backends vs PyTorch"""
+    from app import model_registry
+    from app.frames import sample_frames
+    from app.inference import OnnxBackend, int8_path
+    from app.worker_advanced import AdvancedRoadDetector, _load_ultralytics
+
+    detector = AdvancedRoadDetector()
+    items = [
+        (video, idx, frame)
+        for video, path in zip(('base', 'present'), args.videos)
+        for idx, (_, frame) in enumerate(sample_frames(path, fps=args.fps, resolution=(1920, 1080)))
+    ]
+    print(f"{len(items)} frames, batch size {args.batch_size}")
+
+    backends = [('pytorch', args.weights, _load_ultralytics), ('onnx-fp32', args.onnx, OnnxBackend)]
+    if os.path.exists(int8_path(args.onnx)):
+        backends.append(('onnx-int8', int8_path(args.onnx), OnnxBackend))
+
+    reference = reference_name = None
+    for name, path, loader in backends:
+        try:
+            detector.model = model_registry.get_model(path, loader)
+        except Exception as e:
+            print(f"  {name:>9}: unavailable ({e})")
+            continue
+        start = time.perf_counter()
+        detections = detector.detect_batch(items, batch_size=args.batch_size)
+        elapsed = time.perf_counter() - start
+        if reference is None:
+            reference, reference_name = detections, name
+        agreement = sum(_agreement(reference[key], detections[key]) for key in detections) / len(detections)
+        print(f"  {name:>9}: {elapsed * 1000 / len(items):7.1f} ms/frame, "
+              f"{sum(len(d) for d in detections.values())} detections, {agreement:.1%} agreement with {reference_name}")
+
+
+def _synthetic_detections(frames, objects_per_frame, seed=0):
+    """Per-frame detections of objects drifting across a 1920x1080 frame, plus one-frame clutter"""
+    import numpy as np
+    from app.tracking import Detection
+
+    rng = np.random.default_rng(seed)
+    types = ['sign_board', 'lane_marking', 'guardrail', 'pothole']
+    objects = []
+    stream = []
+    for frame_idx in range(frames):
+        # Objects leave the view after a while and new ones come in
+        objects = [o for o in objects if frame_idx - o[4] < 12]
+        while len(objects) < objects_per_frame:
+            objects.append([rng.integers(0, 1800), rng.integers(0, 1000), rng.choice(types), rng.uniform(0.6, 1.0), frame_idx])
+        detections = []
+        for o in objects:
+            o[0] = min(o[0] + rng.integers(0, 20), 1860)
+            o[1] = min(o[1] + rng.integers(0, 10), 1040)
+            if rng.random() < 0.8:
+                detections.append(Detection([int(o[0]), int(o[1]), int(o[0]) + 60, int(o[1]) + 40],
+                                            str(o[2]), float(o[3]), frame_idx))
+        for _ in range(objects_per_frame // 5):
+            x, y = int(rng.integers(0, 1800)), int(rng.integers(0, 1000))
+            detections.append(Detection([x, y, x + 50, y + 50], str(rng.choice(types)), 0.5, frame_idx))
+        stream.append(detections)
+    return stream
+
+
+def _reference_track(tracks, detections, max_distance=150, persistence=3, min_confidence=0.65):
+    """The linear-scan tracker (every track ever created, weights rebuilt per detection)"""
+    import numpy as np
+
+    tracked = []
+    for det in detections:
+        x_center = (det.bbox[0] + det.bbox[2]) // 2
+        y_center = (det.bbox[1] + det.bbox[3]) // 2
+        best_track_id, min_distance = None, float('inf')
+        for track_id, track in tracks.items():
+            if not track_id.startswith(det.element_type):
+                continue
+            last = track['detections'][-1]
+            distance = np.sqrt((x_center - (last.bbox[0] + last.bbox[2]) // 2) ** 2 +
+                               (y_center - (last.bbox[1] + last.bbox[3]) // 2) ** 2)
+            if distance < max_distance and distance < min_distance:
+                min_distance, best_track_id = distance, track_id
+        if best_track_id is None:
+            best_track_id = f"{det.element_type}_{x_center // 80}_{y_center // 80}_{det.frame_idx}"
+        track = tracks.setdefault(best_track_id, {'detections': [], 'first_frame': det.frame_idx})
+        track['detections'].append(det)
+        confidences = [d.confidence for d in track['detections']]
+        weights = [1.0 + (i * 0.1) for i in range(len(confidences))]
+        avg = sum(c * w for c, w in zip(confidences, weights)) / sum(weights)
+        density = len(track['detections']) / max(det.frame_idx - track['first_frame'] + 1, 1)
+        if len(track['detections']) >= persistence and avg >= min_confidence and density >= 0.4:
+            tracked.append(det)
+    return tracked
+
+
+def bench_track(args):
+    """Linear-scan vs grid-indexed tracking on synthetic detection streams of growing length"""
+    from app.tracking import Tracker
+
+    for frames in args.frames:
+        stream = _synthetic_detections(frames, args.objects)
+        total = sum(len(d) for d in stream)
+
+        start = time.perf_counter()
+        tracks = {}
+        reference = sum(len(_reference_track(tracks, detections)) for detections in stream)
+        reference_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        tracker = Tracker(expiry_frames=args.expiry)
+        confirmed = sum(len(tracker.update(detections)) for detections in stream)
+        grid_seconds = time.perf_counter() - start
+
+        print(f"{frames:>6} frames, {total:>7} detections: linear {reference_seconds * 1000:9.1f}ms "
+              f"({len(tracks)} tracks, {reference} confirmed), grid {grid_seconds * 1000:8.1f}ms "
+              f"({len(tracker)} live in {tracker.store.capacity} slots, {tracker.expired} expired, {confirmed} confirmed), "
+              f"{reference_seconds / grid_seconds:.1f}x")
+
+
+def _reference_match(base_det, present_det, min_iou=0.3):
+    """The greedy nested-loop matching (per-pair Python IoU, list.index lookups)"""
+    def iou(box1, box2):
+        x1, y1, x2, y2 = box1
+        x1p, y1p, x2p, y2p = box2
+        inter = max(0, min(x2, x2p) - max(x1, x1p)) * max(0, min(y2, y2p) - max(y1, y1p))
+        union = (x2 - x1) * (y2 - y1) + (x2p - x1p) * (y2p - y1p) - inter
+        return inter / union if union > 0 else 0
+
+    matched, pairs = set(), 0
+    for base in base_det:
+        best_match, best_iou = None, 0
+        for idx, present in enumerate(present_det):
+            if idx in matched or base.element_type != present.element_type:
+                continue
+            score = iou(base.bbox, present.bbox)
+            if score > best_iou:
+                best_iou, best_match = score, present
+        if best_match:
+            matched.add(present_det.index(best_match))
+            pairs += best_iou >= min_iou
+    return pairs
+
+
+def bench_match(args):
+    """Greedy nested-loop vs vectorized optimal detection matching"""
+    import numpy as np
+    from app.matching import SCIPY_AVAILABLE, match_detections
+    from app.tracking import Detection
+
+    rng = np.random.default_rng(0)
+    types = ['sign_board', 'lane_marking', 'guardrail', 'pothole']
+    print(f"assignment solver: {'scipy' if SCIPY_AVAILABLE else 'numpy'}")
+    for count in args.detections:
+        base, present = [], []
+        for i in range(count):
+            x, y = int(rng.integers(0, 1800)), int(rng.integers(0, 1000))
+            element = types[i % len(types)]
+            base.append(Detection([x, y, x + 80, y + 60], element, 0.9, 0))
+            if rng.random() < 0.9:  # Some elements disappear, the rest drift a little
+                dx, dy = (int(v) for v in rng.integers(-25, 25, 2))
+                present.append(Detection([x + dx, y + dy, x + dx + 80, y + dy + 60], element, 0.9, 0))
+        present = [present[i] for i in rng.permutation(len(present))]
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            greedy = _reference_match(base, present)
+        greedy_seconds = (time.perf_counter() - start) / args.repeat
+
+        match_detections([[0, 0, 1, 1]], ['a'], [[0, 0, 1, 1]], ['a'], 0.3, 0.6)  # warm-up
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            result = match_detections([d.bbox for d in base], [d.element_type for d in base],
+                                      [d.bbox for d in present], [d.element_type for d in present], 0.3, 0.6)
+        optimal_seconds = (time.perf_counter() - start) / args.repeat
+
+        print(f"  {count:>5} vs {len(present):>5}: greedy {greedy_seconds * 1000:8.1f}ms ({greedy} pairs), "
+              f"optimal {optimal_seconds * 1000:7.1f}ms ({len(result.matched) + len(result.moved)} pairs), "
+              f"{greedy_seconds / optimal_seconds:.1f}x")
+
+
+def bench_crops(args):
+    """Bytes and encode ms per crop rendition and format, against one full-size JPEG at quality 95"""
+    import numpy as np
+    from app.crops import CROP_FORMATS, RENDITIONS, encode_image, fit
+    from app.frames import sample_frames
+
+    rng = np.random.default_rng(0)
+    crops = []
+    for path in args.videos:
+        for _, frame in sample_frames(path, fps=args.fps):
+            h, w = frame.shape[:2]
+            cw, ch = int(rng.integers(w // 6, w // 2)), int(rng.integers(h // 6, h // 2))
+            x, y = int(rng.integers(0, w - cw)), int(rng.integers(0, h - ch))
+            crops.append(frame[y:y + ch, x:x + cw])
+            crops.append(frame)  # Full-frame crops of new/missing items
+    print(f"{len(crops)} crops from {len(args.videos)} videos")
+
+    def measure(fmt):
+        sizes = {size: [0, 0.0] for size in RENDITIONS}
+        for crop in crops:
+            image = crop
+            for size, (max_width, max_height, quality) in RENDITIONS.items():
+                start = time.perf_counter()
+                image = fit(image, max_width, max_height)
+                data = encode_image(image, quality or 95, fmt)
+                sizes[size][1] += time.perf_counter() - start
+                sizes[size][0] += len(data)
+        return sizes
+
+    baseline = measure('jpeg')['full']
+    print(f"  baseline (one full JPEG q95): {baseline[0] / len(crops) / 1024:8.1f} KB, "
+          f"{baseline[1] * 1000 / len(crops):6.2f} ms/crop")
+    for fmt in CROP_FORMATS:
+        total_ms = 0.0
+        for size, (size_bytes, seconds) in measure(fmt).items():
+            total_ms += seconds * 1000 / len(crops)
+            print(f"  {fmt:>5} {size:>6}: {size_bytes / len(crops) / 1024:8.1f} KB, "
+                  f"{seconds * 1000 / len(crops):6.2f} ms/crop")
+        print(f"  {fmt:>5}    all: {total_ms:6.2f} ms/crop")
+
+
+def bench_issues(args):
+    """Per-object ORM adds with one final commit vs batched bulk inserts of issue rows"""
+    import json
+    import tempfile
+    import uuid
+    from sqlalchemy import create_engine, delete
+    from sqlalchemy.orm import sessionmaker
+    from app.db import Base
+    from app.issues import IssueWriter
+    from app.models import Issue, Job
+
+    url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/issues.db"
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    print(f"database: {engine.url.render_as_string(hide_password=True)}")
+
+    def rows(count, job_id):
+        for n in range(count):
+            yield dict(
+                job_id=job_id, element='sign_board', issue_type='missing', severity='HIGH', confidence=0.87,
+                first_frame=n, last_frame=n, base_crop_url=uuid.uuid4().hex, present_crop_url=uuid.uuid4().hex,
+                reason='Sign board present in base but missing in present video. ' * 6,
+                gps=json.dumps({'lat': 10.3170 + n * 0.0001, 'lon': 77.9444 + n * 0.0001}),
+            )
+
+    def run(count, write):
+        db = Session()
+        job_id = str(uuid.uuid4())
+        db.add(Job(id=job_id, status='processing'))
+        db.commit()
+        start = time.perf_counter()
+        write(db, rows(count, job_id))
+        elapsed = time.perf_counter() - start
+        db.execute(delete(Issue).where(Issue.job_id == job_id))
+        db.commit()
+        db.close()
+        return elapsed
+
+    def per_object(db, issues):
+        for row in issues:
+            db.add(Issue(id=str(uuid.uuid4()), **row))
+        db.commit()
+
+    def batched(batch_size):
+        def write(db, issues):
+            writer = IssueWriter(db, batch_size)
+            for row in issues:
+                writer.add(row)
+            writer.flush()
+        return write
+
+    for count in args.issues:
+        reference = run(count, per_object)
+        print(f"  {count:>6} issues: per-object add {reference * 1000:8.1f}ms")
+        for batch_size in args.batch_sizes:
+            elapsed = run(count, batched(batch_size))
+            print(f"  {count:>6} issues: batches of {batch_size:>5} {elapsed * 1000:8.1f}ms "
+                  f"({reference / elapsed:.1f}x)")
+
+
+def main():
+    ap = argparse.ArgumentParser(description='RoadCompare pipeline micro-benchmarks')
+    sub = ap.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('decode', help='frame sampling throughput per strategy')
+    p.add_argument('--videos', nargs='+', default=['sample_data/base.mp4', 'sample_data/present.mp4'])
+    p.add_argument('--fps', type=float, default=1)
+    p.add_argument('--repeat', type=int, default=3)
+    p.set_defaults(func=bench_decode)
+
+    p = sub.add_parser('enhance', help='cost and detection delta of each enhancement profile')
+    p.add_argument('--videos', nargs='+', default=['sample_data/base.mp4', 'sample_data/present.mp4'])
+    p.add_argument('--fps', type=float, default=1)
+    p.add_argument('--pipeline', choices=['basic', 'advanced'], default='basic')
+    p.set_defaults(func=bench_enhance)
+
+    p = sub.add_parser('preprocess', help='advanced preprocessing with per-call vs reused operators')
+    p.add_argument('--videos', nargs='+', default=['sample_data/base.mp4', 'sample_data/present.mp4'])
+    p.add_argument('--fps', type=float, default=1)
+    p.add_argument('--repeat', type=int, default=3)
+    p.add_argument('--no-denoise', dest='denoise', action='store_false')
+    p.set_defaults(func=bench_preprocess)
+
+    p = sub.add_parser('detect', help='colour ratio / brightness cost in detect_road_elements')
+    p.add_argument('--videos', nargs='+', default=['sample_data/base.mp4', 'sample_data/present.mp4'])
+    p.add_argument('--fps', type=float, default=1)
+    p.add_argument('--repeat', type=int, default=3)
+    p.set_defaults(func=bench_detect)
+
+    p = sub.add_parser('yolo-batch', help='YOLO inference throughput per batch size (CPU)')
+    p.add_argument('--videos', nargs=2, default=['sample_data/base.mp4', 'sample_data/present.mp4'])
+    p.add_argument('--fps', type=float, default=2)
+    p.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 2, 4, 8, 16])
+    p.set_defaults(func=bench_yolo_batch)
+
+    p = sub.add_parser('backends', help='ONNX Runtime FP32/INT8 vs PyTorch latency and agreement')
+    p.add_argument('--videos', nargs=2, default=['sample_data/base.mp4', 'sample_data/present.mp4'])
+    p.add_argument('--fps', type=float, default=2)
+    p.add_argument('--weights', default='yolov8x.pt')
+    p.add_argument('--onnx', default='yolov8x.onnx')
+    p.add_argument('--batch-size', type=int, default=8)
+    p.set_defaults(func=bench_backends)
+
+    p = sub.add_parser('track', help='linear-scan vs grid-indexed temporal tracking')
+    p.add_argument('--frames', nargs='+', type=int, default=[100, 400, 1600])
+    p.add_argument('--objects', type=int, default=20, help='objects on screen per frame')
+    p.add_argument('--expiry', type=int, default=10, help='track expiry in frames')
+    p.set_defaults(func=bench_track)
+
+    p = sub.add_parser('match', help='greedy vs vectorized optimal base/present detection matching')
+    p.add_argument('--detections', nargs='+', type=int, default=[50, 200, 800])
+    p.add_argument('--repeat', type=int, default=3)
+    p.set_defaults(func=bench_match)
+
+    p = sub.add_parser('crops', help='bytes and encode time per crop rendition, JPEG vs WebP')
+    p.add_argument('--videos', nargs='+', default=['sample_data/base.mp4', 'sample_data/present.mp4'])
+    p.add_argument('--fps', type=float, default=1)
+    p.set_defaults(func=bench_crops)
+
+    p = sub.add_parser('issues', help='per-object ORM adds vs batched bulk inserts of issue rows')
+    p.add_argument('--issues', nargs='+', type=int, default=[1000, 10000])
+    p.add_argument('--batch-sizes', nargs='+', type=int, default=[100, 500, 2000])
+    p.add_argument('--database-url', help='defaults to a temporary SQLite file')
+    p.set_defaults(func=bench_issues)
+
+    args = ap.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()